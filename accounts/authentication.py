@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .revocation import is_revoked
+
+User = get_user_model()
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from a validated token's claims (``user_id``, ``is_staff``).
+
+    Anything the token does not carry, e.g. ``email``, is read from the
+    ``accounts.User`` row, which is loaded on first use. Views pass ``user.id``
+    to the ORM rather than the user object itself.
+    """
+
+    def __str__(self):
+        return f"ClaimsUser {self.id}"
+
+    @cached_property
+    def user(self):
+        return User.objects.get(pk=self.id)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.user, attr)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the signed claims instead of loading the user
+    row on every request. Revoked tokens and users are rejected from the cache.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        if is_revoked(validated_token):
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+        return ClaimsUser(validated_token)
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id with cost parameters taken from settings, so the cost of a login
+    can be tuned per deployment. Stored hashes made with other parameters, or
+    with another algorithm, are re-hashed on the user's next successful login.
+    """
+    time_cost = getattr(settings, 'ARGON2_TIME_COST', 2)
+    memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', 19 * 1024)  # KiB
+    parallelism = getattr(settings, 'ARGON2_PARALLELISM', 1)
@@ -0,0 +1,125 @@
+"""
+Bounded pool for password hashing on the login path.
+
+Hashing is CPU-bound and releases the GIL, so it runs on a fixed number of
+worker threads (``LOGIN_HASH_WORKERS``). At most ``LOGIN_HASH_QUEUE`` further
+requests may wait for a worker; beyond that logins are refused straight away
+with ``HashingCapacityExceeded`` instead of piling up behind a saturated CPU.
+Queue and hashing times are recorded for capacity planning.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+logger = logging.getLogger(__name__)
+
+LOGIN_HASH_WORKERS = getattr(settings, 'LOGIN_HASH_WORKERS', os.cpu_count() or 2)
+LOGIN_HASH_QUEUE = getattr(settings, 'LOGIN_HASH_QUEUE', LOGIN_HASH_WORKERS * 4)
+
+
+class HashingCapacityExceeded(Exception):
+    """Raised when every hashing worker is busy and the wait queue is full."""
+
+
+class HashingMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.completed = 0
+            self.rejected = 0
+            self.queue_seconds = 0.0
+            self.max_queue_seconds = 0.0
+            self.hash_seconds = 0.0
+            self.max_hash_seconds = 0.0
+
+    def record(self, queued, hashed):
+        with self.lock:
+            self.completed += 1
+            self.queue_seconds += queued
+            self.max_queue_seconds = max(self.max_queue_seconds, queued)
+            self.hash_seconds += hashed
+            self.max_hash_seconds = max(self.max_hash_seconds, hashed)
+
+    def record_rejection(self):
+        with self.lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self.lock:
+            completed = self.completed or 1
+            return {
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_queue_ms": self.queue_seconds / completed * 1e3,
+                "max_queue_ms": self.max_queue_seconds * 1e3,
+                "avg_hash_ms": self.hash_seconds / completed * 1e3,
+                "max_hash_ms": self.max_hash_seconds * 1e3,
+            }
+
+
+class HashingPool:
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hash')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.metrics = HashingMetrics()
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            self.metrics.record_rejection()
+            logger.warning("Login hashing pool is saturated, refusing login")
+            raise HashingCapacityExceeded
+
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                finished = time.perf_counter()
+                self.metrics.record(started - submitted, finished - started)
+
+        try:
+            return self.executor.submit(timed).result()
+        finally:
+            self.slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(LOGIN_HASH_WORKERS, LOGIN_HASH_QUEUE)
+    return _pool
+
+
+def verify_password(user, raw_password):
+    """
+    Check a password on the hashing pool and upgrade the stored hash when the
+    preferred hasher or its parameters changed. Database access stays on the
+    calling thread.
+    """
+    pool = get_hashing_pool()
+    is_correct, must_update = pool.run(hashers.verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = pool.run(hashers.make_password, raw_password)
+        user.save(update_fields=['password'])
+        logger.info("Upgraded password hash of user %s", user.pk)
+    return is_correct
+
+
+def hash_password(raw_password):
+    return get_hashing_pool().run(hashers.make_password, raw_password)
@@ -1,6 +1,5 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils.translation import gettext_lazy as _
 
 class UserManager(BaseUserManager):
@@ -33,11 +32,37 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    # Tokens carry these and are trusted without a lookup, so changing one revokes the user's tokens
+    ACCESS_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._loaded_access = user._access_state()
+        return user
+
+    def _access_state(self):
+        # Deferred fields are left out rather than loaded
+        return tuple(self.__dict__.get(field) for field in self.ACCESS_FIELDS)
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_access', None)
+        # set_password() leaves the raw password in _password until the save; hash upgrades do not
+        revoke = not self._state.adding and (
+            self._password is not None or (loaded is not None and loaded != self._access_state()))
+        super().save(*args, **kwargs)
+        self._loaded_access = self._access_state()
+        if revoke:
+            from .revocation import revoke_user_tokens
+            transaction.on_commit(lambda: revoke_user_tokens(self.pk), using=kwargs.get('using') or self._state.db)
+
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
 
     def tokens(self):
-        refresh = RefreshToken.for_user(self)
+        # simplejwt is only needed to issue tokens; importing it with the model slowed every process start
+        from .tokens import ClaimsRefreshToken
+        refresh = ClaimsRefreshToken.for_user(self)
         return {
             'refresh': str(refresh),
             'access': str(refresh.access_token)
@@ -0,0 +1,66 @@
+"""
+Revocation list for stateless JWT authentication.
+
+Access tokens are trusted on their signature alone, so revoking one means
+remembering it until it would have expired anyway: entries live in the shared
+cache for at most the longer of the access and refresh token lifetimes and are
+checked with a single ``get_many`` per request. Revoking a user invalidates
+every token issued to them before that moment; ``User.save()`` does so when
+their password, ``is_active``, ``is_staff`` or ``is_superuser`` changes.
+
+Rotated refresh tokens are blacklisted the same way, one key per jti that
+expires with the token, so the blacklist never outgrows the live tokens.
+"""
+
+import logging
+import time
+
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+REVOKED_TOKEN_KEY = 'revoked_token:{jti}'
+REVOKED_USER_KEY = 'revoked_user:{user_id}'
+
+
+def _lifetime():
+    # A user's revocation must outlive their refresh tokens, not just the access tokens
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    return int(lifetime.total_seconds())
+
+
+def revoke_token(token):
+    """Revoke a single token by its jti until it expires."""
+    remaining = int(token['exp'] - time.time())
+    if remaining > 0:
+        cache.set(REVOKED_TOKEN_KEY.format(jti=token[api_settings.JTI_CLAIM]), True, remaining)
+
+
+def blacklist_after_rotation(token):
+    """
+    Blacklist a refresh token that is being rotated. Returns False if it already
+    was, i.e. a concurrent refresh with the same token won and this one must fail.
+    """
+    remaining = int(token['exp'] - time.time())
+    if remaining <= 0:
+        return False
+    return cache.add(REVOKED_TOKEN_KEY.format(jti=token[api_settings.JTI_CLAIM]), True, remaining)
+
+
+def revoke_user_tokens(user_id):
+    """Revoke every token issued to a user so far, e.g. after a permission change."""
+    logger.info("Revoking tokens of user %s", user_id)
+    cache.set(REVOKED_USER_KEY.format(user_id=user_id), int(time.time()), _lifetime())
+
+
+def is_revoked(token):
+    token_key = REVOKED_TOKEN_KEY.format(jti=token.get(api_settings.JTI_CLAIM))
+    user_key = REVOKED_USER_KEY.format(user_id=token.get(api_settings.USER_ID_CLAIM))
+    revoked = cache.get_many([token_key, user_key])
+
+    if revoked.get(token_key):
+        return True
+    revoked_at = revoked.get(user_key)
+    # Tokens issued in the same second as the revocation are treated as revoked
+    return revoked_at is not None and token.get('iat', 0) <= revoked_at
@@ -5,9 +5,11 @@ from django.conf import settings
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
+from .revocation import blacklist_after_rotation, is_revoked
 
 # Authentication
 
@@ -70,14 +72,40 @@ class RefreshTokenSerializer(serializers.Serializer):
         
         try:
             refresh = RefreshToken(refresh_token)
+            if is_revoked(refresh):
+                raise TokenError(_('Token has been revoked'))
+
+            # Access tokens are trusted without a lookup, so the claims they carry are re-read here
+            user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM]).first()
+            if user is None or not user.is_active:
+                raise TokenError(_('User is inactive or no longer exists'))
+            refresh['is_staff'] = user.is_staff
+            refresh['is_superuser'] = user.is_superuser
+
+            # Optional: Rotate refresh token (for security); the old one can't be used again
+            rotate = settings.SIMPLE_JWT.get('ROTATE_REFRESH_TOKENS', False)
+            if rotate and settings.SIMPLE_JWT.get('BLACKLIST_AFTER_ROTATION', False):
+                if not blacklist_after_rotation(refresh):
+                    raise TokenError(_('Token has been revoked'))
+
             data = {'access': str(refresh.access_token)}
-            
-            # Optional: Rotate refresh token (for security)
-            if settings.SIMPLE_JWT.get('ROTATE_REFRESH_TOKENS', False):
+            if rotate:
                 refresh.set_jti()
                 refresh.set_exp()
+                refresh.set_iat()
                 data['refresh'] = str(refresh)
             
             return data
         except TokenError as e:
             raise serializers.ValidationError({'error': str(e)})
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        try:
+            attrs['refresh'] = RefreshToken(attrs['refresh'])
+        except TokenError as e:
+            raise serializers.ValidationError({'error': str(e)})
+        return attrs
@@ -1,8 +1,20 @@
+import threading
+import time
+from unittest import mock
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from accounts.authentication import ClaimsUser
+from accounts.hashing import HashingPool
+from accounts.revocation import revoke_token, revoke_user_tokens
+from accounts.tokens import ClaimsRefreshToken
 
 User = get_user_model()
 
@@ -74,3 +86,189 @@ class AuthTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("error", response.data)
 
+
+
+class StatelessAuthTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(email="claims@example.com", password="claimspass123")
+        self.staff = User.objects.create_user(email="staff@example.com", password="staffpass123", is_staff=True)
+
+    def authenticate(self, user):
+        access = ClaimsRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return access
+
+    def test_authenticated_request_does_not_load_user(self):
+        self.authenticate(self.user)
+        # Cart rows and discount rules only; no accounts_user lookup
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart-list-create'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('"accounts_user"' in query['sql'] for query in queries.captured_queries))
+
+    def test_staff_claim_grants_staff_views(self):
+        self.authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('discount-rule-list')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.authenticate(self.staff)
+        self.assertEqual(self.client.get(reverse('discount-rule-list')).status_code, status.HTTP_200_OK)
+
+    def test_other_attributes_load_user_lazily(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        claims_user = ClaimsUser(token)
+
+        self.assertEqual(claims_user.id, self.user.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(claims_user.email, "claims@example.com")
+            self.assertEqual(claims_user.phone, self.user.phone)
+
+    def test_revoked_token_is_rejected(self):
+        access = self.authenticate(self.user)
+        revoke_token(access)
+
+        response = self.client.get(reverse('cart-list-create'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoking_user_rejects_earlier_tokens(self):
+        self.authenticate(self.staff)
+        with mock.patch('accounts.revocation.time.time', return_value=time.time() + 1):
+            revoke_user_tokens(self.staff.id)
+
+        response = self.client.get(reverse('discount-rule-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saving_access_change_revokes_tokens(self):
+        self.authenticate(self.staff)
+        self.staff.is_staff = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.staff.save()
+
+        response = self.client.get(reverse('discount-rule-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saving_password_revokes_tokens(self):
+        self.authenticate(self.user)
+        self.user.set_password("changedpass123")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertEqual(self.client.get(reverse('cart-list-create')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saving_other_fields_keeps_tokens(self):
+        self.authenticate(self.user)
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            user.save()
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.client.get(reverse('cart-list-create')).status_code, status.HTTP_200_OK)
+
+    def test_user_revocation_outlives_refresh_tokens(self):
+        with mock.patch('accounts.revocation.cache.set') as cache_set:
+            revoke_user_tokens(self.user.id)
+
+        lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        self.assertGreaterEqual(cache_set.call_args.args[2], lifetime)
+
+
+class RefreshBlacklistTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(email="rotate@example.com", password="rotatepass123")
+        self.refresh = ClaimsRefreshToken.for_user(self.user)
+        self.url = reverse('token_refresh')
+
+    def test_rotated_token_cannot_be_reused(self):
+        first = self.client.post(self.url, {"refresh": str(self.refresh)})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(first.data['refresh'], str(self.refresh))
+
+        reused = self.client.post(self.url, {"refresh": str(self.refresh)})
+        self.assertEqual(reused.status_code, status.HTTP_400_BAD_REQUEST)
+
+        rotated = self.client.post(self.url, {"refresh": first.data['refresh']})
+        self.assertEqual(rotated.status_code, status.HTTP_200_OK)
+
+    def test_blacklist_entry_expires_with_token(self):
+        with mock.patch('accounts.revocation.cache.add', wraps=cache.add) as add:
+            self.client.post(self.url, {"refresh": str(self.refresh)})
+
+        remaining = self.refresh['exp'] - time.time()
+        self.assertAlmostEqual(add.call_args.args[2], remaining, delta=5)
+
+    def test_refresh_reissues_claims_from_the_user(self):
+        staff = User.objects.create_user(email="demoted@example.com", password="demotedpass123", is_staff=True)
+        refresh = ClaimsRefreshToken.for_user(staff)
+        # update() skips User.save(), so the tokens are not revoked
+        User.objects.filter(pk=staff.pk).update(is_staff=False)
+
+        response = self.client.post(self.url, {"refresh": str(refresh)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(AccessToken(response.data['access'])['is_staff'])
+        self.assertFalse(RefreshToken(response.data['refresh'])['is_staff'])
+
+    def test_refresh_rejects_inactive_user(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        response = self.client.post(self.url, {"refresh": str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_logout_revokes_refresh_and_access_tokens(self):
+        access = self.refresh.access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        response = self.client.post(reverse('logout'), {"refresh": str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get(reverse('cart-list-create')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        self.assertEqual(self.client.post(self.url, {"refresh": str(self.refresh)}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class LoginHashingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="hash@example.com", password="hashpass1234")
+        self.login_url = reverse('login')
+
+    def test_new_passwords_use_argon2(self):
+        self.assertTrue(self.user.password.startswith('argon2$argon2id$'))
+
+    def test_login_upgrades_legacy_hash(self):
+        self.user.password = make_password("hashpass1234", hasher='pbkdf2_sha256')
+        self.user.save(update_fields=['password'])
+
+        response = self.client.post(self.login_url, {"email": "hash@example.com", "password": "hashpass1234"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
+        self.assertTrue(self.user.check_password("hashpass1234"))
+
+    def test_pool_records_queue_and_hash_time(self):
+        pool = HashingPool(workers=1, queue_size=1)
+        self.assertTrue(pool.run(check_password, "hashpass1234", self.user.password))
+
+        metrics = pool.metrics.snapshot()
+        self.assertEqual(metrics['completed'], 1)
+        self.assertGreater(metrics['avg_hash_ms'], 0)
+
+    def test_saturated_pool_refuses_login(self):
+        pool = HashingPool(workers=1, queue_size=0)
+        release = threading.Event()
+        busy = threading.Thread(target=pool.run, args=(release.wait,))
+        busy.start()
+        self.addCleanup(busy.join)
+        self.addCleanup(release.set)
+        time.sleep(0.05)
+
+        with mock.patch('accounts.hashing._pool', pool):
+            response = self.client.post(self.login_url, {"email": "hash@example.com", "password": "hashpass1234"})
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(pool.metrics.snapshot()['rejected'], 1)
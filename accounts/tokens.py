@@ -0,0 +1,12 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the claims ``StatelessJWTAuthentication`` relies on."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        return token
@@ -1,14 +1,32 @@
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.tokens import ClaimsRefreshToken
+from accounts.hashing import HashingCapacityExceeded
+from accounts.revocation import revoke_token
 from accounts.utils import get_tokens_for_user
+from carts.guest import GUEST_CART_COOKIE, load_guest_cart, merge_guest_cart, store_guest_cart
 from .serializers import *
 import logging
 from django.db import transaction
 
 logger = logging.getLogger(__name__)
 
+
+def merge_guest_cart_into(request, response, user):
+    """Move the cart the visitor built before logging in into their own cart and drop the cookie."""
+    if GUEST_CART_COOKIE not in request.COOKIES:
+        return response
+    try:
+        merge_guest_cart(user.id, load_guest_cart(request))
+    except Exception:
+        # Logging in matters more; the cookie is kept so the next login merges it
+        logger.exception("Failed to merge the guest cart of user %s", user.id)
+        return response
+    store_guest_cart(response, {})
+    return response
+
+
 class RegisterView(APIView):
     serializer_class = RegisterSerializer
 
@@ -30,12 +48,12 @@ class RegisterView(APIView):
 
                 logger.info("New user registered: %s", user.email)
 
-                return Response({
+                return merge_guest_cart_into(request, Response({
                     "status": status.HTTP_201_CREATED,
                     "message": "User created successfully",
                     "data": serializer.data,
                     "token": token_data['access'],
-                }, status=status.HTTP_201_CREATED)
+                }, status=status.HTTP_201_CREATED), user)
 
         except Exception as e:
             logger.error("Error during user registration: %s", str(e), exc_info=True)
@@ -49,21 +67,29 @@ class LoginView(APIView):
 
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data, context={'request': request})
-        
-        if serializer.is_valid():
+
+        try:
+            is_valid = serializer.is_valid()
+        except HashingCapacityExceeded:
+            return Response({
+                'status': status.HTTP_503_SERVICE_UNAVAILABLE,
+                'message': 'Too many login attempts right now, please retry shortly.',
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+
+        if is_valid:
             user = serializer.validated_data
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
             user_data = UserSerializer(user).data
 
-            logger.info(f"User logged in: {user.email}")
+            logger.info("User logged in: %s", user.email)
 
-            return Response({
+            return merge_guest_cart_into(request, Response({
                 'status': status.HTTP_200_OK,
                 'message': 'Login successful',
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
                 'user': user_data,
-            }, status=status.HTTP_200_OK)
+            }, status=status.HTTP_200_OK), user)
 
         logger.warning("Login failed with errors: %s", serializer.errors)
         return Response({
@@ -82,3 +108,18 @@ class TokenRefreshView(APIView):
             return Response(serializer.validated_data, status=status.HTTP_200_OK)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class LogoutView(APIView):
+    def post(self, request):
+        """Revoke the refresh token and, when sent, the access token of the request."""
+        serializer = LogoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        revoke_token(serializer.validated_data['refresh'])
+        if request.auth is not None:
+            revoke_token(request.auth)
+
+        logger.info("User %s logged out", serializer.validated_data['refresh'].get('user_id'))
+        return Response({'status': status.HTTP_200_OK, 'message': 'Logout successful'}, status=status.HTTP_200_OK)
@@ -0,0 +1,26 @@
+"""
+Micro-benchmarks for the discount engine project.
+
+Each module is runnable on its own, e.g. ``python -m benchmarks.pricing``.
+Benchmarks that need the ORM call ``setup_django()`` and honour
+``DJANGO_SETTINGS_MODULE`` (default: ``discount_engine.settings``).
+"""
+
+import os
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'discount_engine.settings')
+    import django
+    django.setup()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def delta(current, baseline):
+    if not baseline:
+        return ''
+    return f" ({(current - baseline) / baseline:+.1%})"
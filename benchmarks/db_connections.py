@@ -0,0 +1,69 @@
+"""
+Compare per-request database latency with and without connection reuse.
+
+Simulates the request cycle (request_started -> a few small queries ->
+request_finished) so Django's own connection management decides whether to
+close the connection, exactly as it would under a WSGI server:
+
+    python -m benchmarks.db_connections --requests 500
+    DJANGO_SETTINGS_MODULE=discount_engine.settings_production python -m benchmarks.db_connections
+"""
+
+import argparse
+import time
+
+from benchmarks import percentile, setup_django
+
+
+def run(requests, queries_per_request, conn_max_age):
+    from django.core import signals
+    from django.db import connection
+
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        signals.request_started.send(sender=None)
+        with connection.cursor() as cursor:
+            for _ in range(queries_per_request):
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+        signals.request_finished.send(sender=None)
+        samples.append(time.perf_counter() - started)
+
+    connection.close()
+    return samples
+
+
+def report(label, samples):
+    mean = sum(samples) / len(samples)
+    print(f"  {label:<28} mean {mean * 1e3:7.3f} ms  p50 {percentile(samples, 0.5) * 1e3:7.3f} ms"
+          f"  p95 {percentile(samples, 0.95) * 1e3:7.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--queries', type=int, default=3, help='Queries per simulated request.')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+
+    configured = dict(connection.settings_dict)
+    print(f"{connection.vendor} via {configured['ENGINE']} ({args.requests} requests x {args.queries} queries)")
+
+    if 'pool' in configured.get('OPTIONS', {}):
+        # Closing a pooled connection only returns it to the pool, so there is no baseline here
+        report("psycopg pool", run(args.requests, args.queries, conn_max_age=0))
+        print("  (run again with DB_POOL=false for the per-request connection baseline)")
+        return
+
+    report("new connection per request", run(args.requests, args.queries, conn_max_age=0))
+    report("persistent (CONN_MAX_AGE)", run(args.requests, args.queries, conn_max_age=configured['CONN_MAX_AGE'] or 60))
+
+
+if __name__ == '__main__':
+    main()
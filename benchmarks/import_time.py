@@ -0,0 +1,104 @@
+"""
+Track how long a new worker spends importing before it can serve.
+
+Runs fresh interpreters under ``python -X importtime`` for each startup phase
+(``django.setup()``, then loading the URLconf as the first request would),
+and reports the median wall time, the time spent importing and the packages
+that cost the most:
+
+    python -m benchmarks.import_time --save before.json
+    python -m benchmarks.import_time --baseline before.json
+"""
+
+import argparse
+from collections import Counter
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import delta
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PHASES = {
+    'setup': "import django; django.setup()",
+    'urlconf': ("import django; django.setup(); from importlib import import_module; "
+                "from django.conf import settings; import_module(settings.ROOT_URLCONF)"),
+}
+
+
+def parse_importtime(stderr):
+    """``(module, self_us)`` for every line ``-X importtime`` wrote."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        imports.append((module.strip(), int(self_us)))
+    return imports
+
+
+def measure(code):
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'discount_engine.settings')
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=BASE_DIR, env=env,
+                             capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, parse_importtime(process.stderr)
+
+
+def run(code, runs):
+    walls, import_times, packages = [], [], Counter()
+    for _ in range(runs):
+        wall, imports = measure(code)
+        walls.append(wall)
+        import_times.append(sum(self_us for _, self_us in imports) / 1e6)
+        for module, self_us in imports:
+            packages[module.split('.')[0]] += self_us / 1e6 / runs
+    return {
+        "wall_ms": statistics.median(walls) * 1e3,
+        "import_ms": statistics.median(import_times) * 1e3,
+        "modules": len(imports),
+        "packages": {package: seconds * 1e3 for package, seconds in packages.most_common()},
+    }
+
+
+def report(phase, stats, baseline, top):
+    base = baseline.get(phase, {})
+    print(f"{phase}: wall {stats['wall_ms']:.0f} ms{delta(stats['wall_ms'], base.get('wall_ms'))}, "
+          f"imports {stats['import_ms']:.0f} ms{delta(stats['import_ms'], base.get('import_ms'))} "
+          f"({stats['modules']} modules)")
+    base_packages = base.get('packages', {})
+    for package, ms in list(stats['packages'].items())[:top]:
+        print(f"  {package:<32} {ms:7.1f} ms{delta(ms, base_packages.get(package))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per phase; medians are reported.')
+    parser.add_argument('--top', type=int, default=15, help='Packages listed per phase.')
+    parser.add_argument('--save', help='Write the results as JSON, to compare a later build against.')
+    parser.add_argument('--baseline', help='Results saved from a previous build.')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+
+    results = {}
+    for phase, code in PHASES.items():
+        results[phase] = run(code, args.runs)
+        report(phase, results[phase], baseline, args.top)
+
+    if args.save:
+        with open(args.save, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
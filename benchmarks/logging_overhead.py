@@ -0,0 +1,92 @@
+"""
+Measure what a log call costs the thread that makes it.
+
+Compares, per call on the calling thread:
+- the old setup, a ``RotatingFileHandler`` with the verbose text format written inline;
+- ``QueueListenerHandler`` feeding ``LockedRotatingFileHandler`` with the JSON formatter,
+  where the calling thread only enqueues (the time for the listener to drain is reported too);
+- a disabled DEBUG call with an eager f-string against one with lazy ``%s`` arguments.
+
+    python -m benchmarks.logging_overhead --calls 20000
+"""
+
+import argparse
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+import tempfile
+import time
+
+from benchmarks import percentile
+from discount_engine.log import LockedRotatingFileHandler, QueueListenerHandler, json_formatter
+
+VERBOSE = '{levelname} {asctime} {module} {process:d} {thread:d} {message}'
+
+
+class Basket:
+    """Stand-in for an argument whose ``str()`` is not free."""
+
+    def __init__(self, size):
+        self.items = [(index, index * 10) for index in range(size)]
+
+    def __str__(self):
+        return ", ".join(f"{product}x{quantity}" for product, quantity in self.items)
+
+
+def timed(calls, log):
+    samples = []
+    for index in range(calls):
+        started = time.perf_counter()
+        log(index)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def isolated_logger(name, handler, level=logging.INFO):
+    logger = logging.getLogger(f"benchmarks.logging_overhead.{name}")
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def report(label, samples, extra=''):
+    mean = sum(samples) / len(samples)
+    print(f"  {label:<32} mean {mean * 1e6:8.2f} us  p50 {percentile(samples, 0.5) * 1e6:8.2f} us"
+          f"  p99 {percentile(samples, 0.99) * 1e6:8.2f} us{extra}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--basket', type=int, default=20, help='Items in the logged argument.')
+    args = parser.parse_args(argv)
+
+    basket = Basket(args.basket)
+    directory = tempfile.mkdtemp(prefix='logging-overhead-')
+    print(f"{args.calls} calls per case, writing under {directory}")
+
+    sync = RotatingFileHandler(os.path.join(directory, 'sync.log'), maxBytes=50 * 1024 * 1024, backupCount=1)
+    sync.setFormatter(logging.Formatter(VERBOSE, style='{'))
+    logger = isolated_logger('sync', sync)
+    report("inline RotatingFileHandler", timed(args.calls, lambda index: logger.info("Basket %s: %s", index, basket)))
+    sync.close()
+
+    sink = LockedRotatingFileHandler(os.path.join(directory, 'queued.log'), maxBytes=50 * 1024 * 1024, backupCount=1)
+    sink.setFormatter(json_formatter())
+    queued = QueueListenerHandler([sink], queue_size=args.calls)
+    logger = isolated_logger('queued', queued)
+    samples = timed(args.calls, lambda index: logger.info("Basket %s: %s", index, basket))
+    started = time.perf_counter()
+    queued.close()
+    drained = time.perf_counter() - started
+    report("queue -> locked file, JSON", samples, f"  (drain {drained * 1e3:.0f} ms, dropped {queued.dropped})")
+    sink.close()
+
+    disabled = isolated_logger('disabled', logging.NullHandler())
+    report("disabled DEBUG, f-string", timed(args.calls, lambda index: disabled.debug(f"Basket {index}: {basket}")))
+    report("disabled DEBUG, lazy args", timed(args.calls, lambda index: disabled.debug("Basket %s: %s", index, basket)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Capacity planning for login bursts: throughput and latency of password checks.
+
+Fires ``--logins`` concurrent password checks at the bounded login hashing pool
+for each hasher and reports logins/second, queue time and end-to-end latency:
+
+    python -m benchmarks.login_hashing --logins 200 --concurrency 50
+    ARGON2_MEMORY_COST=65536 python -m benchmarks.login_hashing
+"""
+
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from benchmarks import percentile, setup_django
+
+HASHERS = ['argon2', 'pbkdf2_sha256']
+
+
+def run(hasher, logins, concurrency, workers, queue_size):
+    from django.contrib.auth.hashers import check_password, make_password
+    from accounts.hashing import HashingCapacityExceeded, HashingPool
+
+    encoded = make_password('benchmark-password', hasher=hasher)
+    pool = HashingPool(workers, queue_size)
+
+    def login():
+        started = time.perf_counter()
+        try:
+            pool.run(check_password, 'benchmark-password', encoded)
+        except HashingCapacityExceeded:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        samples = list(clients.map(lambda _: login(), range(logins)))
+    elapsed = time.perf_counter() - started
+
+    served = [sample for sample in samples if sample is not None]
+    metrics = pool.metrics.snapshot()
+    print(f"  {hasher:<14} {len(served) / elapsed:8.1f} logins/s  rejected {metrics['rejected']:4d}"
+          f"  hash {metrics['avg_hash_ms']:6.1f} ms  queue avg {metrics['avg_queue_ms']:7.1f} ms"
+          f"  p95 latency {percentile(served, 0.95) * 1e3 if served else 0:7.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50, help='Simultaneous login requests.')
+    parser.add_argument('--workers', type=int, help='Hashing threads (default: LOGIN_HASH_WORKERS).')
+    parser.add_argument('--queue', type=int, help='Checks allowed to wait (default: LOGIN_HASH_QUEUE).')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+
+    # Rejections are counted in the pool metrics; one warning per refused login is just noise here
+    logging.getLogger('accounts.hashing').setLevel(logging.ERROR)
+
+    workers = args.workers or settings.LOGIN_HASH_WORKERS
+    queue_size = args.queue if args.queue is not None else settings.LOGIN_HASH_QUEUE
+    print(f"{args.logins} logins, {args.concurrency} concurrent, {workers} hashing workers, queue {queue_size}")
+    print(f"argon2: time_cost={settings.ARGON2_TIME_COST} memory_cost={settings.ARGON2_MEMORY_COST} KiB "
+          f"parallelism={settings.ARGON2_PARALLELISM}")
+    for hasher in HASHERS:
+        run(hasher, args.logins, args.concurrency, workers, queue_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark the side-effect-free pricing core in isolation (no database).
+
+    python -m benchmarks.pricing --lines 20 --rules 50 --iterations 20000
+"""
+
+import argparse
+from decimal import Decimal
+import logging
+import random
+import time
+
+from discounts.pricing import BasketLine, CustomerHistory, RuleSpec, price_basket
+
+
+def build_inputs(line_count, rule_count, seed=0):
+    rng = random.Random(seed)
+    lines = [
+        BasketLine(
+            product_id=index,
+            category_id=rng.randint(1, 10),
+            unit_price=Decimal(rng.randint(100, 100000)) / 100,
+            quantity=rng.randint(1, 5),
+        )
+        for index in range(line_count)
+    ]
+
+    rules = []
+    for index in range(rule_count):
+        discount_type = ('percentage', 'flat', 'category')[index % 3]
+        rules.append(RuleSpec(
+            id=index,
+            discount_type=discount_type,
+            priority=rng.randint(1, 10),
+            min_order_value=Decimal(rng.randint(0, 5000)),
+            percentage=Decimal(rng.randint(1, 5)),
+            min_previous_orders=rng.randint(0, 10),
+            flat_amount=Decimal(rng.randint(10, 100)),
+            category_id=rng.randint(1, 10),
+            category_name='Category',
+            min_items_in_category=rng.randint(0, 10),
+            category_discount_percentage=Decimal(rng.randint(1, 5)),
+        ))
+
+    history = CustomerHistory(order_count=rng.randint(0, 20),
+                              category_quantities={category: rng.randint(0, 10) for category in range(1, 11)})
+    return lines, rules, history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--rules', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    # Measure pricing, not the per-rule log lines
+    logging.disable(logging.INFO)
+    lines, rules, history = build_inputs(args.lines, args.rules)
+
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        price_basket(lines, rules, history)
+    elapsed = time.perf_counter() - started
+
+    print(f"price_basket: {args.lines} lines x {args.rules} rules, {args.iterations} iterations")
+    print(f"  {elapsed / args.iterations * 1e6:.1f} us/basket, {args.iterations / elapsed:.0f} baskets/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Replay captured API traffic against a running instance and compare builds.
+
+Reads the JSONL written by ``TrafficCaptureMiddleware`` (rotated files may be
+passed together), re-issues every request at the captured inter-arrival times
+divided by ``--speedup`` over ``--concurrency`` keep-alive connections, and
+reports throughput and client-side latency overall and per route:
+
+    python -m benchmarks.replay logs/traffic.jsonl* --speedup 4 --save before.json
+    python -m benchmarks.replay logs/traffic.jsonl* --speedup 4 --baseline before.json
+
+Captured users are anonymized, so each one is mapped to a local
+``replay-<hash>@example.com`` user (created on first use) and authenticated with
+a freshly minted access token; this needs the same settings and database as
+the target. Ids in paths refer to the captured database, so expect 404s unless
+the target was loaded from the same data.
+"""
+
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks import delta, percentile, setup_django
+
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def route_of(path):
+    return ID_SEGMENT.sub('/{id}', path)
+
+
+def load_records(paths, limit=None):
+    records = []
+    for path in paths:
+        with open(path) as fh:
+            records.extend(json.loads(line) for line in fh if line.strip())
+    records.sort(key=lambda record: record['ts'])
+    return records[:limit] if limit else records
+
+
+def mint_tokens(records):
+    """Access token per anonymized user, for local stand-in users."""
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from accounts.tokens import ClaimsRefreshToken
+
+    User = get_user_model()
+    tokens = {}
+    for anon in {record['user'] for record in records if record['user']}:
+        user, created = User.objects.get_or_create(email=f"replay-{anon}@example.com")
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        tokens[anon] = str(ClaimsRefreshToken.for_user(user).access_token)
+    return tokens
+
+
+class Client:
+    """One keep-alive connection per replay thread."""
+
+    def __init__(self, target):
+        parts = urlsplit(target)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.local = threading.local()
+
+    def request(self, method, url, body, headers):
+        for attempt in range(2):
+            connection = getattr(self.local, 'connection', None)
+            if connection is None:
+                connection = self.local.connection = self.connection_class(self.netloc, timeout=30)
+            try:
+                connection.request(method, url, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+
+
+def replay(records, target, speedup, concurrency, tokens):
+    client = Client(target)
+    results = []
+    lock = threading.Lock()
+
+    def send(record, due):
+        headers = {}
+        if record['content_type']:
+            headers['Content-Type'] = record['content_type']
+        if record['user'] in tokens:
+            headers['Authorization'] = f"Bearer {tokens[record['user']]}"
+        url = record['path'] + (f"?{record['query']}" if record['query'] else '')
+        body = record['body'].encode() if record['body'] is not None else None
+
+        started = time.perf_counter()
+        try:
+            status = client.request(record['method'], url, body, headers)
+        except (http.client.HTTPException, OSError):
+            status = None
+        latency = time.perf_counter() - started
+        with lock:
+            results.append((record, status, latency, started - due))
+
+    first_ts = records[0]['ts']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            due = started + (record['ts'] - first_ts) / speedup if speedup else started
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, record, due)
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    latencies = [latency for _, _, latency, _ in results]
+    by_route = defaultdict(list)
+    for record, _, latency, _ in results:
+        by_route[f"{record['method']} {route_of(record['path'])}"].append((latency, record['latency_ms'] / 1e3))
+
+    return {
+        "summary": {
+            "requests": len(results),
+            "throughput": len(results) / elapsed,
+            "p50_ms": percentile(latencies, 0.5) * 1e3,
+            "p95_ms": percentile(latencies, 0.95) * 1e3,
+            "p99_ms": percentile(latencies, 0.99) * 1e3,
+            "max_lag_ms": max(lag for _, _, _, lag in results) * 1e3,
+            "statuses": dict(Counter(str(status) for _, status, _, _ in results)),
+        },
+        "routes": {
+            route: {
+                "requests": len(samples),
+                "p50_ms": percentile([sample for sample, _ in samples], 0.5) * 1e3,
+                "p95_ms": percentile([sample for sample, _ in samples], 0.95) * 1e3,
+                "captured_p95_ms": percentile([captured for _, captured in samples], 0.95) * 1e3,
+            }
+            for route, samples in by_route.items()
+        },
+    }
+
+
+def report(stats, baseline=None):
+    summary = stats["summary"]
+    base = (baseline or {}).get("summary", {})
+    print(f"  {summary['requests']} requests, {summary['throughput']:.1f} req/s{delta(summary['throughput'], base.get('throughput'))}"
+          f", max lag behind schedule {summary['max_lag_ms']:.1f} ms")
+    for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+        print(f"  {key[:-3]:<4} {summary[key]:8.2f} ms{delta(summary[key], base.get(key))}")
+    print(f"  statuses {summary['statuses']}")
+
+    base_routes = (baseline or {}).get("routes", {})
+    print(f"\n  {'route':<48} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'captured p95':>13}")
+    for route, row in sorted(stats["routes"].items(), key=lambda item: -item[1]["requests"]):
+        change = delta(row['p95_ms'], base_routes.get(route, {}).get('p95_ms'))
+        print(f"  {route:<48} {row['requests']:>6} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f}"
+              f" {row['captured_p95_ms']:>13.2f}{change}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('captures', nargs='+', help='Captured traffic.jsonl files.')
+    parser.add_argument('--target', default='http://127.0.0.1:8000')
+    parser.add_argument('--speedup', type=float, default=1.0, help='Divide captured gaps by this; 0 sends back to back.')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--limit', type=int, help='Replay only the first N requests.')
+    parser.add_argument('--save', help='Write the results as JSON, to compare a later build against.')
+    parser.add_argument('--baseline', help='Results saved from a previous build.')
+    parser.add_argument('--anonymous', action='store_true', help='Send every request without credentials.')
+    args = parser.parse_args(argv)
+
+    records = load_records(args.captures, args.limit)
+    if not records:
+        parser.error("no captured requests to replay")
+    tokens = {} if args.anonymous else mint_tokens(records)
+
+    print(f"Replaying {len(records)} requests against {args.target} at {args.speedup}x, {args.concurrency} connections")
+    results, elapsed = replay(records, args.target, args.speedup, args.concurrency, tokens)
+    stats = summarize(results, elapsed)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    report(stats, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as fh:
+            json.dump(stats, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
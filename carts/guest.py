@@ -0,0 +1,112 @@
+"""
+Carts for visitors who have not logged in.
+
+``Cart`` rows need a user, so a guest cart lives in a signed cookie holding
+``product_id:quantity`` pairs: nothing is written to the database for
+anonymous traffic, and pricing reads only the products. The signature stops a
+client from editing the cookie, but the quantities are still checked against
+the products every time they are read, since stock changes while the cookie
+sits in the browser.
+
+On login or registration the guest cart is merged into the user's ``Cart``
+rows with one upsert, and the cookie is deleted.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from discount_engine.db_router import pin_to_primary, user_scope
+from discounts.engine import DiscountEngine
+from products.models import Product
+from .models import Cart
+from .storage import get_cart_storage
+
+logger = logging.getLogger(__name__)
+
+GUEST_CART_COOKIE = getattr(settings, 'GUEST_CART_COOKIE', 'guest_cart')
+GUEST_CART_MAX_AGE = getattr(settings, 'GUEST_CART_MAX_AGE', 60 * 60 * 24 * 30)  # 30 days default
+GUEST_CART_SALT = 'carts.guest'
+# Keeps the cookie well under the 4 KB browsers accept
+MAX_GUEST_CART_ITEMS = 50
+
+
+def load_guest_cart(request):
+    """``{product_id: quantity}`` from the request's cookie; empty if it is missing, expired or tampered with."""
+    value = request.get_signed_cookie(GUEST_CART_COOKIE, default='', salt=GUEST_CART_SALT,
+                                      max_age=GUEST_CART_MAX_AGE)
+    quantities = {}
+    for pair in filter(None, value.split(',')):
+        try:
+            product_id, quantity = map(int, pair.split(':'))
+        except ValueError:
+            return {}
+        if product_id > 0 and quantity > 0:
+            quantities[product_id] = quantity
+    return quantities
+
+
+def store_guest_cart(response, quantities):
+    """Write the cart to the response's cookie, or delete the cookie once the cart is empty."""
+    if not quantities:
+        response.delete_cookie(GUEST_CART_COOKIE, samesite='Lax')
+        return
+    value = ','.join(f"{product_id}:{quantity}" for product_id, quantity in quantities.items())
+    response.set_signed_cookie(GUEST_CART_COOKIE, value, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE,
+                               httponly=True, secure=settings.SESSION_COOKIE_SECURE, samesite='Lax')
+
+
+def guest_cart_items(quantities):
+    """
+    Unsaved ``Cart`` lines for the products in the cart that still exist, in the
+    order they were added, so the serializer and the discount engine take them
+    like a user's rows.
+    """
+    products = Product.objects.in_bulk(quantities)
+    return [Cart(product=products[product_id], quantity=quantity)
+            for product_id, quantity in quantities.items() if product_id in products]
+
+
+def price_guest_cart(cart_items):
+    """Run the discount engine over a guest cart; guests have no order history."""
+    return DiscountEngine(None, None, cart_items=cart_items).get_cart_discounts()
+
+
+def merge_guest_cart(user_id, quantities):
+    """
+    Add a guest cart to the user's cart and return the number of lines written.
+
+    Quantities are added to the user's existing lines and capped at the stock;
+    products that are gone or inactive are dropped. The lines are written with
+    one upsert.
+    """
+    if not quantities:
+        return 0
+
+    storage = get_cart_storage()
+    with transaction.atomic():
+        # The lines are changed in the table, so it must hold any quantity changes still pending
+        storage.flush(user_id)
+        products = Product.objects.filter(id__in=quantities, is_active=True).in_bulk()
+        current = dict(Cart.objects.select_for_update()
+                       .filter(user_id=user_id, product_id__in=products)
+                       .values_list('product_id', 'quantity'))
+
+        lines = []
+        for product_id, product in products.items():
+            quantity = current.get(product_id, 0) + quantities[product_id]
+            quantity = min(quantity, product.stock_quantity)
+            if quantity > current.get(product_id, 0):
+                lines.append(Cart(user_id=user_id, product=product, quantity=quantity))
+
+        if lines:
+            Cart.objects.bulk_create(lines, update_conflicts=True, unique_fields=['user', 'product'],
+                                     update_fields=['quantity', 'updated_at'])
+            transaction.on_commit(lambda: storage.invalidate(user_id, [line.product_id for line in lines]))
+            # Logging in is not a write of the user's, so their next cart read must be sent to the primary here
+            transaction.on_commit(lambda: pin_to_primary(user_scope(user_id)))
+
+    logger.info("Merged %s guest cart lines into the cart of user %s (%s skipped).",
+                len(lines), user_id, len(quantities) - len(lines))
+    return len(lines)
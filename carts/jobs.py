@@ -0,0 +1,13 @@
+from jobs.queue import job
+from .storage import get_cart_storage
+from .snapshots import invalidate_priced_cart, price_cart
+
+
+@job('carts.warm_priced_cart')
+def warm_priced_cart(user_id):
+    """Re-price a user's cart after their purchase history changed."""
+    cart_items = get_cart_storage().items(user_id)
+    if cart_items:
+        price_cart(user_id, cart_items)
+    else:
+        invalidate_priced_cart(user_id)
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from carts.storage import get_cart_storage
+
+
+class Command(BaseCommand):
+    help = "Write cart quantity changes held by the cart storage (CART_STORAGE='redis') to the Cart table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=0,
+                            help='Keep flushing at this interval in seconds instead of once.')
+
+    def handle(self, *args, **options):
+        storage = get_cart_storage()
+        while True:
+            flushed = storage.flush()
+            self.stdout.write(f"Flushed {flushed} carts")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
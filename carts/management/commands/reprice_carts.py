@@ -0,0 +1,91 @@
+import bisect
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from carts.models import Cart
+from carts.snapshots import reprice_users
+from carts.storage import get_cart_storage
+from discounts.cache import get_discount_rules_version
+from discounts.workers import chunked, run_in_pool
+
+
+def merge_ranges(ranges):
+    """The ``[low, high]`` id ranges sorted, with overlapping and adjacent ones merged."""
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return merged
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-price every non-empty cart with the current discount rules and store fresh "
+        "priced-cart snapshots. Snapshots live in the cache, so run it against a shared "
+        "cache backend (Redis) when using --workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard-size', type=int, default=200, help='Users per shard.')
+        parser.add_argument('--workers', type=int, default=0, help='Worker processes (0 runs in-process).')
+        parser.add_argument('--checkpoint', help='JSON file recording completed shards.')
+        parser.add_argument('--resume', action='store_true', help='Skip shards recorded in --checkpoint.')
+
+    def _load_checkpoint(self, path, rules_version):
+        if not path or not os.path.exists(path):
+            return []
+        with open(path) as fp:
+            checkpoint = json.load(fp)
+        if checkpoint.get('rules_version') != rules_version:
+            self.stdout.write(self.style.WARNING("Rules changed since the checkpoint was written; starting over."))
+            return []
+        return checkpoint['completed']
+
+    def _save_checkpoint(self, path, rules_version, completed):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as fp:
+            json.dump({'rules_version': rules_version, 'completed': completed}, fp)
+        os.replace(tmp_path, path)
+
+    def handle(self, *args, **options):
+        checkpoint_path = options['checkpoint']
+        rules_version = get_discount_rules_version()
+        completed = self._load_checkpoint(checkpoint_path, rules_version) if options['resume'] else []
+        # Shards read the Cart table, so it must hold the quantities still pending in the cart storage
+        get_cart_storage().flush()
+
+        # Sorted once, so each user is looked up in O(log shards) rather than scanned against every shard
+        done = merge_ranges(completed)
+        lows = [low for low, _ in done]
+
+        def is_done(user_id):
+            index = bisect.bisect_right(lows, user_id) - 1
+            return index >= 0 and user_id <= done[index][1]
+
+        user_ids = (
+            user_id for user_id in
+            Cart.objects.order_by('user_id').values_list('user_id', flat=True).distinct().iterator()
+            if not is_done(user_id)
+        )
+        tasks = ((shard,) for shard in chunked(user_ids, options['shard_size']))
+
+        started = time.perf_counter()
+        users = cart_items = 0
+        for result in run_in_pool(reprice_users, tasks, workers=options['workers']):
+            users += result['users']
+            cart_items += result['cart_items']
+            completed.append([result['first_user_id'], result['last_user_id']])
+            if checkpoint_path:
+                self._save_checkpoint(checkpoint_path, rules_version, completed)
+            self.stdout.write(f"Re-priced users {result['first_user_id']}..{result['last_user_id']}")
+
+        elapsed = time.perf_counter() - started
+        rate = users / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-priced {users} carts ({cart_items} items) in {elapsed:.2f}s ({rate:.1f} carts/s)"
+        ))
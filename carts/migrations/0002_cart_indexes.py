@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='cart',
+            options={'verbose_name_plural': 'UserCarts'},
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', 'created_at'], name='cart_user_created_idx'),
+        ),
+    ]
@@ -14,6 +14,9 @@ class Cart(models.Model):
 
     class Meta:
         unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='cart_user_created_idx'),
+        ]
         verbose_name_plural = "UserCarts"  # Admin display name
 
     def __str__(self):
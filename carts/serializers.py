@@ -23,4 +23,27 @@ class CartSerializer(serializers.ModelSerializer):
             return image.url
         return None
 
-    
\ No newline at end of file
+    
+
+
+MAX_BULK_ITEMS = 100
+
+
+class CartBulkItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    # Change to apply: positive adds, negative removes; the line is deleted once it reaches zero
+    quantity = serializers.IntegerField()
+
+    def validate_quantity(self, value):
+        if value == 0:
+            raise serializers.ValidationError("Quantity change must not be zero.")
+        return value
+
+
+class CartBulkSerializer(serializers.Serializer):
+    items = CartBulkItemSerializer(many=True, allow_empty=False, max_length=MAX_BULK_ITEMS)
+
+
+class GuestCartItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
@@ -0,0 +1,80 @@
+from collections import defaultdict
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from discounts.cache import get_discount_rules_version, seconds_until_next_rule_boundary
+from discounts.engine import DiscountEngine
+from .models import Cart
+
+logger = logging.getLogger(__name__)
+
+PRICED_CART_CACHE_KEY = 'priced_cart:{user_id}'
+PRICED_CART_TTL = getattr(settings, 'PRICED_CART_TTL', 60 * 60 * 24)  # 1 day default
+
+
+def cart_signature(cart_items):
+    """Fingerprint of the cart contents that pricing depends on."""
+    lines = sorted((item.product_id, item.quantity, str(item.product.price)) for item in cart_items)
+    return hashlib.sha1(repr(lines).encode()).hexdigest()
+
+
+def price_cart(user_id, cart_items):
+    """Run the discount engine over a user's cart and store a fresh priced-cart snapshot."""
+    cart_items = list(cart_items)
+    # Read first: a rule change while the engine runs must leave this snapshot stale, not stamp it current
+    rules_version = get_discount_rules_version()
+    engine = DiscountEngine(None, user_id, cart_items=cart_items)
+    result = engine.get_cart_discounts()
+
+    # Scheduled rules change the price at the next boundary, so the snapshot must not outlive it
+    ttl = PRICED_CART_TTL
+    until_boundary = seconds_until_next_rule_boundary()
+    if until_boundary is not None:
+        ttl = min(ttl, until_boundary)
+    cache.set(PRICED_CART_CACHE_KEY.format(user_id=user_id), {
+        "rules_version": rules_version,
+        "signature": cart_signature(cart_items),
+        "applied_discounts": result["applied_discounts"],
+    }, ttl)
+    return result
+
+
+def get_priced_cart(user_id, cart_items):
+    """
+    Return the cart discounts from the snapshot when it still matches both the
+    cart contents and the current rule set, pricing the cart otherwise.
+    """
+    cart_items = list(cart_items)
+    snapshot = cache.get(PRICED_CART_CACHE_KEY.format(user_id=user_id))
+    if (snapshot is not None
+            and snapshot["rules_version"] == get_discount_rules_version()
+            and snapshot["signature"] == cart_signature(cart_items)):
+        logger.debug("Priced cart snapshot hit for user %s", user_id)
+        return {"applied_discounts": snapshot["applied_discounts"]}
+
+    return price_cart(user_id, cart_items)
+
+
+def invalidate_priced_cart(user_id):
+    """Drop a user's snapshot, e.g. once an order changes their purchase history."""
+    cache.delete(PRICED_CART_CACHE_KEY.format(user_id=user_id))
+
+
+def reprice_users(user_ids):
+    """Re-price the carts of a shard of users. Runs inside a pool worker."""
+    carts_by_user = defaultdict(list)
+    for item in Cart.objects.filter(user_id__in=user_ids).select_related('product').order_by('created_at'):
+        carts_by_user[item.user_id].append(item)
+
+    for user_id, cart_items in carts_by_user.items():
+        price_cart(user_id, cart_items)
+
+    return {
+        "first_user_id": user_ids[0],
+        "last_user_id": user_ids[-1],
+        "users": len(carts_by_user),
+        "cart_items": sum(len(items) for items in carts_by_user.values()),
+    }
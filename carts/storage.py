@@ -0,0 +1,263 @@
+"""
+Where cart quantities are kept between requests.
+
+``DatabaseCartStorage``, the default, reads and writes the ``Cart`` table.
+
+``RedisCartStorage`` (``CART_STORAGE='redis'``) takes quantity churn off the
+database. Changed quantities live in the Redis hash ``cart:{user_id}``
+(product id -> quantity) and are changed by Lua scripts, each an atomic
+check-and-update like the table's conditional ``UPDATE``. Lines are
+still rows: adding a product inserts its ``Cart`` row, which carries the id
+used in URLs and the ordering, and removing one deletes it. A product missing
+from the hash has its current quantity in the table.
+
+Users with unflushed changes are kept in a set. ``flush()`` writes their
+quantities to the table: periodically through ``python manage.py flush_carts``,
+and for one user before code that treats the table as the source of truth
+(checkout, bulk changes) reads it. Code that writes the table directly calls
+``invalidate`` afterwards.
+
+Changes not flushed yet exist only in Redis: run it with persistence (AOF), and
+flush well within ``CART_STORAGE_TTL``, after which an idle user's hash expires.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from products.models import Product
+from .models import Cart
+
+logger = logging.getLogger(__name__)
+
+CART_KEY = 'cart:{user_id}'
+DIRTY_CARTS_KEY = 'cart:dirty'
+DEFAULT_TTL = 60 * 60 * 24 * 7  # 1 week
+FLUSH_BATCH_SIZE = 500
+
+# KEYS: cart hash, dirty set. ARGV: product id, quantity in the table, delta, limit (-1: none), ttl, user id
+ADD_SCRIPT = """
+redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2])
+local quantity = tonumber(redis.call('HGET', KEYS[1], ARGV[1])) + tonumber(ARGV[3])
+local limit = tonumber(ARGV[4])
+if quantity < 1 or (limit >= 0 and quantity > limit) then
+    return false
+end
+redis.call('HSET', KEYS[1], ARGV[1], quantity)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('SADD', KEYS[2], ARGV[6])
+return quantity
+"""
+
+# KEYS: cart hash. ARGV: product id, quantity in the table, max quantity (-1: any)
+REMOVE_SCRIPT = """
+local quantity = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or ARGV[2])
+local max_quantity = tonumber(ARGV[3])
+if max_quantity >= 0 and quantity > max_quantity then
+    return 0
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def supports_update_returning():
+    """Whether the database takes ``UPDATE ... RETURNING``; MariaDB only has it on INSERT and DELETE."""
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
+class DatabaseCartStorage:
+    def items(self, user_id):
+        """The user's cart lines with their products, oldest first."""
+        return list(Cart.objects.filter(user_id=user_id).select_related('product').order_by('created_at'))
+
+    def item(self, user_id, pk):
+        """One of the user's cart lines, or a 404."""
+        return get_object_or_404(Cart.objects.select_related('product'), pk=pk, user_id=user_id)
+
+    def create(self, user_id, product, quantity):
+        return Cart.objects.create(user_id=user_id, product=product, quantity=quantity)
+
+    def add(self, item, delta, check_stock=False):
+        """
+        Change the quantity of an existing line by ``delta`` in one conditional statement
+        and return the new quantity, or None, changing nothing, if the line is gone or the
+        quantity would drop below 1. With ``check_stock`` the product must also be active
+        and have stock for the new quantity.
+        """
+        table = connection.ops.quote_name(Cart._meta.db_table)
+        conditions = ["id = %s", "user_id = %s", "quantity + %s >= 1"]
+        params = [delta, timezone.now(), item.pk, item.user_id, delta]
+        if check_stock:
+            conditions.append(
+                f"EXISTS (SELECT 1 FROM {connection.ops.quote_name(Product._meta.db_table)} product"
+                f" WHERE product.id = {table}.product_id AND product.is_active"
+                f" AND product.stock_quantity >= {table}.quantity + %s)"
+            )
+            params.append(delta)
+        sql = f"UPDATE {table} SET quantity = quantity + %s, updated_at = %s WHERE {' AND '.join(conditions)}"
+
+        with connection.cursor() as cursor:
+            if supports_update_returning():
+                cursor.execute(f"{sql} RETURNING quantity", params)
+                row = cursor.fetchone()
+                quantity = row[0] if row else None
+            else:
+                cursor.execute(sql, params)
+                quantity = None
+                if cursor.rowcount:
+                    quantity = Cart.objects.values_list('quantity', flat=True).get(pk=item.pk)
+        if quantity is not None:
+            item.quantity = quantity
+        return quantity
+
+    def set_quantity(self, item, quantity):
+        item.quantity = quantity
+        item.save(update_fields=['quantity', 'updated_at'])
+
+    def remove(self, item, max_quantity=None):
+        """Delete the line, only if its quantity is at most ``max_quantity`` when given; return whether it was."""
+        lines = Cart.objects.filter(pk=item.pk, user_id=item.user_id)
+        if max_quantity is not None:
+            lines = lines.filter(quantity__lte=max_quantity)
+        deleted, _ = lines.delete()
+        return bool(deleted)
+
+    def invalidate(self, user_id, product_ids=None):
+        """The table was written directly for ``product_ids`` (every line of the user's when None)."""
+
+    def flush(self, user_id=None):
+        """Write pending quantity changes to the table and return the number of carts written."""
+        return 0
+
+
+class RedisCartStorage(DatabaseCartStorage):
+    def __init__(self, client=None, ttl=DEFAULT_TTL):
+        if client is None:
+            from django_redis import get_redis_connection
+            client = get_redis_connection('default')
+        self.redis = client
+        self.ttl = ttl
+        self.add_script = client.register_script(ADD_SCRIPT)
+        self.remove_script = client.register_script(REMOVE_SCRIPT)
+
+    def _key(self, user_id):
+        return CART_KEY.format(user_id=user_id)
+
+    def _overlay(self, user_id, items):
+        if items:
+            quantities = self.redis.hmget(self._key(user_id), [item.product_id for item in items])
+            for item, quantity in zip(items, quantities):
+                if quantity is not None:
+                    item.quantity = int(quantity)
+        return items
+
+    def items(self, user_id):
+        return self._overlay(user_id, super().items(user_id))
+
+    def item(self, user_id, pk):
+        return self._overlay(user_id, [super().item(user_id, pk)])[0]
+
+    def create(self, user_id, product, quantity):
+        item = super().create(user_id, product, quantity)
+        # The row is current; drop anything a racing change left for an earlier line of this product
+        self.redis.hdel(self._key(user_id), product.id)
+        return item
+
+    def add(self, item, delta, check_stock=False):
+        # The stock read with the line is the limit; checkout checks it again against the table
+        limit = -1
+        if check_stock:
+            if not item.product.is_active:
+                return None
+            limit = item.product.stock_quantity
+        quantity = self.add_script(keys=[self._key(item.user_id), DIRTY_CARTS_KEY],
+                                   args=[item.product_id, item.quantity, delta, limit, self.ttl, item.user_id])
+        if quantity is not None:
+            item.quantity = quantity
+        return quantity
+
+    def set_quantity(self, item, quantity):
+        key = self._key(item.user_id)
+        pipe = self.redis.pipeline()
+        pipe.hset(key, item.product_id, quantity)
+        pipe.expire(key, self.ttl)
+        pipe.sadd(DIRTY_CARTS_KEY, item.user_id)
+        pipe.execute()
+        item.quantity = quantity
+
+    def remove(self, item, max_quantity=None):
+        # The hash holds the current quantity, so the condition is checked there
+        if not self.remove_script(keys=[self._key(item.user_id)],
+                                  args=[item.product_id, item.quantity, -1 if max_quantity is None else max_quantity]):
+            return False
+        return super().remove(item)
+
+    def invalidate(self, user_id, product_ids=None):
+        if product_ids is None:
+            self.redis.delete(self._key(user_id))
+        elif product_ids:
+            self.redis.hdel(self._key(user_id), *product_ids)
+
+    def flush(self, user_id=None):
+        if user_id is not None:
+            return self._flush_users([user_id]) if self.redis.srem(DIRTY_CARTS_KEY, user_id) else 0
+
+        flushed = 0
+        while True:
+            user_ids = [int(user_id) for user_id in self.redis.spop(DIRTY_CARTS_KEY, FLUSH_BATCH_SIZE) or []]
+            if not user_ids:
+                return flushed
+            flushed += self._flush_users(user_ids)
+
+    def _flush_users(self, user_ids):
+        # Users are taken off the dirty set before their hash is read, so a change racing the
+        # flush marks them again and is written by the next one
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.hgetall(self._key(user_id))
+            quantities = {
+                (user_id, int(product_id)): int(quantity)
+                for user_id, cart in zip(user_ids, pipe.execute())
+                for product_id, quantity in cart.items()
+            }
+
+            now = timezone.now()
+            changed = []
+            for item in Cart.objects.filter(user_id__in=user_ids):
+                quantity = quantities.get((item.user_id, item.product_id))
+                if quantity is not None and quantity > 0 and quantity != item.quantity:
+                    item.quantity, item.updated_at = quantity, now
+                    changed.append(item)
+            Cart.objects.bulk_update(changed, ['quantity', 'updated_at'], batch_size=FLUSH_BATCH_SIZE)
+        except Exception:
+            self.redis.sadd(DIRTY_CARTS_KEY, *user_ids)
+            raise
+
+        logger.info("Flushed %s cart lines for %s users", len(changed), len(user_ids))
+        return len(user_ids)
+
+
+_storage = None
+
+
+def get_cart_storage():
+    global _storage
+    if _storage is None:
+        backend = getattr(settings, 'CART_STORAGE', 'database')
+        if backend == 'redis':
+            if not settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+                raise ImproperlyConfigured("CART_STORAGE='redis' needs the django_redis cache backend.")
+            _storage = RedisCartStorage(ttl=getattr(settings, 'CART_STORAGE_TTL', DEFAULT_TTL))
+        elif backend == 'database':
+            _storage = DatabaseCartStorage()
+        else:
+            raise ImproperlyConfigured(f"CART_STORAGE must be 'database' or 'redis', not {backend!r}")
+    return _storage
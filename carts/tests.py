@@ -1,9 +1,28 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipIf
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from products.models import Product, Category
+from discounts.cache import get_discount_rules_version, invalidate_discount_rules_cache
+from discounts.engine import DiscountEngine
+from discounts.models import DiscountRule
+from discount_engine.throttling import get_token_buckets
 from .models import Cart
+from .guest import GUEST_CART_COOKIE
+from .snapshots import PRICED_CART_CACHE_KEY, price_cart
+from .storage import CART_KEY, DIRTY_CARTS_KEY, DatabaseCartStorage, RedisCartStorage
 
 User = get_user_model()
 
@@ -93,3 +112,468 @@ class CartAPITestCase(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Cart.objects.count(), 0)
+
+
+class CartBulkTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(email="bulk@example.com", password="bulkpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name="Groceries")
+        self.products = [
+            Product.objects.create(name=f"Item {index}", price=Decimal('10.00'), stock_quantity=5, category=self.category)
+            for index in range(5)
+        ]
+        self.url = reverse("cart-bulk")
+
+    def _quantities(self):
+        return dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+
+    def test_bulk_changes_apply_in_one_request(self):
+        first, second, third, fourth, fifth = self.products
+        Cart.objects.create(user=self.user, product=first, quantity=1)
+        Cart.objects.create(user=self.user, product=second, quantity=2)
+
+        response = self.client.post(self.url, {"items": [
+            {"product": first.id, "quantity": 2},
+            {"product": second.id, "quantity": -2},
+            {"product": third.id, "quantity": 1},
+            {"product": third.id, "quantity": 2},
+            {"product": fourth.id, "quantity": 4},
+            {"product": fifth.id, "quantity": -1},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._quantities(), {first.id: 3, third.id: 3, fourth.id: 4})
+        self.assertEqual(response.data['total_quantity'], 10)
+        self.assertEqual(response.data['original_price'], '100.00')
+
+    def test_one_invalid_item_leaves_the_cart_unchanged(self):
+        first, second = self.products[:2]
+        Cart.objects.create(user=self.user, product=first, quantity=4)
+        second.is_active = False
+        second.save()
+
+        response = self.client.post(self.url, {"items": [
+            {"product": first.id, "quantity": 2},
+            {"product": second.id, "quantity": 1},
+            {"product": 999999, "quantity": 1},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([item['product'] for item in response.data['items']], [first.id, second.id, 999999])
+        self.assertIn("Only 5", response.data['items'][0]['error'])
+        self.assertEqual(self._quantities(), {first.id: 4})
+
+    def test_zero_change_is_rejected(self):
+        response = self.client.post(self.url, {"items": [{"product": self.products[0].id, "quantity": 0}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._quantities(), {})
+
+
+class RedisCartStorageTestCase(TestCase):
+    def setUp(self):
+        import redis
+
+        client = redis.Redis.from_url(os.environ.get('TEST_REDIS_URL', 'redis://127.0.0.1:6379/15'),
+                                      socket_connect_timeout=0.5)
+        try:
+            client.ping()
+        except redis.exceptions.RedisError:
+            self.skipTest("Redis is not reachable")
+        self.storage = RedisCartStorage(client)
+
+        self.user = User.objects.create_user(email="redis-cart@example.com", password="redispass123")
+        category = Category.objects.create(name="Books")
+        self.product = Product.objects.create(name="Novel", price=Decimal('5.00'), stock_quantity=10, category=category)
+        self.addCleanup(client.delete, CART_KEY.format(user_id=self.user.id), DIRTY_CARTS_KEY)
+
+    def test_quantity_changes_reach_the_table_on_flush(self):
+        row = Cart.objects.create(user=self.user, product=self.product, quantity=1)
+
+        with self.assertNumQueries(1):
+            line = self.storage.item(self.user.id, row.pk)
+            self.assertEqual(self.storage.add(line, 2), 3)
+            self.assertEqual(self.storage.add(line, -1), 2)
+        self.assertEqual(Cart.objects.get(pk=row.pk).quantity, 1)
+        self.assertEqual([item.quantity for item in self.storage.items(self.user.id)], [2])
+
+        self.assertEqual(self.storage.flush(), 1)
+        self.assertEqual(Cart.objects.get(pk=row.pk).quantity, 2)
+        self.assertEqual(self.storage.flush(), 0)
+
+    def test_removed_line_does_not_leak_into_a_new_one(self):
+        line = self.storage.create(self.user.id, self.product, 1)
+        self.storage.add(line, 4)
+        self.storage.remove(line)
+
+        self.storage.create(self.user.id, self.product, 1)
+        self.assertEqual([item.quantity for item in self.storage.items(self.user.id)], [1])
+
+    def test_stale_reads_cannot_overshoot_stock_or_delete_twice(self):
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=3)
+        row = Cart.objects.create(user=self.user, product=self.product, quantity=2)
+        first, second = self.storage.item(self.user.id, row.pk), self.storage.item(self.user.id, row.pk)
+
+        self.assertEqual(self.storage.add(first, 1, check_stock=True), 3)
+        self.assertIsNone(self.storage.add(second, 1, check_stock=True))
+        self.assertFalse(self.storage.remove(second, max_quantity=1))
+        self.assertTrue(Cart.objects.filter(pk=row.pk).exists())
+
+
+class CartQuantityRaceTestCase(TestCase):
+    """Two requests that read the same line before either writes, as double taps do."""
+
+    def setUp(self):
+        self.storage = DatabaseCartStorage()
+        self.user = User.objects.create_user(email="race@example.com", password="racepass123")
+        category = Category.objects.create(name="Toys")
+        self.product = Product.objects.create(name="Kite", price=Decimal('20.00'), stock_quantity=10, category=category)
+        self.row = Cart.objects.create(user=self.user, product=self.product, quantity=1)
+
+    def _read_twice(self):
+        return self.storage.item(self.user.id, self.row.pk), self.storage.item(self.user.id, self.row.pk)
+
+    def test_concurrent_increases_are_not_lost(self):
+        first, second = self._read_twice()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.storage.add(first, 1, check_stock=True), 2)
+        self.assertEqual(self.storage.add(second, 1, check_stock=True), 3)
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.quantity, 3)
+
+    def test_without_update_returning_the_quantity_is_read_back(self):
+        first, second = self._read_twice()
+        with mock.patch.object(connection, 'vendor', 'mysql'), self.assertNumQueries(2):
+            self.assertEqual(self.storage.add(first, 1, check_stock=True), 2)
+        with mock.patch('carts.storage.supports_update_returning', return_value=False):
+            self.assertEqual(self.storage.add(second, 1, check_stock=True), 3)
+            self.assertIsNone(self.storage.add(second, -5))
+
+    def test_concurrent_increases_cannot_overshoot_stock(self):
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=2)
+        first, second = self._read_twice()
+        self.assertEqual(self.storage.add(first, 1, check_stock=True), 2)
+        self.assertIsNone(self.storage.add(second, 1, check_stock=True))
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.quantity, 2)
+
+    def test_increase_of_inactive_product_is_refused(self):
+        Product.objects.filter(pk=self.product.pk).update(is_active=False)
+        self.assertIsNone(self.storage.add(self.storage.item(self.user.id, self.row.pk), 1, check_stock=True))
+
+    def test_concurrent_decreases_delete_the_line_once(self):
+        Cart.objects.filter(pk=self.row.pk).update(quantity=2)
+        first, second = self._read_twice()
+        self.assertEqual(self.storage.add(first, -1), 1)
+        # The second one still sees 2, but may not take the line to zero with an update
+        self.assertIsNone(self.storage.add(second, -1))
+        self.assertTrue(self.storage.remove(second, max_quantity=1))
+        self.assertFalse(self.storage.remove(first, max_quantity=1))
+        self.assertFalse(Cart.objects.filter(pk=self.row.pk).exists())
+
+    def test_increase_endpoint_refuses_a_line_already_at_the_stock(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=2)
+        Cart.objects.filter(pk=self.row.pk).update(quantity=2)
+
+        response = client.post(reverse("cart-increase-quantity", kwargs={"pk": self.row.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Only 2", response.data['error'])
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.quantity, 2)
+
+    def _post_racing(self, url_name, concurrent_change):
+        """POST to the endpoint as if ``concurrent_change`` had happened right after the view read the line."""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        stale = [self.storage.item(self.user.id, self.row.pk)]
+        concurrent_change()
+        read_line = DatabaseCartStorage.item
+
+        def item(storage, user_id, pk):
+            if not stale:
+                return read_line(storage, user_id, pk)
+            # The first read still costs its query, but sees the line as it was before the change
+            Cart.objects.filter(pk=pk, user_id=user_id).select_related('product').first()
+            return stale.pop()
+
+        with mock.patch.object(DatabaseCartStorage, 'item', item):
+            return client.post(reverse(url_name, kwargs={"pk": self.row.pk}))
+
+    def test_increase_refused_by_the_update_reports_the_stock(self):
+        # The view's own check passes on what it read; the stock runs out before the update
+        response = self._post_racing(
+            "cart-increase-quantity", lambda: Product.objects.filter(pk=self.product.pk).update(stock_quantity=0))
+
+        # The query budget is enforced, so the re-read after the refused update fits in it
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Only 0", response.data['error'])
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.quantity, 1)
+
+    def test_zero_stock_is_refused_rather_than_retried(self):
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=0)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.post(reverse("cart-increase-quantity", kwargs={"pk": self.row.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Only 0", response.data['error'])
+
+    def test_decrease_refused_by_the_update_follows_the_concurrent_one(self):
+        Cart.objects.filter(pk=self.row.pk).update(quantity=2)
+
+        response = self._post_racing(
+            "cart-decrease-quantity", lambda: Cart.objects.filter(pk=self.row.pk).update(quantity=1))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Cart.objects.filter(pk=self.row.pk).exists())
+
+    def test_decrease_of_a_line_deleted_concurrently_is_not_found(self):
+        Cart.objects.filter(pk=self.row.pk).update(quantity=2)
+
+        response = self._post_racing(
+            "cart-decrease-quantity", lambda: Cart.objects.filter(pk=self.row.pk).delete())
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipIf(connection.vendor == 'sqlite', "SQLite locks whole tables, so concurrent writers fail instead of waiting")
+class ThreadedCartQuantityTestCase(TransactionTestCase):
+    def test_parallel_increases_stop_at_the_stock(self):
+        user = User.objects.create_user(email="threads@example.com", password="threadpass123")
+        category = Category.objects.create(name="Games")
+        product = Product.objects.create(name="Dice", price=Decimal('2.00'), stock_quantity=5, category=category)
+        row = Cart.objects.create(user=user, product=product, quantity=1)
+        storage = DatabaseCartStorage()
+        barrier = threading.Barrier(8)
+        results = []
+
+        def increase():
+            try:
+                item = storage.item(user.id, row.pk)
+                barrier.wait()
+                results.append(storage.add(item, 1, check_stock=True))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=increase) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        row.refresh_from_db()
+        self.assertEqual(row.quantity, 5)
+        self.assertEqual(sorted(quantity for quantity in results if quantity is not None), [2, 3, 4, 5])
+
+
+class GuestCartTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.url = reverse("guest-cart")
+        self.category = Category.objects.create(name="Electronics")
+        self.tv = Product.objects.create(name="Television", price=Decimal('6000.00'), stock_quantity=5,
+                                         category=self.category)
+        self.cable = Product.objects.create(name="Cable", price=Decimal('100.00'), stock_quantity=10,
+                                            category=self.category)
+        DiscountRule.objects.create(
+            name="10% off", description="10% off above ₹5000", discount_type='percentage',
+            min_order_value=5000, percentage=10, priority=1
+        )
+
+    def test_guest_cart_is_priced_without_writing_rows(self):
+        self.client.post(self.url, {"product": self.tv.id})
+        response = self.client.post(self.url, {"product": self.cable.id, "quantity": 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(item['product'], item['quantity']) for item in response.data['cart_items']],
+                         [(self.tv.id, 1), (self.cable.id, 2)])
+        self.assertEqual(response.data['original_price'], '6200.00')
+        self.assertEqual(Decimal(response.data['total_discount']), Decimal('620'))
+        self.assertFalse(Cart.objects.exists())
+        self.assertTrue(response.cookies[GUEST_CART_COOKIE]['httponly'])
+
+        self.assertEqual(self.client.get(self.url).data['total_quantity'], 3)
+
+    def test_adding_respects_stock(self):
+        self.client.post(self.url, {"product": self.tv.id, "quantity": 4})
+        response = self.client.post(self.url, {"product": self.tv.id, "quantity": 2})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url).data['total_quantity'], 4)
+
+    def test_set_quantity_and_remove(self):
+        self.client.post(self.url, {"product": self.tv.id})
+        self.client.post(self.url, {"product": self.cable.id})
+
+        response = self.client.put(reverse("guest-cart-item", kwargs={"product_id": self.cable.id}), {"quantity": 5})
+        self.assertEqual(response.data['total_quantity'], 6)
+        response = self.client.delete(reverse("guest-cart-item", kwargs={"product_id": self.tv.id}))
+        self.assertEqual([item['product'] for item in response.data['cart_items']], [self.cable.id])
+
+        response = self.client.delete(reverse("guest-cart-item", kwargs={"product_id": self.cable.id}))
+        self.assertEqual(response.data['cart_items'], [])
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, '')
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.post(self.url, {"product": self.tv.id})
+        value = self.client.cookies[GUEST_CART_COOKIE].value
+        self.client.cookies[GUEST_CART_COOKIE] = value.replace(f"{self.tv.id}:1", f"{self.tv.id}:3", 1)
+
+        self.assertEqual(self.client.get(self.url).data['cart_items'], [])
+
+    def test_login_merges_the_guest_cart(self):
+        user = User.objects.create_user(email="guest@example.com", password="guestpass123")
+        Cart.objects.create(user=user, product=self.tv, quantity=3)
+        gone = Product.objects.create(name="Remote", price=Decimal('50.00'), stock_quantity=10, category=self.category)
+        self.client.post(self.url, {"product": self.tv.id, "quantity": 4})
+        self.client.post(self.url, {"product": self.cable.id, "quantity": 2})
+        self.client.post(self.url, {"product": gone.id})
+        Product.objects.filter(pk=gone.pk).update(is_active=False)
+
+        response = self.client.post(reverse('login'), {"email": "guest@example.com", "password": "guestpass123"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, '')
+        # Quantities add up, capped at the stock; the inactive product is dropped
+        self.assertEqual(dict(Cart.objects.filter(user=user).values_list('product_id', 'quantity')),
+                         {self.tv.id: 5, self.cable.id: 2})
+
+
+class PricedCartSnapshotTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(
+            email="snapshot@example.com",
+            password="snapshotpass123",
+            first_name="Snap",
+            last_name="Shot",
+            phone="+919876543211"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            name="Television", description="4K TV", price=Decimal('6000.00'),
+            stock_quantity=10, category=self.category
+        )
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        DiscountRule.objects.create(
+            name="10% off", description="10% off above ₹5000", discount_type='percentage',
+            min_order_value=5000, percentage=10, priority=1
+        )
+
+    def test_snapshot_is_reused_until_rules_change(self):
+        url = reverse("cart-list-create")
+        first = self.client.get(url)
+        self.assertEqual(Decimal(first.data['total_discount']), Decimal('600'))
+
+        # Deactivating the rule through the ORM alone leaves the snapshot valid
+        DiscountRule.objects.update(is_active=False)
+        self.assertEqual(self.client.get(url).data['total_discount'], first.data['total_discount'])
+
+        invalidate_discount_rules_cache()
+        self.assertEqual(Decimal(self.client.get(url).data['total_discount']), Decimal('0'))
+
+    def test_snapshot_follows_cart_changes(self):
+        url = reverse("cart-list-create")
+        self.client.get(url)
+
+        Cart.objects.filter(user=self.user).update(quantity=2)
+        response = self.client.get(url)
+        self.assertEqual(Decimal(response.data['total_discount']), Decimal('1200'))
+
+    def test_rule_change_while_pricing_leaves_snapshot_stale(self):
+        url = reverse("cart-list-create")
+        get_cart_discounts = DiscountEngine.get_cart_discounts
+
+        def pricing_races_rule_change(engine):
+            result = get_cart_discounts(engine)
+            DiscountRule.objects.update(is_active=False)
+            invalidate_discount_rules_cache()
+            return result
+
+        with mock.patch.object(DiscountEngine, 'get_cart_discounts', pricing_races_rule_change):
+            price_cart(self.user.id, Cart.objects.filter(user=self.user).select_related('product'))
+
+        self.assertEqual(Decimal(self.client.get(url).data['total_discount']), Decimal('0'))
+
+    def test_reprice_carts_command_writes_snapshots_and_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = os.path.join(tmp_dir, 'reprice.json')
+            out = StringIO()
+            call_command('reprice_carts', checkpoint=checkpoint, stdout=out)
+
+            self.assertIn("Re-priced 1 carts", out.getvalue())
+            snapshot = cache.get(PRICED_CART_CACHE_KEY.format(user_id=self.user.id))
+            self.assertEqual(snapshot['applied_discounts'][0]['amount'], Decimal('600'))
+            with open(checkpoint) as fp:
+                self.assertEqual(json.load(fp)['completed'], [[self.user.id, self.user.id]])
+
+            # Resuming skips the shard that is already done
+            out = StringIO()
+            call_command('reprice_carts', checkpoint=checkpoint, resume=True, stdout=out)
+            self.assertIn("Re-priced 0 carts", out.getvalue())
+
+    def test_reprice_carts_resume_skips_only_completed_ranges(self):
+        users = [User.objects.create_user(email=f"shard{index}@example.com", password="shardpass123")
+                 for index in range(4)]
+        for user in users:
+            Cart.objects.create(user=user, product=self.product, quantity=1)
+        ids = sorted([self.user.id] + [user.id for user in users])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = os.path.join(tmp_dir, 'reprice.json')
+            with open(checkpoint, 'w') as fp:
+                # Out of order and overlapping, leaving ids[1] and ids[3] to do
+                json.dump({'rules_version': get_discount_rules_version(),
+                           'completed': [[ids[4], ids[4]], [ids[0], ids[0]], [ids[2], ids[2]], [ids[4], ids[4]]]}, fp)
+            out = StringIO()
+            call_command('reprice_carts', checkpoint=checkpoint, resume=True, shard_size=1, stdout=out)
+
+        self.assertIn("Re-priced 2 carts", out.getvalue())
+        repriced = {user_id for user_id in ids if cache.get(PRICED_CART_CACHE_KEY.format(user_id=user_id))}
+        self.assertEqual(repriced, {ids[1], ids[3]})
+
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
+    'DEFAULT_THROTTLE_RATES': {'cart': '3/min'},
+})
+class CartThrottleTestCase(APITestCase):
+    def setUp(self):
+        buckets = get_token_buckets()
+        buckets.clear()
+        self.addCleanup(buckets.clear)
+        self.user = User.objects.create_user(email="bot@example.com", password="botpass123")
+        self.other = User.objects.create_user(email="human@example.com", password="humanpass123")
+        self.url = reverse('cart-list-create')
+
+    def test_burst_then_throttled_per_user(self):
+        self.client.force_authenticate(user=self.user)
+        for _ in range(3):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+        # Another user's bucket is untouched
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_tokens_refill_over_time(self):
+        buckets = get_token_buckets()
+        self.assertEqual([buckets.take('refill', 1, 100)[0] for _ in range(2)], [True, False])
+        time.sleep(0.02)
+        self.assertTrue(buckets.take('refill', 1, 100)[0])
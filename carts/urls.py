@@ -3,6 +3,9 @@ from .views import *
 
 urlpatterns = [
     path('', CartListCreateAPIView.as_view(), name='cart-list-create'),
+    path('bulk/', CartBulkAPIView.as_view(), name='cart-bulk'),
+    path('guest/', GuestCartAPIView.as_view(), name='guest-cart'),
+    path('guest/<int:product_id>/', GuestCartItemAPIView.as_view(), name='guest-cart-item'),
     path('<int:pk>/', CartDetailAPIView.as_view(), name='cart-detail'),
     path('<int:pk>/increase/', IncreaseCartItemQuantityAPIView.as_view(), name='cart-increase-quantity'),
     path('<int:pk>/decrease/', DecreaseCartItemQuantityAPIView.as_view(), name='cart-decrease-quantity'),
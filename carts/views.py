@@ -1,19 +1,23 @@
+from collections import defaultdict
+
+from django.db import transaction
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
-from discounts.engine import DiscountEngine
-from .serializers import CartSerializer
-from django.shortcuts import get_object_or_404
+from .guest import MAX_GUEST_CART_ITEMS, guest_cart_items, load_guest_cart, price_guest_cart, store_guest_cart
+from .serializers import CartBulkSerializer, CartSerializer, GuestCartItemSerializer
+from .snapshots import get_priced_cart
+from .storage import get_cart_storage
 from decimal import Decimal
-from rest_framework.throttling import ScopedRateThrottle
+from discount_engine.throttling import TokenBucketThrottle
 from .models import *
 
 import logging
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 
 from .models import Cart, Product
@@ -23,13 +27,19 @@ logger = logging.getLogger(__name__)
 
 class CartListCreateAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'cart'
+    # A priced-cart miss adds the customer's history (two queries) to the cart itself
+    query_budget = {'GET': 3, 'POST': 3}
+    # Reads may come from a replica, except for a while after the user's own cart changes
+    replica_reads = ('GET',)
     
     def _get_cart_items(self, user):
         """Get cart items for the user."""
         try:
-            return Cart.objects.filter(user=user).order_by('created_at')
+            return get_cart_storage().items(user.id)
         except Exception as e:
-            logger.error(f"Error fetching cart items for user {user.id}: {e}")
+            logger.error("Error fetching cart items for user %s: %s", user.id, e)
             raise Exception("Error fetching cart items.")
     
     def _calculate_totals(self, cart_items, discounted_result):
@@ -44,59 +54,62 @@ class CartListCreateAPIView(APIView):
         try:
             product = Product.objects.get(id=product_info_id)
         except Product.DoesNotExist:
-            logger.warning(f"Product with id {product_info_id} not found.")
+            logger.warning("Product with id %s not found.", product_info_id)
             return None, False, "Product info does not exist."
 
         if not product.is_active:
-            logger.warning(f"Product with id {product_info_id} is no longer active.")
+            logger.warning("Product with id %s is no longer active.", product_info_id)
             return product, False, "The selected product is no longer available."
 
-        if product.stock_quantity and int(product.stock_quantity) < quantity:
-            logger.warning(f"Not enough stock for product {product_info_id}. Only {product.stock_quantity} available.")
+        if product.stock_quantity < quantity:
+            logger.warning("Not enough stock for product %s. Only %s available.", product_info_id, product.stock_quantity)
             return product, False, f"Only {product.stock_quantity} items left in stock."
 
         return product, True, ""
 
     def _get_or_create_cart_item(self, user, product: Product, data: dict) -> tuple[Cart, bool]:
         """Get existing cart item or create a new one."""
-        cart_item = Cart.objects.filter(user=user, product=product).first()
+        cart_item = Cart.objects.filter(user_id=user.id, product=product).first()
         if cart_item:
-            logger.info(f"Cart item found for product {product.id} for user {user.id}.")
+            logger.info("Cart item found for product %s for user %s.", product.id, user.id)
         else:
-            logger.info(f"Creating new cart item for product {product.id} for user {user.id}.")
+            logger.info("Creating new cart item for product %s for user %s.", product.id, user.id)
         return cart_item, cart_item is not None
 
     def _send_response(self, data: dict, status_code: int):
         """Helper to send standardized response."""
         return Response(data, status=status_code)
     
+    def _priced_cart_response(self, user):
+        """The whole cart with calculated prices and discounts."""
+        cart_items = list(self._get_cart_items(user))
+
+        # Reuse the priced-cart snapshot when it is still current, run the discount engine otherwise
+        discounted_result = get_priced_cart(user.id, cart_items)
+        return self._cart_response(cart_items, discounted_result)
+
+    def _cart_response(self, cart_items, discounted_result):
+        # Calculate totals
+        original_total, total_discount, discounted_total = self._calculate_totals(cart_items, discounted_result)
+
+        # Serialize cart items
+        serializer = CartSerializer(cart_items, many=True)
+
+        return self._send_response({
+            "cart_items": serializer.data,
+            "total_quantity": sum(item.quantity for item in cart_items),
+            "original_price": str(original_total),
+            "total_discount": str(total_discount),
+            "discounted_price": str(discounted_total),
+            "applied_discounts": discounted_result['applied_discounts']
+        }, status.HTTP_200_OK)
+
     def get(self, request):
         """Get cart items with calculated prices and discounts."""
         try:
-            cart_items = self._get_cart_items(request.user)
-
-            # Initialize and run discount engine
-            discount_engine = DiscountEngine(None, request.user)
-            discount_engine.cart_items = cart_items
-            discounted_result = discount_engine.get_cart_discounts()
-
-            # Calculate totals
-            original_total, total_discount, discounted_total = self._calculate_totals(cart_items, discounted_result)
-
-            # Serialize cart items
-            serializer = CartSerializer(cart_items, many=True)
-
-            return self._send_response({
-                "cart_items": serializer.data,
-                "total_quantity": sum(item.quantity for item in cart_items),
-                "original_price": str(original_total),
-                "total_discount": str(total_discount),
-                "discounted_price": str(discounted_total),
-                "applied_discounts": discounted_result['applied_discounts']
-            }, status.HTTP_200_OK)
-
+            return self._priced_cart_response(request.user)
         except Exception as e:
-            logger.error(f"Error fetching cart items: {e}")
+            logger.error("Error fetching cart items: %s", e)
             return self._send_response({"error": "Internal server error."}, status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def post(self, request):
@@ -107,7 +120,7 @@ class CartListCreateAPIView(APIView):
         product_id = data.get('product')
         quantity = int(data.get('quantity', 1))
 
-        if not product_id or not quantity:
+        if not product_id or quantity < 1:
             logger.warning("Missing product info or quantity in request.")
             return self._send_response({"error": "Product info and quantity are required."}, status.HTTP_400_BAD_REQUEST)
 
@@ -121,46 +134,191 @@ class CartListCreateAPIView(APIView):
 
         try:
             if exists:
-                # Update existing cart item
-                cart_item.quantity += quantity
-                cart_item.save()
-                logger.info(f"Updated cart item for product {product.id} for user {request.user.id}.")
+                # Update existing cart item; the stock check covers the whole line and is part of the update
+                if get_cart_storage().add(cart_item, quantity, check_stock=True) is None:
+                    logger.warning("Not enough stock to add %s more of product %s for user %s.", quantity, product.id, request.user.id)
+                    return self._send_response({"error": f"Only {product.stock_quantity} items left in stock."},
+                                               status.HTTP_400_BAD_REQUEST)
+                logger.info("Updated cart item for product %s for user %s.", product.id, request.user.id)
                 return self._send_response(CartSerializer(cart_item).data, status.HTTP_200_OK)
 
-            # Create new cart item
-            serializer = CartSerializer(data=data)
-            if serializer.is_valid():
-                cart_item = serializer.save(user=request.user)
-                logger.info(f"Created new cart item for product {product.id} for user {request.user.id}.")
-                return self._send_response(CartSerializer(cart_item).data, status.HTTP_201_CREATED)
+            # Create new cart item from the product validated above rather than looking it up again
+            cart_item = get_cart_storage().create(request.user.id, product, quantity)
+            logger.info("Created new cart item for product %s for user %s.", product.id, request.user.id)
+            return self._send_response(CartSerializer(cart_item).data, status.HTTP_201_CREATED)
+
+        except Exception as e:
+            logger.error("Error processing cart item: %s", e)
+            return self._send_response({"error": "Internal server error."}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class CartBulkAPIView(CartListCreateAPIView):
+    """
+    Apply quantity changes to many cart lines in one request (reorders, bundles)
+    and return the re-priced cart.
+
+    Products are validated in one query and the lines are upserted in one
+    statement. Either every change applies or, if any product is missing,
+    unavailable or short of stock, none does.
+    """
+    http_method_names = ['post', 'options']
+    # Products, locked cart lines, upsert, delete, the cart itself, a priced-cart miss and, when the
+    # transaction is nested (as in tests), its savepoint and release
+    query_budget = {'POST': 8}
+
+    def _apply_changes(self, user, deltas):
+        """Write the changes and return the per-product errors, if any (nothing is written then)."""
+        storage = get_cart_storage()
+        # The lines are changed in the table, so it must hold any quantity changes still pending
+        storage.flush(user.id)
+        products = Product.objects.in_bulk(deltas)
+        current = dict(Cart.objects.select_for_update()
+                       .filter(user_id=user.id, product_id__in=deltas)
+                       .values_list('product_id', 'quantity'))
+
+        errors, upserts, removals = [], [], []
+        for product_id, delta in deltas.items():
+            product = products.get(product_id)
+            quantity = current.get(product_id, 0) + delta
+            if product is None:
+                errors.append({"product": product_id, "error": "Product info does not exist."})
+            elif delta > 0 and not product.is_active:
+                errors.append({"product": product_id, "error": "The selected product is no longer available."})
+            elif delta > 0 and product.stock_quantity < quantity:
+                errors.append({"product": product_id, "error": f"Only {product.stock_quantity} items left in stock."})
+            elif quantity > 0:
+                upserts.append(Cart(user_id=user.id, product=product, quantity=quantity))
+            elif product_id in current:
+                removals.append(product_id)
+
+        if errors:
+            return errors
+        if upserts:
+            Cart.objects.bulk_create(upserts, update_conflicts=True, unique_fields=['user', 'product'],
+                                     update_fields=['quantity', 'updated_at'])
+        if removals:
+            Cart.objects.filter(user_id=user.id, product_id__in=removals).delete()
+        transaction.on_commit(lambda: storage.invalidate(user.id, list(deltas)))
+        logger.info("Applied %s cart changes for user %s (%s removed).", len(deltas), user.id, len(removals))
+        return []
 
-            logger.error(f"Cart item creation failed: {serializer.errors}")
+    def post(self, request):
+        """Add, top up or remove many cart items at once."""
+        serializer = CartBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            logger.warning("Invalid bulk cart request from user %s: %s", request.user.id, serializer.errors)
             return self._send_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
+        # Repeated products are merged into one change
+        deltas = defaultdict(int)
+        for item in serializer.validated_data['items']:
+            deltas[item['product']] += item['quantity']
+
+        with transaction.atomic():
+            errors = self._apply_changes(request.user, deltas)
+        if errors:
+            logger.warning("Rejected bulk cart changes for user %s: %s", request.user.id, errors)
+            return self._send_response({"error": "The cart was not changed.", "items": errors},
+                                       status.HTTP_400_BAD_REQUEST)
+
+        try:
+            return self._priced_cart_response(request.user)
         except Exception as e:
-            logger.error(f"Error processing cart item: {e}")
+            logger.error("Error pricing cart after bulk changes: %s", e)
             return self._send_response({"error": "Internal server error."}, status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    
+
+class GuestCartAPIView(CartListCreateAPIView):
+    """
+    The cart of a visitor who has not logged in, kept in a signed cookie (see
+    carts/guest.py) and merged into their own cart when they log in. Responses
+    always carry the whole re-priced cart.
+    """
+    # No token to check, and a guest cart does not depend on who is asking
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    http_method_names = ['get', 'post', 'options']
+    # The products in the cart, the one being added and, on a rule-set cache miss, the rules
+    query_budget = {'GET': 2, 'POST': 3}
+
+    def _guest_cart_response(self, request, quantities):
+        cart_items = guest_cart_items(quantities)
+        response = self._cart_response(cart_items, price_guest_cart(cart_items))
+        # Products deleted since they were added are dropped from the cookie too
+        live = {item.product_id: item.quantity for item in cart_items}
+        if live != load_guest_cart(request):
+            store_guest_cart(response, live)
+        return response
+
+    def _change_quantity(self, request, product_id, quantity):
+        """Set a product's quantity in the guest cart after checking the product and its stock."""
+        quantities = load_guest_cart(request)
+        if product_id not in quantities and len(quantities) >= MAX_GUEST_CART_ITEMS:
+            return self._send_response({"error": f"A guest cart holds at most {MAX_GUEST_CART_ITEMS} products. "
+                                                 "Log in to add more."}, status.HTTP_400_BAD_REQUEST)
+
+        product, is_valid, error = self._validate_product(product_id, quantity)
+        if not is_valid:
+            return self._send_response({"error": error}, status.HTTP_400_BAD_REQUEST)
+
+        quantities[product.id] = quantity
+        return self._guest_cart_response(request, quantities)
+
+    def get(self, request):
+        """Get the guest cart with calculated prices and discounts."""
+        return self._guest_cart_response(request, load_guest_cart(request))
+
+    def post(self, request):
+        """Add an item to the guest cart."""
+        serializer = GuestCartItemSerializer(data=request.data)
+        if not serializer.is_valid():
+            return self._send_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        product_id = serializer.validated_data['product']
+        quantity = load_guest_cart(request).get(product_id, 0) + serializer.validated_data['quantity']
+        return self._change_quantity(request, product_id, quantity)
+
+
+class GuestCartItemAPIView(GuestCartAPIView):
+    http_method_names = ['put', 'delete', 'options']
+    query_budget = {'PUT': 3, 'DELETE': 2}
+
+    def put(self, request, product_id):
+        """Set the quantity of a product in the guest cart."""
+        serializer = GuestCartItemSerializer(data={'product': product_id, 'quantity': request.data.get('quantity')})
+        if not serializer.is_valid():
+            return self._send_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        return self._change_quantity(request, product_id, serializer.validated_data['quantity'])
+
+    def delete(self, request, product_id):
+        """Remove a product from the guest cart."""
+        quantities = load_guest_cart(request)
+        quantities.pop(product_id, None)
+        return self._guest_cart_response(request, quantities)
+
+
 class CartDetailAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'cart'
+    query_budget = {'GET': 1, 'DELETE': 2}
     
     def _get_cart(self, user, pk):
         """Get the cart item for the user or raise 404 if not found."""
         try:
-            return get_object_or_404(Cart, pk=pk, user=user)
+            return get_cart_storage().item(user.id, pk)
         except Exception as e:
-            logger.error(f"Error fetching cart item with ID {pk} for user {user.id}: {e}")
+            logger.error("Error fetching cart item with ID %s for user %s: %s", pk, user.id, e)
             raise
 
     def _validate_product_availability(self, product, quantity):
         """Check if the product is available and if the quantity is valid."""
         if not product.is_active:
-            logger.warning(f"Product {product.id} is no longer available.")
+            logger.warning("Product %s is no longer available.", product.id)
             return {"error": "The selected product is no longer available."}, status.HTTP_400_BAD_REQUEST
 
-        if product.stock_quantity and int(product.stock_quantity) < quantity:
-            logger.warning(f"Insufficient stock for product {product.id}. Only {product.stock_quantity} available.")
+        if product.stock_quantity < quantity:
+            logger.warning("Insufficient stock for product %s. Only %s available.", product.id, product.stock_quantity)
             return {"error": f"Only {product.stock_quantity} items left in stock."}, status.HTTP_400_BAD_REQUEST
         
         return None, None
@@ -192,46 +350,63 @@ class CartDetailAPIView(APIView):
                 if validation_error:
                     return Response(validation_error, status=status_code)
 
-            # Save the updated cart item
+            # Save the updated cart item; the row now holds its quantity, for the old product and any new one
+            previous_product_id = cart.product_id
             serializer.save()
-            logger.info(f"Cart item {cart.id} updated successfully for user {request.user.id}.")
+            get_cart_storage().invalidate(request.user.id, [previous_product_id, cart.product_id])
+            logger.info("Cart item %s updated successfully for user %s.", cart.id, request.user.id)
             return Response(serializer.data)
 
-        logger.error(f"Failed to update cart item {cart.id} for user {request.user.id}: {serializer.errors}")
+        logger.error("Failed to update cart item %s for user %s: %s", cart.id, request.user.id, serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
         """Delete a cart item."""
         cart = self._get_cart(request.user, pk)
-        cart.delete()
-        logger.info(f"Cart item {cart.id} deleted successfully for user {request.user.id}.")
+        get_cart_storage().remove(cart)
+        logger.info("Cart item %s deleted successfully for user %s.", cart.id, request.user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class CartItemQuantityAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'cart'
+    query_budget = 2
     
     def _get_cart_and_product(self, user, pk):
         """Helper to fetch cart and product."""
-        cart = get_object_or_404(Cart, pk=pk, user=user)
+        cart = get_cart_storage().item(user.id, pk)
         product = cart.product
         return cart, product
 
     def _check_product_availability(self, product, quantity):
         """Check if the product is available and stock is sufficient."""
         if not product.is_active:
-            logger.warning(f"Product {product.id} is no longer available.")
+            logger.warning("Product %s is no longer available.", product.id)
             return {"error": "The selected product is no longer available."}, status.HTTP_400_BAD_REQUEST
 
-        if product.stock_quantity and int(product.stock_quantity) < quantity:
-            logger.warning(f"Insufficient stock for product {product.id}. Requested quantity {quantity}, available {product.stock_quantity}.")
+        if product.stock_quantity < quantity:
+            logger.warning("Insufficient stock for product %s. Requested quantity %s, available %s.", product.id, quantity, product.stock_quantity)
             return {"error": f"Only {product.stock_quantity} items left in stock."}, status.HTTP_400_BAD_REQUEST
 
         return None, None
 
+    def _changed_response(self, request, pk, delta):
+        """The line changed between reading it and the conditional update: explain on fresh data."""
+        cart, product = self._get_cart_and_product(request.user, pk)
+        validation_error, status_code = self._check_product_availability(product, cart.quantity + delta)
+        if validation_error:
+            return Response(validation_error, status=status_code)
+        logger.warning("Cart item %s changed concurrently for user %s.", pk, request.user.id)
+        return Response({"error": "The cart item was changed by another request. Please retry."},
+                        status=status.HTTP_409_CONFLICT)
+
 class IncreaseCartItemQuantityAPIView(CartItemQuantityAPIView):
     """Increase cart item quantity by 1."""
     permission_classes = [IsAuthenticated]
+    # The line, the conditional update and, when the update is refused, the line again
+    query_budget = 3
     def post(self, request, pk):
         """Increase the cart item quantity."""
         cart, product = self._get_cart_and_product(request.user, pk)
@@ -241,11 +416,12 @@ class IncreaseCartItemQuantityAPIView(CartItemQuantityAPIView):
         if validation_error:
             return Response(validation_error, status=status_code)
 
-        # Increase the quantity by 1
-        cart.quantity += 1
-        cart.save()
+        # Increase the quantity by 1; availability and stock are checked again by the update itself,
+        # so concurrent increases (double taps) can neither lose one another nor overshoot the stock
+        if get_cart_storage().add(cart, 1, check_stock=True) is None:
+            return self._changed_response(request, pk, 1)
 
-        logger.info(f"Cart item {cart.id} quantity increased for user {request.user.id}. New quantity: {cart.quantity}")
+        logger.info("Cart item %s quantity increased for user %s. New quantity: %s", cart.id, request.user.id, cart.quantity)
         
         serializer = CartSerializer(cart)
         return Response(serializer.data)
@@ -253,6 +429,8 @@ class IncreaseCartItemQuantityAPIView(CartItemQuantityAPIView):
 class DecreaseCartItemQuantityAPIView(CartItemQuantityAPIView):
     """Decrease cart item quantity by 1."""
     permission_classes = [IsAuthenticated]
+    # The line, the conditional update, the conditional delete and, when both are refused, the line again
+    query_budget = 4
     def post(self, request, pk):
         """Decrease the cart item quantity."""
         cart, product = self._get_cart_and_product(request.user, pk)
@@ -262,17 +440,18 @@ class DecreaseCartItemQuantityAPIView(CartItemQuantityAPIView):
         if validation_error:
             return Response(validation_error, status=status_code)
 
-        # Decrease the quantity by 1 or delete the cart item if quantity reaches 0
-        if cart.quantity > 1:
-            cart.quantity -= 1
-            cart.save()
-            logger.info(f"Cart item {cart.id} quantity decreased for user {request.user.id}. New quantity: {cart.quantity}")
+        # Decrease the quantity by 1 or delete the cart item if quantity reaches 0. Both are
+        # conditional, so a concurrent decrease that got there first is followed, not undone
+        storage = get_cart_storage()
+        if cart.quantity > 1 and storage.add(cart, -1) is not None:
+            logger.info("Cart item %s quantity decreased for user %s. New quantity: %s", cart.id, request.user.id, cart.quantity)
             serializer = CartSerializer(cart)
             return Response(serializer.data)
-        else:
-            cart.delete()
-            logger.info(f"Cart item {cart.id} deleted for user {request.user.id}.")
+
+        if storage.remove(cart, max_quantity=1):
+            logger.info("Cart item %s deleted for user %s.", cart.id, request.user.id)
             return Response(
                 {"message": "Cart item deleted successfully."},
                 status=status.HTTP_204_NO_CONTENT
-            )
\ No newline at end of file
+            )
+        return self._changed_response(request, pk, -1)
\ No newline at end of file
@@ -0,0 +1,29 @@
+from django.contrib import admin
+from .models import Coupon, CouponRedemption
+
+
+@admin.register(Coupon)
+class CouponAdmin(admin.ModelAdmin):
+    list_display = ('code', 'discount_type', 'times_redeemed', 'max_redemptions', 'is_active', 'starts_at', 'ends_at')
+    list_filter = ('discount_type', 'is_active')
+    search_fields = ('code', 'description')
+    readonly_fields = ('times_redeemed',)
+    fieldsets = (
+        ('Basic Information', {
+            'fields': ('code', 'description', 'discount_type', 'percentage', 'flat_amount', 'min_order_value', 'is_active')
+        }),
+        ('Limits', {
+            'fields': ('max_redemptions', 'max_redemptions_per_user', 'times_redeemed'),
+            'description': 'Leave a limit empty for unlimited redemptions'
+        }),
+        ('Schedule', {
+            'fields': ('starts_at', 'ends_at'),
+        }),
+    )
+
+
+@admin.register(CouponRedemption)
+class CouponRedemptionAdmin(admin.ModelAdmin):
+    list_display = ('coupon', 'user', 'order', 'amount', 'created_at')
+    search_fields = ('coupon__code', 'user__email')
+    readonly_fields = ('coupon', 'user', 'order', 'amount', 'created_at')
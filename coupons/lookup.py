@@ -0,0 +1,113 @@
+"""
+Coupon code lookups that keep invalid codes away from the database.
+
+Each process holds a bloom filter of every existing code plus a small LRU of
+codes that passed the filter but turned out not to exist. A code the filter
+rejects is definitely invalid, so guessing codes costs no queries; the filter
+is rebuilt when the shared ``coupon_codes_version`` in the cache changes.
+"""
+
+from collections import OrderedDict
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Coupon, normalize_code
+
+logger = logging.getLogger(__name__)
+
+COUPON_CODES_VERSION_KEY = 'coupon_codes_version'
+NEGATIVE_CACHE_SIZE = getattr(settings, 'COUPON_NEGATIVE_CACHE_SIZE', 10000)
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+# Sized for at least this many codes so a handful of coupons still filters well
+BLOOM_MIN_CAPACITY = 1024
+
+
+class BloomFilter:
+    def __init__(self, capacity, false_positive_rate=BLOOM_FALSE_POSITIVE_RATE):
+        capacity = max(capacity, BLOOM_MIN_CAPACITY)
+        self.size = max(int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.sha256(value.encode()).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:16], 'big')
+        return ((first + index * second) % self.size for index in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, value):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(value))
+
+
+class _CodeIndex:
+    def __init__(self, version):
+        self.version = version
+        codes = list(Coupon.objects.values_list('code', flat=True))
+        self.bloom = BloomFilter(len(codes))
+        for code in codes:
+            self.bloom.add(code)
+        self.missing = OrderedDict()
+        logger.info("Built coupon code filter with %s codes", len(codes))
+
+    def remember_missing(self, code):
+        self.missing[code] = True
+        self.missing.move_to_end(code)
+        if len(self.missing) > NEGATIVE_CACHE_SIZE:
+            self.missing.popitem(last=False)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_coupon_codes_version():
+    version = cache.get(COUPON_CODES_VERSION_KEY)
+    if version is None:
+        cache.add(COUPON_CODES_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(COUPON_CODES_VERSION_KEY)
+    return version
+
+
+def invalidate_coupon_codes():
+    """Make every process rebuild its code filter on its next lookup"""
+    try:
+        cache.incr(COUPON_CODES_VERSION_KEY)
+    except ValueError:
+        cache.add(COUPON_CODES_VERSION_KEY, time.time_ns(), None)
+
+
+def _get_index():
+    global _index
+    version = get_coupon_codes_version()
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = _CodeIndex(version)
+        return _index
+
+
+def find_coupon(code):
+    """Return the coupon for ``code``, or None if no such code exists"""
+    code = normalize_code(code)
+    index = _get_index()
+    if code not in index.bloom:
+        return None
+
+    with _lock:
+        if code in index.missing:
+            index.missing.move_to_end(code)
+            return None
+
+    coupon = Coupon.objects.filter(code=code).first()
+    if coupon is None:
+        with _lock:
+            index.remember_missing(code)
+    return coupon
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from coupons.redemption import reconcile_redemptions
+
+
+class Command(BaseCommand):
+    help = "Reset coupon redemption counters to the committed redemption counts. Run periodically, e.g. from cron."
+
+    def handle(self, *args, **options):
+        reconciled = reconcile_redemptions()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled redemption counts of {reconciled} coupons"))
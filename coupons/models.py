@@ -0,0 +1,101 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db import models
+
+from orders.models import Order
+
+User = get_user_model()
+
+
+def normalize_code(code):
+    return code.strip().upper()
+
+
+class Coupon(models.Model):
+    """A code customers enter at checkout for an extra discount on the order"""
+    DISCOUNT_TYPE_CHOICES = [
+        ('percentage', 'Percentage Discount'),
+        ('flat', 'Flat Discount'),
+    ]
+
+    code = models.CharField(max_length=50, unique=True)
+    description = models.TextField(blank=True)
+    discount_type = models.CharField(max_length=20, choices=DISCOUNT_TYPE_CHOICES)
+    percentage = models.DecimalField(max_digits=5, decimal_places=2,
+                                     validators=[MinValueValidator(0), MaxValueValidator(100)],
+                                     null=True, blank=True)
+    flat_amount = models.DecimalField(max_digits=10, decimal_places=2,
+                                      validators=[MinValueValidator(0)], null=True, blank=True)
+    min_order_value = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                          validators=[MinValueValidator(0)])
+
+    # Redemption limits; empty means unlimited
+    max_redemptions = models.PositiveIntegerField(null=True, blank=True)
+    max_redemptions_per_user = models.PositiveIntegerField(null=True, blank=True, default=1)
+
+    # Reconciled from CouponRedemption periodically, never written at checkout
+    times_redeemed = models.PositiveIntegerField(default=0, editable=False)
+
+    is_active = models.BooleanField(default=True)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.code
+
+    def clean(self):
+        if self.discount_type == 'percentage' and self.percentage is None:
+            raise ValidationError({'percentage': "Percentage coupons need a percentage."})
+        if self.discount_type == 'flat' and self.flat_amount is None:
+            raise ValidationError({'flat_amount': "Flat coupons need an amount."})
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': "The end of the schedule must be after its start."})
+
+    def save(self, *args, **kwargs):
+        from .lookup import invalidate_coupon_codes
+
+        self.code = normalize_code(self.code)
+        super().save(*args, **kwargs)
+        invalidate_coupon_codes()
+
+    def delete(self, *args, **kwargs):
+        from .lookup import invalidate_coupon_codes
+
+        result = super().delete(*args, **kwargs)
+        invalidate_coupon_codes()
+        return result
+
+    def is_active_at(self, when):
+        return (self.is_active
+                and (self.starts_at is None or self.starts_at <= when)
+                and (self.ends_at is None or when < self.ends_at))
+
+    def discount_for(self, amount):
+        """Discount this coupon gives on an order currently worth ``amount``"""
+        if self.discount_type == 'percentage':
+            return amount * (self.percentage / Decimal('100'))
+        # Don't discount more than the order value
+        return min(self.flat_amount, amount)
+
+
+class CouponRedemption(models.Model):
+    """One use of a coupon on an order; the source of truth for redemption counts"""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coupon_redemptions')
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='coupon_redemption')
+    amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['coupon', 'user'], name='redemption_coupon_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.coupon.code} on Order #{self.order_id}"
@@ -0,0 +1,204 @@
+"""
+Redemption limits enforced with atomic cache counters.
+
+Checkout increments a per-coupon and a per-user counter in the cache instead of
+locking a row of the coupon, so a popular code doesn't serialize checkouts.
+``CouponRedemption`` rows remain the source of truth: a missing counter is
+seeded from them, plus the reservations still in flight, which are counted
+under separate ``pending`` keys until their order commits or rolls back.
+``reconcile_coupon_redemptions`` periodically resets ``Coupon.times_redeemed``
+to the committed counts and drops the counters, so a drifted or leaked counter
+is re-seeded on its next use. Per-user keys carry a generation, which
+reconciliation bumps to drop every user's counter at once.
+"""
+
+import contextlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from discounts.models import AppliedDiscount
+from .lookup import find_coupon
+from .models import Coupon, CouponRedemption
+
+logger = logging.getLogger(__name__)
+
+COUPON_REDEMPTIONS_KEY = 'coupon:{coupon_id}:redemptions'
+COUPON_USER_REDEMPTIONS_KEY = 'coupon:{coupon_id}:user:{user_id}:redemptions:{generation}'
+COUPON_USER_GENERATION_KEY = 'coupon:user_redemptions:generation'
+COUPON_PENDING_KEY = 'coupon:{coupon_id}:pending'
+COUPON_USER_PENDING_KEY = 'coupon:{coupon_id}:user:{user_id}:pending'
+# Pending counts expire once idle this long, so one left behind by a crashed checkout heals
+COUPON_PENDING_TTL = getattr(settings, 'COUPON_PENDING_TTL', 60 * 60)
+# Per-user counters are re-seeded once expired; the TTL also clears those of past generations
+COUPON_USER_COUNTER_TTL = getattr(settings, 'COUPON_USER_COUNTER_TTL', 60 * 60 * 24)
+
+
+class CouponError(Exception):
+    """Raised when a coupon cannot be used for an order; the message is shown to the customer."""
+
+
+def _increment(key, seed, timeout=None):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Only the first process to seed the counter wins; everyone then increments it
+        cache.add(key, seed(), timeout)
+        return cache.incr(key)
+
+
+def _decrement(key):
+    try:
+        cache.decr(key)
+    except ValueError:
+        pass
+
+
+def _user_redemptions_key(coupon_id, user_id):
+    generation = cache.get_or_set(COUPON_USER_GENERATION_KEY, 0, None)
+    return COUPON_USER_REDEMPTIONS_KEY.format(coupon_id=coupon_id, user_id=user_id, generation=generation)
+
+
+def _other_pending(key):
+    """Reservations in flight under ``key`` besides the caller's own."""
+    return max((cache.get(key) or 1) - 1, 0)
+
+
+class Reservation:
+    """
+    One use of a coupon counted against its limits while its order is being placed.
+
+    Exactly one of ``confirm`` (the order committed, so its ``CouponRedemption``
+    row now accounts for the use) and ``release`` (it did not) takes effect.
+    """
+
+    def __init__(self, coupon_id, user_id):
+        self.coupon_id = coupon_id
+        self.user_id = user_id
+        self.pending_keys = [COUPON_PENDING_KEY.format(coupon_id=coupon_id),
+                             COUPON_USER_PENDING_KEY.format(coupon_id=coupon_id, user_id=user_id)]
+        self.settled = False
+        for key in self.pending_keys:
+            _increment(key, int, COUPON_PENDING_TTL)
+            cache.touch(key, COUPON_PENDING_TTL)
+
+    def _settle(self):
+        if self.settled:
+            return False
+        self.settled = True
+        for key in self.pending_keys:
+            _decrement(key)
+        return True
+
+    def confirm(self):
+        self._settle()
+
+    def release(self):
+        # Counters reconciled in the meantime were re-seeded with this reservation among the pending ones
+        if self._settle():
+            _decrement(_user_redemptions_key(self.coupon_id, self.user_id))
+            _decrement(COUPON_REDEMPTIONS_KEY.format(coupon_id=self.coupon_id))
+
+
+@contextlib.contextmanager
+def reservations_released_on_rollback():
+    """
+    Collect the ``Reservation`` objects of a checkout and release those whose
+    order did not commit: the view rolled back, raised, or the commit itself
+    failed. Enter it outside the checkout's ``transaction.atomic``. Inside an
+    enclosing transaction the outcome is not known yet, so nothing is released.
+    """
+    reservations = []
+    try:
+        yield reservations
+    finally:
+        if not transaction.get_connection().in_atomic_block:
+            for reservation in reservations:
+                reservation.release()
+
+
+def get_valid_coupon(code, when=None):
+    coupon = find_coupon(code)
+    if coupon is None or not coupon.is_active_at(when or timezone.now()):
+        raise CouponError("Invalid coupon code.")
+    return coupon
+
+
+def reserve_redemption(coupon, user_id):
+    """
+    Count one more use of ``coupon`` by ``user_id``, raising CouponError past either
+    limit. Returns the ``Reservation``, to be confirmed once the order commits.
+    """
+    reservation = Reservation(coupon.id, user_id)
+    pending_total, pending_user = reservation.pending_keys
+
+    total = _increment(COUPON_REDEMPTIONS_KEY.format(coupon_id=coupon.id), lambda: (
+        CouponRedemption.objects.filter(coupon=coupon).count() + _other_pending(pending_total)))
+    if coupon.max_redemptions is not None and total > coupon.max_redemptions:
+        _decrement(COUPON_REDEMPTIONS_KEY.format(coupon_id=coupon.id))
+        reservation._settle()
+        raise CouponError("This coupon has been fully redeemed.")
+
+    used = _increment(_user_redemptions_key(coupon.id, user_id), lambda: (
+        CouponRedemption.objects.filter(coupon=coupon, user_id=user_id).count() + _other_pending(pending_user)),
+        COUPON_USER_COUNTER_TTL)
+    if coupon.max_redemptions_per_user is not None and used > coupon.max_redemptions_per_user:
+        reservation.release()
+        raise CouponError("You have already used this coupon.")
+    return reservation
+
+
+def redeem_coupon(order, coupon):
+    """
+    Apply ``coupon`` to an order already priced by the discount engine, within the
+    checkout transaction, and return its ``Reservation``. The reservation is
+    confirmed when the transaction commits; the caller collects it in
+    ``reservations_released_on_rollback`` so it is released if it does not.
+    """
+    if order.total_amount < coupon.min_order_value:
+        raise CouponError(f"This coupon needs an order value of at least ₹{coupon.min_order_value}.")
+
+    reservation = reserve_redemption(coupon, order.user_id)
+    try:
+        amount = coupon.discount_for(order.discounted_amount)
+        order.discounted_amount -= amount
+        order.save(update_fields=['discounted_amount', 'updated_at'])
+
+        AppliedDiscount.objects.create(
+            order=order,
+            discount_name=f"Coupon {coupon.code}",
+            description=coupon.description or f"Coupon code {coupon.code}",
+            amount=amount,
+        )
+        CouponRedemption.objects.create(coupon=coupon, user_id=order.user_id, order=order, amount=amount)
+    except Exception:
+        reservation.release()
+        raise
+
+    transaction.on_commit(reservation.confirm)
+    logger.info("Redeemed coupon %s on order %s: ₹%s", coupon.code, order.id, amount)
+    return reservation
+
+
+def reconcile_redemptions():
+    """
+    Reset ``Coupon.times_redeemed`` to the committed redemption counts and drop
+    every counter, per user too. Counters are dropped rather than overwritten:
+    a reservation in flight may change one at any moment, and a counter
+    re-seeded on its next use counts the committed rows plus the pending
+    reservations.
+    """
+    totals = dict(CouponRedemption.objects.order_by().values_list('coupon_id').annotate(count=Count('id')))
+
+    coupons = list(Coupon.objects.only('id', 'times_redeemed'))
+    for coupon in coupons:
+        coupon.times_redeemed = totals.get(coupon.id, 0)
+    Coupon.objects.bulk_update(coupons, ['times_redeemed'], batch_size=500)
+
+    cache.delete_many([COUPON_REDEMPTIONS_KEY.format(coupon_id=coupon.id) for coupon in coupons])
+    _increment(COUPON_USER_GENERATION_KEY, int)
+    return len(coupons)
@@ -0,0 +1,197 @@
+from io import StringIO
+from unittest import mock
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from carts.models import Cart
+from coupons.lookup import BloomFilter, find_coupon
+from coupons.models import Coupon, CouponRedemption
+from coupons.redemption import (
+    COUPON_PENDING_KEY, COUPON_REDEMPTIONS_KEY, CouponError, reconcile_redemptions, reserve_redemption,
+)
+from discount_engine.throttling import get_token_buckets
+from discounts.models import AppliedDiscount
+from orders.models import Order
+from products.models import Category, Product
+
+User = get_user_model()
+
+
+class BloomFilterTestCase(SimpleTestCase):
+    def test_no_false_negatives(self):
+        codes = [f"CODE{index}" for index in range(1000)]
+        bloom = BloomFilter(len(codes))
+        for code in codes:
+            bloom.add(code)
+
+        self.assertTrue(all(code in bloom for code in codes))
+        false_positives = sum(f"GUESS{index}" in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class CouponLookupTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.coupon = Coupon.objects.create(code='welcome10', discount_type='percentage', percentage=10)
+
+    def test_codes_are_normalized(self):
+        self.assertEqual(self.coupon.code, 'WELCOME10')
+        self.assertEqual(find_coupon(' welcome10 '), self.coupon)
+
+    def test_invalid_codes_never_reach_database_twice(self):
+        guesses = [f'GUESS{index}' for index in range(1000)]
+        find_coupon('WELCOME10')
+
+        # Filter false positives cost one query each and are then remembered
+        for guess in guesses:
+            self.assertIsNone(find_coupon(guess))
+
+        with self.assertNumQueries(0):
+            for guess in guesses:
+                self.assertIsNone(find_coupon(guess))
+
+    def test_new_codes_are_found_after_creation(self):
+        self.assertIsNone(find_coupon('SUMMER'))
+        summer = Coupon.objects.create(code='SUMMER', discount_type='flat', flat_amount=100)
+        self.assertEqual(find_coupon('SUMMER'), summer)
+
+
+class CouponCheckoutTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        buckets = get_token_buckets()
+        buckets.clear()
+        self.addCleanup(buckets.clear)
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='coupon@example.com', password='couponpass123')
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Kitchen")
+        self.product = Product.objects.create(name="Kettle", category=self.category, price=1000, stock_quantity=50)
+        self.coupon = Coupon.objects.create(
+            code='SAVE100', discount_type='flat', flat_amount=100, max_redemptions=2, max_redemptions_per_user=1
+        )
+        self.url = reverse('create-order')
+
+    def checkout(self, user, code='SAVE100'):
+        Cart.objects.create(user=user, product=self.product, quantity=1)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client.post(self.url, {'coupon_code': code}, format='json')
+
+    def test_coupon_is_applied_and_recorded(self):
+        response = self.checkout(self.user)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Decimal(response.json()['discounted_amount']), Decimal('900.00'))
+        order = Order.objects.get(id=response.json()['id'])
+        self.assertTrue(AppliedDiscount.objects.filter(order=order, discount_name='Coupon SAVE100').exists())
+        self.assertTrue(CouponRedemption.objects.filter(coupon=self.coupon, user=self.user, order=order).exists())
+
+    def test_invalid_code_is_rejected(self):
+        response = self.checkout(self.user, code='NOPE')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], "Invalid coupon code.")
+        self.assertFalse(Order.objects.exists())
+
+    def test_per_user_limit(self):
+        self.assertEqual(self.checkout(self.user).status_code, status.HTTP_201_CREATED)
+
+        response = self.checkout(self.user)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], "You have already used this coupon.")
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_total_limit_does_not_touch_coupon_row(self):
+        users = [User.objects.create_user(email=f'shopper{index}@example.com', password='pass12345') for index in range(3)]
+
+        self.assertEqual(self.checkout(users[0]).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.checkout(users[1]).status_code, status.HTTP_201_CREATED)
+        response = self.checkout(users[2])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], "This coupon has been fully redeemed.")
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_redeemed, 0)
+
+    def test_reconcile_resets_counters_from_redemptions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.checkout(self.user)
+        cache.set(COUPON_REDEMPTIONS_KEY.format(coupon_id=self.coupon.id), 50, None)
+
+        call_command('reconcile_coupon_redemptions', stdout=StringIO())
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_redeemed, 1)
+        other = User.objects.create_user(email='other@example.com', password='otherpass123')
+        self.assertEqual(self.checkout(other).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(cache.get(COUPON_REDEMPTIONS_KEY.format(coupon_id=self.coupon.id)), 2)
+
+    def test_reconcile_clears_leaked_user_counters(self):
+        # Counted but never redeemed, e.g. a release that did not reach the cache
+        reserve_redemption(self.coupon, self.user.id).confirm()
+        self.assertEqual(self.checkout(self.user).status_code, status.HTTP_400_BAD_REQUEST)
+
+        reconcile_redemptions()
+
+        response = self.client.post(self.url, {'coupon_code': 'SAVE100'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_reconcile_counts_reservations_in_flight(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.checkout(self.user)
+        others = [User.objects.create_user(email=f'flight{index}@example.com', password='pass12345') for index in range(2)]
+        in_flight = reserve_redemption(self.coupon, others[0].id)
+
+        reconcile_redemptions()
+
+        with self.assertRaisesMessage(CouponError, "This coupon has been fully redeemed."):
+            reserve_redemption(self.coupon, others[1].id)
+        in_flight.release()
+        reserve_redemption(self.coupon, others[1].id)
+
+
+class CouponRollbackTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(email='rollback@example.com', password='rollbackpass123')
+        category = Category.objects.create(name="Kitchen")
+        product = Product.objects.create(name="Kettle", category=category, price=1000, stock_quantity=50)
+        Cart.objects.create(user=self.user, product=product, quantity=1)
+        self.coupon = Coupon.objects.create(code='ONCE', discount_type='flat', flat_amount=100,
+                                            max_redemptions=1, max_redemptions_per_user=1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('create-order')
+        buckets = get_token_buckets()
+        buckets.clear()
+        self.addCleanup(buckets.clear)
+
+    def checkout(self):
+        return self.client.post(self.url, {'coupon_code': 'ONCE'}, format='json')
+
+    def test_failed_commit_releases_reservation(self):
+        with mock.patch.object(connection, 'commit', side_effect=DatabaseError("commit failed")):
+            with self.assertRaises(DatabaseError):
+                self.checkout()
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.checkout().status_code, status.HTTP_201_CREATED)
+
+    def test_error_after_redemption_releases_reservation(self):
+        with mock.patch('orders.views.enqueue_order_post_processing', side_effect=RuntimeError):
+            self.assertEqual(self.checkout().status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        self.assertEqual(self.checkout().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(cache.get(COUPON_PENDING_KEY.format(coupon_id=self.coupon.id)), 0)
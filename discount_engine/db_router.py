@@ -0,0 +1,113 @@
+"""
+Read-replica routing for the reads that can tolerate replication lag.
+
+Everything goes to ``default`` unless code opts in:
+- views list the methods whose reads may use a replica in ``replica_reads``,
+  e.g. ``('GET',)``. ``ReplicaMiddleware`` marks such requests, and
+  ``ReplicaRouter`` then sends their reads to one of ``DATABASE_REPLICAS``;
+- other code asks ``read_alias(scope)`` for the alias to read from, e.g.
+  ``Model.objects.using(read_alias('discount_rules'))``.
+
+Read-your-writes: a write pins its scope to the primary for
+``REPLICA_STICKINESS_SECONDS``, which should comfortably exceed the replication
+lag. ``ReplicaMiddleware`` pins the user after every successful unsafe request
+(an order, a cart change), so their next reads see it; code that writes on
+behalf of a scope calls ``pin_to_primary(scope)``. Pins live in the default
+cache, so they hold across workers.
+
+Writes always go to ``default``. Reads for a request are only routed once DRF
+has authenticated it, so the user lookup itself reads the primary.
+"""
+
+from contextvars import ContextVar
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import SimpleLazyObject
+
+PINNED_KEY = 'replica:pinned:{scope}'
+DEFAULT_STICKINESS = 5  # seconds
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_request = ContextVar('replica_request', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_to_primary(scope):
+    """Send ``scope``'s reads to the primary until its replicas have caught up with a write."""
+    cache.set(PINNED_KEY.format(scope=scope), True, getattr(settings, 'REPLICA_STICKINESS_SECONDS', DEFAULT_STICKINESS))
+
+
+def is_pinned(scope):
+    return cache.get(PINNED_KEY.format(scope=scope)) is not None
+
+
+def read_alias(scope=None):
+    """A replica to read ``scope`` from, or the primary if there is none or the scope wrote recently."""
+    replicas = get_replicas()
+    if not replicas or (scope is not None and is_pinned(scope)):
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def _request_alias(request):
+    """The alias for a marked request's reads, decided once per request after authentication."""
+    alias = getattr(request, '_replica_alias', None)
+    if alias is None:
+        user = request.__dict__.get('user')
+        # Before DRF authenticates the request this is the session middleware's lazy user;
+        # evaluating it here would query from inside a query
+        if user is None or isinstance(user, SimpleLazyObject):
+            return DEFAULT_DB_ALIAS
+        alias = request._replica_alias = read_alias(user_scope(user.pk) if user.is_authenticated else None)
+    return alias
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        request = _request.get()
+        if request is None or not getattr(request, '_replica_reads', False):
+            return None  # The primary, or the database a related instance came from
+        return _request_alias(request)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user_scope(user.pk))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF and Django class-based views expose the class on the function returned by as_view()
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        request._replica_reads = request.method in getattr(view_class, 'replica_reads', ())
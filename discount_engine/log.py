@@ -0,0 +1,190 @@
+"""
+Logging plumbing that keeps I/O off the request thread.
+
+``QueueListenerHandler`` is what the loggers in ``LOGGING`` point at. Emitting
+only puts the record on a bounded in-memory queue. One listener thread per
+process drains the queue into the real handlers. If the queue is full,
+records are dropped and counted rather than blocking the request.
+
+``LockedRotatingFileHandler`` lets every worker process append to the same
+file: each write, and the rotation check, happen under an ``flock`` on a
+sidecar lock file, and a process reopens its stream when another one has
+rotated the file.
+
+``json_formatter`` renders records as one JSON object per line with structlog.
+"""
+
+import atexit
+import copy
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import os
+import queue
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process per log file is assumed
+    fcntl = None
+
+DEFAULT_QUEUE_SIZE = 10000
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full at shutdown; the listener is still draining it, so wait
+        self.queue.put(self._sentinel)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    ``QueueHandler`` that owns a ``QueueListener`` feeding ``handlers``.
+
+    ``handlers`` are handler objects; in ``LOGGING`` they are given as
+    ``cfg://handlers.<name>`` references. dictConfig resolves such a reference
+    when it is read, so the targets are only read once the first record arrives:
+    by then every handler has been built, whatever order dictConfig built them in.
+
+    The message is resolved on the calling thread, because the arguments may change
+    once the request moves on. Formatting, serialization and writes happen on the
+    listener thread. ``exc_info`` is kept so structured formatters can still render
+    the traceback.
+    """
+
+    def __init__(self, handlers, queue_size=DEFAULT_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.targets = handlers
+        self.dropped = 0
+        self.listener = None
+        self.closed = False
+        self.start_lock = threading.Lock()
+        atexit.register(self.close)
+        # A forked worker (e.g. gunicorn --preload) does not inherit the listener thread
+        os.register_at_fork(after_in_child=self._restart_listener)
+
+    def _start_listener(self):
+        with self.start_lock:
+            if self.listener is not None or self.closed:
+                return
+            # Indexing, not iterating, is what makes dictConfig resolve a reference
+            targets = [self.targets[index] for index in range(len(self.targets))]
+            for target in targets:
+                if not isinstance(target, logging.Handler):
+                    raise TypeError(f"QueueListenerHandler feeds handler objects, e.g. 'cfg://handlers.<name>', "
+                                    f"not {target!r}")
+            self.targets = targets
+            self.listener = _Listener(self.queue, *targets, respect_handler_level=True)
+            self.listener.start()
+
+    def _restart_listener(self):
+        # The lock may have been held by another thread at the fork
+        self.start_lock = threading.Lock()
+        if self.listener is None:
+            return
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.listener = _Listener(self.queue, *self.listener.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        if self.listener is None:
+            self._start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        with self.start_lock:
+            self.closed = True
+        if self.listener is not None:
+            # Drains whatever is still queued before returning
+            self.listener.stop()
+            self.listener = None
+            if self.dropped:
+                logging.getLogger(__name__).warning("Dropped %s log records while the log queue was full", self.dropped)
+        super().close()
+
+
+class LockedRotatingFileHandler(RotatingFileHandler):
+    """``RotatingFileHandler`` that is safe to share between processes."""
+
+    def __init__(self, filename, *args, **kwargs):
+        super().__init__(filename, *args, **kwargs)
+        self.lock_file = None
+        if fcntl:
+            self.lock_file = open(f"{self.baseFilename}.lock", 'a')
+            # flock is held per open file description, which a forked child would otherwise share
+            os.register_at_fork(after_in_child=self._reopen_lock_file)
+
+    def _reopen_lock_file(self):
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = open(f"{self.baseFilename}.lock", 'a')
+
+    def emit(self, record):
+        if self.lock_file is None:
+            super().emit(record)
+            return
+
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            if self._rotated_elsewhere():
+                self.close_stream()
+            super().emit(record)
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _rotated_elsewhere(self):
+        """Whether our stream still points at the file now at ``baseFilename``."""
+        if self.stream is None:
+            return False
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return True
+        opened = os.fstat(self.stream.fileno())
+        return (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+
+    def close_stream(self):
+        self.stream.close()
+        self.stream = None  # Reopened by the next emit
+
+    def close(self):
+        super().close()
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+
+def json_formatter():
+    """One JSON object per record: timestamp, level, logger, event, process/thread and any exception."""
+    # Imported here so processes logging in the verbose format never load structlog
+    import structlog
+
+    return structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=[
+            structlog.stdlib.add_log_level,
+            structlog.stdlib.add_logger_name,
+            structlog.processors.TimeStamper(fmt='iso', utc=True),
+            structlog.processors.CallsiteParameterAdder({
+                structlog.processors.CallsiteParameter.MODULE,
+                structlog.processors.CallsiteParameter.LINENO,
+                structlog.processors.CallsiteParameter.PROCESS,
+                structlog.processors.CallsiteParameter.THREAD,
+            }),
+        ],
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            # Tracebacks as data, without frame locals: they can hold credentials and are costly to render
+            structlog.processors.ExceptionRenderer(structlog.tracebacks.ExceptionDictTransformer(show_locals=False)),
+            structlog.processors.JSONRenderer(ensure_ascii=False),
+        ],
+    )
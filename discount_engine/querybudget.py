@@ -0,0 +1,145 @@
+"""
+Per-view SQL query budgets, to catch N+1 regressions before they ship.
+
+Views declare ``query_budget``: an int for every method, or a dict per method
+such as ``{'GET': 3}``. ``QueryBudgetMiddleware`` counts the queries and the
+database time of each request and, when a view goes over its budget, reports
+the count, the time and every statement that ran more than once. Statements
+are grouped by fingerprint, with literals stripped, and listed with the lines
+of project code that issued them.
+
+``QUERY_BUDGET_MODE`` selects what a violation does:
+- ``'raise'`` (the test runner) raises ``QueryBudgetExceeded``, failing the test;
+- ``'log'`` (DEBUG) logs a warning;
+- ``'off'`` (production) removes the middleware.
+
+Tests can hold any block of code to a budget with ``assert_query_budget``.
+"""
+
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+import logging
+import os
+import re
+import sys
+import sysconfig
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'log', 'raise')
+MAX_REPORTED_DUPLICATES = 5
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\((?:\s*(?:\?|%s)\s*,)*\s*(?:\?|%s)\s*\)")
+_STDLIB = sysconfig.get_paths()['stdlib']
+_WRAPPER_ARGS = {'execute', 'sql', 'params', 'many', 'context'}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """SQL with literals and IN-lists collapsed, so repeats of one statement compare equal."""
+    return _IN_LISTS.sub('(...)', _LITERALS.sub('?', sql))
+
+
+def _call_site():
+    """``file:line in function`` of the innermost project frame that issued a query."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        is_wrapper = _WRAPPER_ARGS <= set(code.co_varnames[:code.co_argcount])
+        if (not is_wrapper and not filename.startswith((_STDLIB, '<'))
+                and 'site-packages' not in filename):
+            return f"{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that records every statement, its duration and call site."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = defaultdict(lambda: {"count": 0, "sites": set()})
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            statement = self.statements[fingerprint(sql)]
+            statement["count"] += 1
+            statement["sites"].add(_call_site())
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def duplicates(self):
+        repeated = [(sql, stats) for sql, stats in self.statements.items() if stats["count"] > 1]
+        return sorted(repeated, key=lambda item: -item[1]["count"])
+
+    def report(self, label, budget):
+        lines = [f"{label} ran {self.count} queries ({self.duration * 1e3:.1f} ms in the database), budget {budget}"]
+        for sql, stats in self.duplicates()[:MAX_REPORTED_DUPLICATES]:
+            lines.append(f"  {stats['count']}x {sql[:300]}")
+            lines.extend(f"      from {site}" for site in sorted(stats["sites"]))
+        return "\n".join(lines)
+
+
+@contextmanager
+def assert_query_budget(budget, label="Block"):
+    """Fail with a duplicate-statement report if the block runs more than ``budget`` queries."""
+    with QueryRecorder().record() as recorder:
+        yield recorder
+    if recorder.count > budget:
+        raise QueryBudgetExceeded(recorder.report(label, budget))
+
+
+def get_query_budget(view_class, method):
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.mode = getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+        if self.mode not in MODES:
+            raise ValueError(f"QUERY_BUDGET_MODE must be one of {MODES}, not {self.mode!r}")
+        if self.mode == 'off':
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        with QueryRecorder().record() as recorder:
+            response = self.get_response(request)
+
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None and recorder.count > budget:
+            report = recorder.report(f"{request.method} {request.path}", budget)
+            if self.mode == 'raise':
+                raise QueryBudgetExceeded(report)
+            logger.warning(report)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF and Django class-based views expose the class on the function returned by as_view()
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        if view_class is not None:
+            request._query_budget = get_query_budget(view_class, request.method)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import copy
 from datetime import timedelta
 import os
 from pathlib import Path
@@ -46,6 +47,8 @@ INSTALLED_APPS = [
     'carts',
     'orders',
     'discounts',
+    'jobs',
+    'coupons',
     
     # 3rd party apps
     'rest_framework',
@@ -53,6 +56,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'discount_engine.traffic.TrafficCaptureMiddleware',
+    'discount_engine.querybudget.QueryBudgetMiddleware',
+    'discount_engine.db_router.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,7 +96,7 @@ if DEBUG:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH') or BASE_DIR / 'db.sqlite3',
         }
     }
 else:
@@ -105,6 +111,21 @@ else:
         }
     }
 
+# Read replicas for the reads that opt in, see discount_engine/db_router.py. DB_REPLICAS lists
+# PostgreSQL hosts, or SQLite files under DEBUG (a copy of db.sqlite3 stands in for a replica)
+def replica_databases(primary, locations, field):
+    """``replica_N`` aliases with their own copy of the primary's settings, ``field`` set to each location."""
+    return {f'replica_{index}': {**copy.deepcopy(primary), field: location}
+            for index, location in enumerate(locations, start=1)}
+
+
+DB_REPLICAS = [replica for replica in os.environ.get('DB_REPLICAS', '').split(',') if replica]
+DATABASES.update(replica_databases(DATABASES['default'], DB_REPLICAS, 'NAME' if DEBUG else 'HOST'))
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['discount_engine.db_router.ReplicaRouter']
+# Reads stay on the primary this long after a write, to outlast the replication lag
+REPLICA_STICKINESS_SECONDS = int(os.environ.get('REPLICA_STICKINESS_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -124,6 +145,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing: new hashes use Argon2id; PBKDF2 hashes are upgraded on the next login
+PASSWORD_HASHERS = [
+    'accounts.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19 * 1024))  # KiB
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+
+# Cart quantities: 'database' (the Cart table) or 'redis' (write-behind), see carts/storage.py
+CART_STORAGE = os.environ.get('CART_STORAGE', 'database')
+CART_STORAGE_TTL = int(os.environ.get('CART_STORAGE_TTL', 60 * 60 * 24 * 7))
+
+# Carts of visitors who have not logged in live in a signed cookie, see carts/guest.py
+GUEST_CART_MAX_AGE = int(os.environ.get('GUEST_CART_MAX_AGE', 60 * 60 * 24 * 30))
+
+# Warm each worker up before it takes traffic, see discounts/warmup.py
+WARMUP_ON_STARTUP = os.environ.get('WARMUP_ON_STARTUP', 'false').lower() in ('1', 'true', 'yes', 'on')
+
+# Login hashing runs on a bounded thread pool, see accounts/hashing.py
+AUTHENTICATION_BACKENDS = ['accounts.backends.PooledModelBackend']
+LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', os.cpu_count() or 2))
+LOGIN_HASH_QUEUE = int(os.environ.get('LOGIN_HASH_QUEUE', LOGIN_HASH_WORKERS * 4))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -154,9 +200,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Logging
 
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+os.makedirs(LOG_DIR, exist_ok=True)
 
+# Per-view query budgets, see discount_engine/querybudget.py: DEBUG logs a violation (tests fail on one,
+# see settings_test)
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'log' if DEBUG else 'off')
+
+# Sampled API traffic for benchmarks/replay.py, see discount_engine/traffic.py (0 disables capture)
+TRAFFIC_CAPTURE_RATE = float(os.environ.get('TRAFFIC_CAPTURE_RATE', 0))
+TRAFFIC_CAPTURE_KEY = os.environ.get('TRAFFIC_CAPTURE_KEY', '')
+TRAFFIC_CAPTURE_MAX_BYTES = int(os.environ.get('TRAFFIC_CAPTURE_MAX_BYTES', 1024 * 1024 * 50))
+TRAFFIC_CAPTURE_BACKUPS = int(os.environ.get('TRAFFIC_CAPTURE_BACKUPS', 5))
+
+# Records wait in a bounded queue per process (dropped when full); the file sink writes JSON lines or 'verbose' text
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_FILE_FORMAT = os.environ.get('LOG_FILE_FORMAT', 'json')
 
 LOGGING = {
     'version': 1,
@@ -171,6 +229,13 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'raw': {
+            'format': '{message}',
+            'style': '{',
+        },
+        'json': {
+            '()': 'discount_engine.log.json_formatter',
+        },
     },
 
     'handlers': {
@@ -180,34 +245,58 @@ LOGGING = {
         },
         'file': {
             'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
+            'class': 'discount_engine.log.LockedRotatingFileHandler',
             'filename': os.path.join(LOG_DIR, 'logs.log'),
             'maxBytes': 1024 * 1024 * 5,  # 5 MB
             'backupCount': 5,
-            'formatter': 'verbose',
+            'formatter': LOG_FILE_FORMAT,
+        },
+        'traffic': {
+            'level': 'INFO',
+            'class': 'discount_engine.log.LockedRotatingFileHandler',
+            'filename': os.path.join(LOG_DIR, 'traffic.jsonl'),
+            'maxBytes': TRAFFIC_CAPTURE_MAX_BYTES,
+            'backupCount': TRAFFIC_CAPTURE_BACKUPS,
+            'formatter': 'raw',
+        },
+        # Loggers only enqueue; a listener thread per process does the formatting and I/O
+        'queue': {
+            '()': 'discount_engine.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'queue_size': LOG_QUEUE_SIZE,
+        },
+        'traffic_queue': {
+            '()': 'discount_engine.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.traffic'],
+            'queue_size': LOG_QUEUE_SIZE,
         },
     },
 
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'django.request': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'WARNING',
             'propagate': False,
         },
         'django.db.backends': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'ERROR',
         },
         '__name__': {  # Custom logger for your APIs or modules
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
+        'traffic.capture': {
+            'handlers': ['traffic_queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     }
 }
 
@@ -219,8 +308,14 @@ REST_FRAMEWORK = {
         "dj_rest_auth.utils.JWTCookieAuthentication",
     ),
      'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Trusts the token's claims; use JWTAuthentication to load the user row per request
+        'accounts.authentication.StatelessJWTAuthentication',
     ),
+    # Token-bucket sizes per throttle_scope, see discount_engine/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'cart': os.environ.get('THROTTLE_RATE_CART', '120/min'),
+        'checkout': os.environ.get('THROTTLE_RATE_CHECKOUT', '20/min'),
+    },
 }
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=7),
@@ -234,7 +329,7 @@ SIMPLE_JWT = {
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
-    'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_USER_CLASS': 'accounts.authentication.ClaimsUser',
 
     'JTI_CLAIM': 'jti',
     'ROTATE_REFRESH_TOKENS': True,  # Issues new refresh token on each refresh
@@ -263,7 +358,7 @@ else:
     CACHES = {
         "default": {
             "BACKEND": "django_redis.cache.RedisCache",
-            "LOCATION": os.environ.get("PGDATABASE","redis://127.0.0.1:6379/1"),
+            "LOCATION": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/1"),
             "OPTIONS": {
                 "CLIENT_CLASS": "django_redis.client.DefaultClient",
             }
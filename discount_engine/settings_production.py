@@ -0,0 +1,96 @@
+"""
+Production settings for discount_engine project.
+
+Extends the base settings with persistent/pooled database connections and a
+tuned Redis connection pool. Select it with:
+
+    DJANGO_SETTINGS_MODULE=discount_engine.settings_production
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_bool(name, default=False):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+# Signs the JWTs and the guest-cart cookies, so the development key must never be used here
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured("DJANGO_SECRET_KEY must be set in production.")
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
+
+
+# Database
+# Either Django's native psycopg 3 pool (DB_POOL=true) or persistent connections
+# with health checks, so a request no longer pays a TCP + auth handshake.
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get("PGDATABASE"),
+        'USER': os.environ.get("PGUSER"),
+        'PASSWORD': os.environ.get("PGPASSWORD"),
+        'HOST': os.environ.get("PGHOST"),
+        'PORT': os.environ.get("PGPORT"),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+}
+
+if env_bool('DB_POOL'):
+    # Requires psycopg 3 with psycopg-pool; pooling replaces persistent connections
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': env_int('DB_POOL_MIN_SIZE', 2),
+        'max_size': env_int('DB_POOL_MAX_SIZE', 10),
+        'timeout': env_int('DB_POOL_TIMEOUT', 10),
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = env_int('DB_CONN_MAX_AGE', 60)
+
+# Read replicas: the primary's settings on each of the DB_REPLICAS hosts, see discount_engine/db_router.py
+DATABASES.update(replica_databases(DATABASES['default'], DB_REPLICAS, 'HOST'))  # noqa: F405
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+
+# Redis cache
+
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/1"),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "SOCKET_CONNECT_TIMEOUT": 2,
+            "SOCKET_TIMEOUT": 2,
+            "CONNECTION_POOL_KWARGS": {
+                # One pool per worker process; size it to the worker's thread count
+                "max_connections": env_int('REDIS_MAX_CONNECTIONS', 50),
+                "retry_on_timeout": True,
+                "health_check_interval": 30,
+            },
+        }
+    }
+}
+
+
+# Workers load the URLconf, open their connections and load the discount rules before serving.
+# Off by default: a server that preloads the app before forking would share those connections
+# between its workers. Turn it on only without preloading, or call warm_up() from a post-fork hook.
+WARMUP_ON_STARTUP = env_bool('WARMUP_ON_STARTUP')
+
+
+# Query budgets are enforced in tests and logged in development only
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'off')
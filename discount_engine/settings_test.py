@@ -0,0 +1,19 @@
+"""
+Test settings for discount_engine project.
+
+Extends the base settings for the test suite. ``manage.py test`` selects it
+unless DJANGO_SETTINGS_MODULE is set; other runners should point
+DJANGO_SETTINGS_MODULE at it:
+
+    DJANGO_SETTINGS_MODULE=discount_engine.settings_test
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+
+# Going over a view's query budget fails the test, see discount_engine/querybudget.py
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'raise')
+
+# A second database for the replica routing tests, which opt in with override_settings(DATABASE_REPLICAS=...)
+DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.replica.sqlite3'}  # noqa: F405
@@ -0,0 +1,195 @@
+import json
+import logging
+import logging.config
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from discount_engine.log import LockedRotatingFileHandler, QueueListenerHandler, json_formatter
+from discount_engine.throttling import get_token_buckets
+from discount_engine.traffic import anonymize_user_id
+from products.models import Category, Product
+
+User = get_user_model()
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class _BlockingHandler(_ListHandler):
+    def __init__(self, name):
+        super().__init__(name)
+        self.entered = threading.Event()
+        self.unblock = threading.Event()
+
+    def emit(self, record):
+        self.entered.set()
+        self.unblock.wait(5)
+        super().emit(record)
+
+
+class LogPipelineTestCase(SimpleTestCase):
+    def _record(self, msg, *args, exc_info=None):
+        return logging.LogRecord('tests', logging.INFO, __file__, 1, msg, args, exc_info)
+
+    def test_queue_handler_hands_records_to_listener(self):
+        sink = _ListHandler('test_sink')
+        handler = QueueListenerHandler([sink])
+        self.addCleanup(handler.close)
+
+        args = {"items": [1]}
+        handler.handle(self._record("cart %s", args))
+        args["items"].append(2)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            handler.handle(self._record("failed", exc_info=sys.exc_info()))
+        handler.close()
+
+        # The message was resolved when logged, not when the listener got to it
+        self.assertEqual([record.getMessage() for record in sink.records], ["cart {'items': [1]}", "failed"])
+        self.assertIs(sink.records[1].exc_info[0], ValueError)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        sink = _BlockingHandler('test_slow_sink')
+        handler = QueueListenerHandler([sink], queue_size=1)
+        self.addCleanup(handler.close)
+        self.addCleanup(sink.unblock.set)
+
+        handler.handle(self._record("record %s", 0))
+        self.assertTrue(sink.entered.wait(5))
+        # The listener is stuck writing record 0: record 1 fills the queue and the rest are dropped
+        for index in range(1, 4):
+            handler.handle(self._record("record %s", index))
+        self.assertEqual(handler.dropped, 2)
+
+        sink.unblock.set()
+        with self.assertLogs('discount_engine.log', 'WARNING'):
+            handler.close()
+        self.assertEqual([record.getMessage() for record in sink.records], ["record 0", "record 1"])
+
+    def test_config_references_resolve_whatever_the_build_order(self):
+        # 'a_queue' sorts first, so dictConfig builds it before the handler it feeds
+        configurator = logging.config.DictConfigurator({'handlers': {
+            'a_queue': {'()': 'discount_engine.log.QueueListenerHandler', 'handlers': ['cfg://handlers.z_sink']},
+            'z_sink': {'()': 'discount_engine.tests._ListHandler', 'name': 'z_sink'},
+        }})
+        handlers = configurator.config['handlers']
+        handler = configurator.configure_handler(handlers['a_queue'])
+        self.addCleanup(handler.close)
+        sink = handlers['z_sink'] = configurator.configure_handler(handlers['z_sink'])
+
+        handler.handle(self._record("queued before the sink was built"))
+        handler.close()
+        self.assertEqual([record.getMessage() for record in sink.records], ["queued before the sink was built"])
+
+    def test_handlers_sharing_a_file_follow_each_others_rotation(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        directory = tmp_dir.name
+        path = os.path.join(directory, 'shared.log')
+        # Two handlers on one file stand in for two worker processes
+        writers = [LockedRotatingFileHandler(path, maxBytes=60, backupCount=50) for _ in range(2)]
+        for writer in writers:
+            writer.setFormatter(logging.Formatter('%(message)s'))
+            self.addCleanup(writer.close)
+
+        for index in range(40):
+            writers[index % 2].handle(self._record("line %s", index))
+
+        lines = []
+        for name in os.listdir(directory):
+            if not name.endswith('.lock'):
+                with open(os.path.join(directory, name)) as fh:
+                    lines.extend(fh.read().splitlines())
+        self.assertGreater(len(os.listdir(directory)), 3)
+        self.assertEqual(sorted(lines, key=lambda line: int(line.split()[1])), [f"line {index}" for index in range(40)])
+
+    def test_json_formatter_renders_one_object_per_record(self):
+        rendered = json.loads(json_formatter().format(self._record("Applied %s: ₹%s", "10% Discount", "50.00")))
+        self.assertEqual(rendered["event"], "Applied 10% Discount: ₹50.00")
+        self.assertEqual(rendered["level"], "info")
+        self.assertEqual(rendered["logger"], "tests")
+
+
+@override_settings(TRAFFIC_CAPTURE_RATE=1)
+class TrafficCaptureTestCase(APITestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        buckets = get_token_buckets()
+        buckets.clear()
+        self.addCleanup(buckets.clear)
+        self.user = User.objects.create_user(email="shopper@example.com", password="shopperpass123")
+        category = Category.objects.create(name="Books")
+        self.product = Product.objects.create(name="Novel", price=Decimal('300.00'), stock_quantity=10, category=category)
+        self.client.force_authenticate(user=self.user)
+
+    def test_sampled_request_is_written_as_json_line(self):
+        with self.assertLogs('traffic.capture', 'INFO') as logs:
+            response = self.client.post(reverse('cart-list-create'), {"product": self.product.id, "quantity": 2},
+                                        format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["method"], "POST")
+        self.assertEqual(record["path"], reverse('cart-list-create'))
+        self.assertEqual(json.loads(record["body"]), {"product": self.product.id, "quantity": 2})
+        self.assertEqual(record["status"], status.HTTP_201_CREATED)
+        self.assertGreater(record["queries"], 0)
+        # The user id is only recorded as a keyed hash
+        self.assertEqual(record["user"], anonymize_user_id(self.user.id))
+        self.assertNotEqual(record["user"], str(self.user.id))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_queries_on_replicas_are_counted(self):
+        with self.assertLogs('traffic.capture', 'INFO') as logs, \
+                CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertGreater(len(replica), 0)
+        self.assertEqual(json.loads(logs.records[0].getMessage())["queries"], len(primary) + len(replica))
+
+    def test_auth_endpoints_are_never_captured(self):
+        with self.assertNoLogs('traffic.capture', 'INFO'):
+            self.client.post(reverse('login'), {"email": "shopper@example.com", "password": "shopperpass123"},
+                             format='json')
+
+
+class ProductionSettingsTestCase(SimpleTestCase):
+    def _import_settings(self, **env):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'discount_engine.settings_production', **env}
+        return subprocess.run([sys.executable, '-c', 'from django.conf import settings; settings.SECRET_KEY'],
+                              cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=60)
+
+    def test_missing_secret_key_refuses_to_start(self):
+        result = self._import_settings(DJANGO_SECRET_KEY='')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("DJANGO_SECRET_KEY must be set", result.stderr)
+
+    def test_secret_key_comes_from_the_environment(self):
+        self.assertEqual(self._import_settings(DJANGO_SECRET_KEY='production-key').returncode, 0)
@@ -0,0 +1,134 @@
+"""
+Per-user token-bucket throttling for the endpoints that run the discount engine.
+
+Each user gets a bucket per ``throttle_scope`` holding up to N tokens that refill
+at N per period (rates come from ``DEFAULT_THROTTLE_RATES``, e.g. ``'120/min'``),
+so short bursts pass while sustained hammering is capped at the rate. With Redis
+the bucket is checked and updated by one Lua script in a single round trip; with
+any other cache (DEBUG/locmem) the buckets are kept in-process.
+"""
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / refill_rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+# Buckets of the in-process fallback; the least recently used are dropped past this size
+LOCAL_BUCKETS_MAX_SIZE = 10000
+
+
+class RedisTokenBuckets:
+    def __init__(self):
+        from django_redis import get_redis_connection
+
+        self.script = get_redis_connection('default').register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key, capacity, refill_rate):
+        allowed, retry_after = self.script(keys=[key], args=[capacity, refill_rate])
+        return bool(allowed), float(retry_after)
+
+
+class LocalTokenBuckets:
+    def __init__(self):
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+
+            allowed, retry_after = tokens >= 1, 0.0
+            if allowed:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / refill_rate
+
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > LOCAL_BUCKETS_MAX_SIZE:
+                self.buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+_buckets = None
+
+
+def get_token_buckets():
+    global _buckets
+    if _buckets is None:
+        if settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+            _buckets = RedisTokenBuckets()
+        else:
+            _buckets = LocalTokenBuckets()
+    return _buckets
+
+
+class TokenBucketThrottle(ScopedRateThrottle):
+    """
+    Drop-in replacement for ``ScopedRateThrottle`` backed by a token bucket.
+    Views opt in with ``throttle_classes`` and a ``throttle_scope``.
+    """
+
+    def get_rate(self):
+        # Read at call time so the rates follow settings overrides
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        allowed, self.retry_after = get_token_buckets().take(
+            self.key, self.num_requests, self.num_requests / self.duration
+        )
+        if not allowed:
+            logger.warning("Throttled %s", self.key)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
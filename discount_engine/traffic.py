@@ -0,0 +1,109 @@
+"""
+Sampled capture of API traffic for replaying production load shapes.
+
+``TrafficCaptureMiddleware`` writes one JSON line per sampled request to the
+``traffic.capture`` logger, which settings route to a rotating ``traffic.jsonl``
+in the log directory. Each record holds the method, path, query string, body,
+an HMAC of the user id (stable across requests, useless without the key),
+status, latency and the number of SQL queries the request ran.
+``benchmarks/replay.py`` drives a captured stream against a local instance.
+
+Capture is off unless ``TRAFFIC_CAPTURE_RATE`` is above zero. Paths under
+``TRAFFIC_CAPTURE_EXCLUDE`` (the auth endpoints by default, whose bodies carry
+credentials) are never recorded.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+capture_logger = logging.getLogger('traffic.capture')
+
+DEFAULT_CAPTURE_PREFIX = '/api/'
+DEFAULT_EXCLUDE = ('/api/auth/',)
+DEFAULT_MAX_BODY = 64 * 1024
+
+
+def anonymize_user_id(user_id):
+    key = getattr(settings, 'TRAFFIC_CAPTURE_KEY', None) or settings.SECRET_KEY
+    return hmac.new(key.encode(), str(user_id).encode(), hashlib.sha256).hexdigest()[:16]
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class TrafficCaptureMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rate = getattr(settings, 'TRAFFIC_CAPTURE_RATE', 0)
+        if self.rate <= 0:
+            raise MiddlewareNotUsed
+        self.prefix = getattr(settings, 'TRAFFIC_CAPTURE_PREFIX', DEFAULT_CAPTURE_PREFIX)
+        self.exclude = tuple(getattr(settings, 'TRAFFIC_CAPTURE_EXCLUDE', DEFAULT_EXCLUDE))
+        self.max_body = getattr(settings, 'TRAFFIC_CAPTURE_MAX_BODY', DEFAULT_MAX_BODY)
+
+    def __call__(self, request):
+        if not self._should_capture(request):
+            return self.get_response(request)
+
+        # Read before the view so the body is still there after DRF consumed the stream
+        body = self._body(request)
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            # Reads routed to a replica run on its connection
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        latency = time.perf_counter() - started
+
+        try:
+            capture_logger.info(json.dumps(self._record(request, response, body, latency, counter.count)))
+        except Exception:
+            # Capture is best effort and must never fail the request it observed
+            logger.exception("Failed to capture request to %s", request.path)
+        return response
+
+    def _should_capture(self, request):
+        path = request.path
+        if not path.startswith(self.prefix) or path.startswith(self.exclude):
+            return False
+        return self.rate >= 1 or random.random() < self.rate
+
+    def _body(self, request):
+        if int(request.META.get('CONTENT_LENGTH') or 0) > self.max_body:
+            return None
+        try:
+            return request.body.decode() or None
+        except UnicodeDecodeError:
+            return None
+
+    def _record(self, request, response, body, latency, queries):
+        user = getattr(request, 'user', None)
+        return {
+            "ts": round(time.time(), 6),
+            "method": request.method,
+            "path": request.path,
+            "query": request.META.get('QUERY_STRING', ''),
+            "content_type": request.content_type if body is not None else None,
+            "body": body,
+            "user": anonymize_user_id(user.id) if user is not None and user.is_authenticated else None,
+            "status": response.status_code,
+            "latency_ms": round(latency * 1e3, 3),
+            "queries": queries,
+        }
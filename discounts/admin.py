@@ -1,7 +1,7 @@
 # ecommerce/admin.py
 
 from django.contrib import admin
-from .models import DiscountRule, AppliedDiscount
+from .models import DiscountRule, AppliedDiscount, DiscountUsage
 from .cache import invalidate_discount_rules_cache
 
 class AppliedDiscountInline(admin.TabularInline):
@@ -14,13 +14,22 @@ class AppliedDiscountInline(admin.TabularInline):
 
 @admin.register(DiscountRule)
 class DiscountRuleAdmin(admin.ModelAdmin):
-    list_display = ('name', 'discount_type', 'priority', 'is_active')
-    list_filter = ('discount_type', 'is_active')
+    list_display = ('name', 'discount_type', 'priority', 'is_exclusive', 'stop_further_rules', 'is_active',
+                    'starts_at', 'ends_at')
+    list_filter = ('discount_type', 'is_active', 'is_exclusive', 'stacking_group')
     search_fields = ('name', 'description')
     fieldsets = (
         ('Basic Information', {
             'fields': ('name', 'description', 'discount_type', 'priority', 'is_active')
         }),
+        ('Schedule', {
+            'fields': ('starts_at', 'ends_at'),
+            'description': 'Leave empty for a rule that applies for as long as it is active'
+        }),
+        ('Stacking', {
+            'fields': ('stacking_group', 'is_exclusive', 'stop_further_rules', 'max_stack_depth'),
+            'description': 'How this discount combines with other discounts on the same order'
+        }),
         ('Percentage Discount Settings', {
             'fields': ('min_order_value', 'percentage'),
             'classes': ('collapse',),
@@ -46,4 +55,12 @@ class DiscountRuleAdmin(admin.ModelAdmin):
     def delete_model(self, request, obj):
         """Invalidate cache when discount rules are deleted"""
         super().delete_model(request, obj)
-        invalidate_discount_rules_cache()
\ No newline at end of file
+        invalidate_discount_rules_cache()
+
+
+@admin.register(DiscountUsage)
+class DiscountUsageAdmin(admin.ModelAdmin):
+    list_display = ('date', 'discount_rule', 'times_applied', 'total_amount')
+    list_filter = ('discount_rule',)
+    date_hierarchy = 'date'
+    readonly_fields = ('discount_rule', 'date', 'times_applied', 'total_amount')
@@ -1,42 +1,117 @@
 # ecommerce/cache.py
 
+from bisect import bisect_right
 from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
 import logging
+import math
+import time
 from django.conf import settings
 
+from discount_engine.db_router import pin_to_primary, read_alias
+
 logger = logging.getLogger(__name__)
 
 # Cache keys
 DISCOUNT_RULES_CACHE_KEY = 'discount_rules'
+DISCOUNT_RULES_VERSION_KEY = 'discount_rules_version'
+# Rule edits pin the reload to the primary until the replicas have them
+DISCOUNT_RULES_REPLICA_SCOPE = 'discount_rules'
 CACHE_TTL = getattr(settings, 'CACHE_TTL', 60 * 15)  # 15 minutes default
 
-def get_discount_rules_from_cache():
+class RuleSet:
+    """
+    Active discount rules indexed by their schedules.
+
+    The distinct ``starts_at``/``ends_at`` values split the timeline into
+    elementary intervals and the rules live in each one are worked out once,
+    so picking the active subset for any moment is a bisect, not a query.
     """
-    Get discount rules from cache or database
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.boundaries = sorted({
+            boundary for rule in self.rules for boundary in (rule.starts_at, rule.ends_at) if boundary is not None
+        })
+        # Before the first boundary no scheduled rule has started yet
+        self.intervals = [[rule for rule in self.rules if rule.starts_at is None]]
+        self.intervals += [[rule for rule in self.rules if rule.is_active_at(start)] for start in self.boundaries]
+
+    def active_at(self, when):
+        return self.intervals[bisect_right(self.boundaries, when)]
+
+    def epoch(self, when):
+        """Start of the interval containing ``when`` as a timestamp, 0 before the first boundary."""
+        index = bisect_right(self.boundaries, when)
+        return int(self.boundaries[index - 1].timestamp()) if index else 0
+
+    def next_boundary(self, when):
+        index = bisect_right(self.boundaries, when)
+        return self.boundaries[index] if index < len(self.boundaries) else None
+
+
+def get_rule_set_from_cache():
+    """
+    Get the indexed rule set from cache or database. It holds every active rule
+    that has not ended yet, including scheduled ones, so it stays valid across
+    schedule boundaries and only needs invalidating when rules are edited.
     """
     from .models import DiscountRule
     
     # Try to get from cache first
-    discount_rules = cache.get(DISCOUNT_RULES_CACHE_KEY)
+    rule_set = cache.get(DISCOUNT_RULES_CACHE_KEY)
     
-    if discount_rules is None:
+    if rule_set is None:
         logger.info("Cache miss for discount rules, fetching from database")
         
-        # If not in cache, get from database
-        discount_rules = list(DiscountRule.objects
-                              .filter(is_active=True)
-                              .order_by('priority'))
+        # If not in cache, get from database, a replica unless the rules were just edited
+        rule_set = RuleSet(DiscountRule.objects.using(read_alias(DISCOUNT_RULES_REPLICA_SCOPE))
+                           .filter(is_active=True)
+                           .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=timezone.now()))
+                           .select_related('category')
+                           .order_by('priority'))
         
         # Store in cache
-        cache.set(DISCOUNT_RULES_CACHE_KEY, discount_rules, CACHE_TTL)
+        cache.set(DISCOUNT_RULES_CACHE_KEY, rule_set, CACHE_TTL)
     else:
         logger.info("Cache hit for discount rules")
     
-    return discount_rules
+    return rule_set
+
+def get_discount_rules_from_cache(when=None):
+    """
+    Get the discount rules that apply at ``when`` (default: now)
+    """
+    return get_rule_set_from_cache().active_at(when or timezone.now())
+
+def get_discount_rules_version(when=None):
+    """
+    Get the current version of the discount rule set. The counter part is bumped
+    on every invalidation; the epoch part changes whenever a scheduled rule starts
+    or ends, so anything stamped with it goes stale exactly at the boundary.
+    A missing counter is re-seeded from the clock so an evicted version never repeats.
+    """
+    version = cache.get(DISCOUNT_RULES_VERSION_KEY)
+    if version is None:
+        cache.add(DISCOUNT_RULES_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(DISCOUNT_RULES_VERSION_KEY)
+    return f"{version}:{get_rule_set_from_cache().epoch(when or timezone.now())}"
+
+def seconds_until_next_rule_boundary(when=None):
+    """Seconds until a scheduled rule next starts or ends, or None if none is scheduled"""
+    when = when or timezone.now()
+    boundary = get_rule_set_from_cache().next_boundary(when)
+    return max(math.ceil((boundary - when).total_seconds()), 1) if boundary else None
 
 def invalidate_discount_rules_cache():
     """
     Invalidate the discount rules cache
     """
     logger.info("Invalidating discount rules cache")
-    cache.delete(DISCOUNT_RULES_CACHE_KEY)
\ No newline at end of file
+    pin_to_primary(DISCOUNT_RULES_REPLICA_SCOPE)
+    cache.delete(DISCOUNT_RULES_CACHE_KEY)
+    try:
+        cache.incr(DISCOUNT_RULES_VERSION_KEY)
+    except ValueError:
+        cache.add(DISCOUNT_RULES_VERSION_KEY, time.time_ns(), None)
\ No newline at end of file
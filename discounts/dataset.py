@@ -0,0 +1,283 @@
+# ecommerce/dataset.py
+"""
+Deterministic synthetic data for benchmarking the discount engine.
+
+Everything is drawn from one seeded ``random.Random`` and dated back from
+``now``, so the same ``seed``, ``scale`` and ``now`` always produce the same
+dataset, and written with chunked
+``bulk_create`` inside one transaction per chunk. Popularity is skewed: product
+picks, customer activity and rule picks follow Zipf distributions, so a few
+customers have long histories and a few products dominate the order lines.
+
+Model ``save()`` methods and signals are bypassed on purpose (no slug probing,
+no per-row password hashing, no job enqueueing); callers must not rely on them.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+import logging
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from carts.models import Cart
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from .cache import invalidate_discount_rules_cache
+from .models import AppliedDiscount, DiscountRule
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 5000
+DATASET_PASSWORD = 'dataset-password'
+CENT = Decimal('0.01')
+
+
+@dataclass(frozen=True)
+class DatasetSize:
+    """Row targets for one dataset; scale 1 is roughly 19k rows."""
+    users: int
+    categories: int
+    products: int
+    rules: int
+    orders: int
+    carts: int
+
+    @classmethod
+    def for_scale(cls, scale):
+        def rows(per_scale, minimum):
+            return max(minimum, round(per_scale * scale))
+
+        return cls(
+            users=rows(1000, 5),
+            categories=rows(10, 3),
+            products=rows(200, 10),
+            rules=rows(20, 3),
+            orders=rows(5000, 10),
+            carts=rows(300, 2),
+        )
+
+
+class Zipf:
+    """Sampler of ``population`` items where the k-th is picked with weight ``1 / k**exponent``."""
+
+    def __init__(self, rng, population, exponent=1.1):
+        self.rng = rng
+        self.population = list(population)
+        self.cum_weights = list(accumulate(1 / rank ** exponent for rank in range(1, len(self.population) + 1)))
+
+    def sample(self, k=1):
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+    def distinct(self, k):
+        """Up to ``k`` distinct items; popular items are still the likeliest."""
+        picked = dict.fromkeys(self.sample(k))
+        return list(picked)
+
+
+@contextmanager
+def _explicit_timestamps(*models):
+    """Let ``bulk_create`` keep the generated ``created_at``/``updated_at`` values."""
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _money(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)) * CENT
+
+
+class DatasetGenerator:
+    def __init__(self, scale=1, seed=0, batch_size=DEFAULT_BATCH_SIZE, days=365, now=None):
+        self.size = DatasetSize.for_scale(scale)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.end = now or timezone.now()
+        self.start = self.end - timedelta(days=days)
+        self.counts = {}
+
+    def generate(self):
+        if User.objects.filter(email=self._email(0)).exists():
+            raise ValueError(f"A dataset with seed {self.seed} already exists in this database.")
+
+        started = time.monotonic()
+        with _explicit_timestamps(Category, Product, Order, Cart, DiscountRule):
+            user_ids = self._users()
+            category_ids = self._categories()
+            products = self._products(category_ids)
+            rules = self._rules(category_ids)
+            self._orders(user_ids, products, rules)
+            self._carts(user_ids, products)
+        invalidate_discount_rules_cache()
+
+        elapsed = time.monotonic() - started
+        logger.info("Generated %s rows in %.1fs", sum(self.counts.values()), elapsed)
+        return self.counts
+
+    def _email(self, index):
+        return f"dataset-{self.seed}-{index}@example.com"
+
+    def _insert(self, model, objs):
+        """Bulk insert ``objs`` (any iterable) in chunks and return the created instances."""
+        created, chunk = [], []
+        for obj in objs:
+            chunk.append(obj)
+            if len(chunk) >= self.batch_size:
+                created.extend(self._flush(model, chunk))
+                chunk = []
+        if chunk:
+            created.extend(self._flush(model, chunk))
+        return created
+
+    def _flush(self, model, chunk):
+        with transaction.atomic():
+            created = model.objects.bulk_create(chunk)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(created)
+        return created
+
+    def _timestamp(self, fraction):
+        return self.start + (self.end - self.start) * fraction
+
+    def _users(self):
+        # One hash for everybody: hashing per row would dominate the run
+        password = make_password(DATASET_PASSWORD)
+        users = self._insert(User, (
+            User(email=self._email(index), first_name="Customer", last_name=str(index), password=password)
+            for index in range(self.size.users)
+        ))
+        return [user.id for user in users]
+
+    def _categories(self):
+        created_at = self._timestamp(0)
+        categories = self._insert(Category, (
+            Category(name=f"Category {index}", created_at=created_at, updated_at=created_at)
+            for index in range(self.size.categories)
+        ))
+        return [category.id for category in categories]
+
+    def _products(self, category_ids):
+        rng, created_at = self.rng, self._timestamp(0)
+        by_category = Zipf(rng, category_ids)
+        products = self._insert(Product, (
+            Product(
+                name=f"Product {index}",
+                slug=f"dataset-{self.seed}-product-{index}",
+                description=f"Synthetic product {index}",
+                price=_money(rng, 10, 5000),
+                category_id=category_id,
+                stock_quantity=rng.randint(0, 500),
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            for index, category_id in enumerate(by_category.sample(self.size.products))
+        ))
+        return [(product.id, product.price, product.category_id) for product in products]
+
+    def _rules(self, category_ids):
+        rng, created_at = self.rng, self._timestamp(0)
+        by_category = Zipf(rng, category_ids)
+
+        def rule(index):
+            fields = dict(
+                name=f"Rule {index}",
+                description=f"Synthetic rule {index}",
+                priority=rng.randint(1, 100),
+                is_active=rng.random() < 0.9,
+                stacking_group=rng.choice(['', '', '', 'seasonal', 'loyalty']),
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            kind = rng.choices(['percentage', 'flat', 'category'], weights=[5, 2, 3])[0]
+            if kind == 'percentage':
+                fields.update(min_order_value=_money(rng, 0, 20000), percentage=Decimal(rng.randint(5, 30)))
+            elif kind == 'flat':
+                fields.update(min_previous_orders=rng.randint(1, 20), flat_amount=_money(rng, 50, 500))
+            else:
+                fields.update(category_id=by_category.sample()[0], min_items_in_category=rng.randint(1, 10),
+                              category_discount_percentage=Decimal(rng.randint(5, 25)))
+            return DiscountRule(discount_type=kind, **fields)
+
+        rules = self._insert(DiscountRule, (rule(index) for index in range(self.size.rules)))
+        return [rule for rule in rules if rule.discount_type == 'percentage']
+
+    def _orders(self, user_ids, products, percentage_rules):
+        """
+        Orders are created in time order so ids and timestamps agree, each with a few
+        Zipf-picked lines and, for some, a percentage discount spread over its lines.
+        """
+        rng = self.rng
+        by_user = Zipf(rng, user_ids)
+        by_product = Zipf(rng, products)
+        by_rule = Zipf(rng, percentage_rules) if percentage_rules else None
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+
+        remaining = self.size.orders
+        while remaining:
+            batch = min(self.batch_size, remaining)
+            done = self.size.orders - remaining
+            orders, lines, discounts = [], [], []
+            for index, user_id in enumerate(by_user.sample(batch)):
+                order_lines = [(product, rng.choices((1, 2, 3), weights=(6, 3, 1))[0])
+                               for product in by_product.distinct(rng.choices(range(1, 7), weights=(8, 6, 4, 2, 1, 1))[0])]
+                total = sum(price * quantity for (_, price, _), quantity in order_lines)
+
+                rule = by_rule.sample()[0] if by_rule and rng.random() < 0.3 else None
+                keep = 1 - rule.percentage / 100 if rule else Decimal('1')
+                discounted = (total * keep).quantize(CENT)
+                created_at = self._timestamp((done + index + rng.random()) / self.size.orders)
+
+                orders.append(Order(user_id=user_id, status=rng.choice(statuses), total_amount=total,
+                                    discounted_amount=discounted, created_at=created_at, updated_at=created_at))
+                lines.append((order_lines, keep))
+                discounts.append((rule, total - discounted))
+
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order_id=order.id, product_id=product_id, quantity=quantity, unit_price=price,
+                              discounted_price=(price * keep).quantize(CENT))
+                    for order, (order_lines, keep) in zip(orders, lines)
+                    for (product_id, price, _), quantity in order_lines
+                ], batch_size=self.batch_size)
+                AppliedDiscount.objects.bulk_create([
+                    AppliedDiscount(order_id=order.id, discount_rule_id=rule.id, discount_name=f"{rule.percentage}% Discount",
+                                    description="Synthetic discount", amount=amount)
+                    for order, (rule, amount) in zip(orders, discounts) if rule is not None
+                ], batch_size=self.batch_size)
+
+            self.counts['Order'] = self.counts.get('Order', 0) + len(orders)
+            self.counts['OrderItem'] = self.counts.get('OrderItem', 0) + sum(len(order_lines) for order_lines, _ in lines)
+            self.counts['AppliedDiscount'] = (self.counts.get('AppliedDiscount', 0)
+                                              + sum(1 for rule, _ in discounts if rule is not None))
+            remaining -= batch
+
+    def _carts(self, user_ids, products):
+        rng = self.rng
+        by_product = Zipf(rng, products)
+        shoppers = Zipf(rng, user_ids).distinct(self.size.carts)
+
+        def cart_items():
+            for user_id in shoppers:
+                created_at = self._timestamp(1 - rng.random() / 30)
+                for product_id, _, _ in by_product.distinct(rng.randint(1, 5)):
+                    yield Cart(user_id=user_id, product_id=product_id, quantity=rng.randint(1, 3),
+                               created_at=created_at, updated_at=created_at)
+
+        self._insert(Cart, cart_items())
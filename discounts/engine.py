@@ -266,191 +266,140 @@
 from decimal import Decimal
 import logging
 
-from django.db.models import Count
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
 
-from carts.models import Cart
-from orders.models import Order
-from products.models import Product
-from .models import AppliedDiscount, DiscountRule
+from carts.storage import get_cart_storage
+from orders.models import Order, OrderItem
+from .models import AppliedDiscount
 from .cache import get_discount_rules_from_cache
+from .pricing import DEFAULT_TIME_BUDGET, BasketLine, CustomerHistory, RuleSpec, price_basket
 
 logger = logging.getLogger(__name__)
 
+OPTIMIZER_TIME_BUDGET = getattr(settings, 'DISCOUNT_OPTIMIZER_TIME_BUDGET', DEFAULT_TIME_BUDGET)
+
+
+def load_customer_history(user, as_of=None):
+    """Read a customer's order count and per-category quantities, optionally as of a point in time."""
+    orders = Order.objects.filter(user=user)
+    items = OrderItem.objects.filter(order__user=user)
+    if as_of is not None:
+        orders = orders.filter(created_at__lte=as_of)
+        items = items.filter(order__created_at__lte=as_of)
+
+    category_quantities = dict(
+        items.order_by().values_list('product__category_id').annotate(total=Sum('quantity'))
+    )
+    return CustomerHistory(order_count=orders.count(), category_quantities=category_quantities)
+
 
 class DiscountEngine:
-    def __init__(self, order=None, user=None):
+    """
+    ORM adapter around ``pricing.price_basket``.
+
+    The constructor does no I/O. Each calculation does one batched read (basket
+    lines, then the customer history only if a rule needs it) and, for orders,
+    one batched write of the result.
+    """
+
+    def __init__(self, order=None, user=None, rules=None, cart_items=None):
         self.order = order
         self.user = user
+        # Explicit rule set (e.g. candidate rules in a simulation); falls back to the cached active rules
+        self.rules = rules
 
-        self.order_items = list(order.items.all().select_related('product')) if order else []
-        self.total_amount = sum(item.unit_price * item.quantity for item in self.order_items)
-        self.discounted_amount = self.total_amount
+        self.order_items = []
+        self.total_amount = Decimal('0')
+        self.discounted_amount = Decimal('0')
         self.applied_discounts = []
 
-        self.cart_items = list(Cart.objects.filter(user=user).select_related('product')) if user else []
-        self.cart_total_amount = sum(item.product.price * item.quantity for item in self.cart_items)
-        self.discounted_cart_amount = self.cart_total_amount
+        self.cart_items = list(cart_items) if cart_items is not None else None
+        self.cart_total_amount = Decimal('0')
+        self.discounted_cart_amount = Decimal('0')
         self.applied_cart_discounts = []
 
+    def _get_rules(self):
+        if self.rules is None:
+            return [RuleSpec.from_model(rule) for rule in get_discount_rules_from_cache()]
+        now = timezone.now()
+        return [RuleSpec.from_model(rule) for rule in self.rules if rule.is_active_at(now)]
+
     def get_cart_discounts(self):
         """Apply all applicable discounts to the user's cart and return applied discount details."""
-        discount_rules = get_discount_rules_from_cache()
-
-        for rule in discount_rules:
-            if not rule.is_active:
-                continue
-
-            if rule.discount_type == 'percentage':
-                self._apply_cart_percentage_discount(rule)
-            elif rule.discount_type == 'flat':
-                self._apply_cart_flat_discount(rule)
-            elif rule.discount_type == 'category':
-                self._apply_cart_category_discount(rule)
-
+        if self.cart_items is None:
+            self.cart_items = get_cart_storage().items(self.user) if self.user else []
+
+        lines = [
+            BasketLine(item.product_id, item.product.category_id, item.product.price, item.quantity)
+            for item in self.cart_items
+        ]
+        # Guest carts have no user and so no history to read
+        history = (lambda: load_customer_history(self.user)) if self.user else CustomerHistory()
+        priced = price_basket(lines, self._get_rules(), history, time_budget=OPTIMIZER_TIME_BUDGET)
+
+        self.cart_total_amount = priced.total_amount
+        self.discounted_cart_amount = priced.discounted_amount
+        self.applied_cart_discounts = [self._cart_discount(discount) for discount in priced.applied_discounts]
         return {"applied_discounts": self.applied_cart_discounts}
 
-    def _apply_cart_percentage_discount(self, rule):
-        if self.cart_total_amount >= rule.min_order_value:
-            discount_amount = self.discounted_cart_amount * (rule.percentage / Decimal('100'))
-            self.discounted_cart_amount -= discount_amount
-
-            self.applied_cart_discounts.append({
-                "discount_rule_id": getattr(rule, 'id', None),
-                "discount_name": f"{rule.percentage}% Discount",
-                "description": f"Order value exceeds ₹{rule.min_order_value}",
-                "amount": discount_amount
-            })
-
-            logger.info(f"Applied {rule.percentage}% discount: ₹{discount_amount}")
-
-    def _apply_cart_flat_discount(self, rule):
-        previous_orders_count = Order.objects.filter(user=self.user).count()
-
-        if previous_orders_count >= rule.min_previous_orders:
-            discount_amount = min(rule.flat_amount, self.discounted_cart_amount)
-            self.discounted_cart_amount -= discount_amount
-
-            self.applied_cart_discounts.append({
-                "discount_rule_id": getattr(rule, 'id', None),
-                "discount_name": "Loyal Customer Discount",
-                "description": f"Flat discount for having {previous_orders_count} previous orders",
-                "amount": discount_amount
-            })
-
-            logger.info(f"Applied flat discount: ₹{discount_amount}")
-
-    def _apply_cart_category_discount(self, rule):
-        target_category = rule.category
-        total_quantity = 0
-
-        previous_orders = Order.objects.filter(user=self.user).prefetch_related('items__product')
-        for order in previous_orders:
-            total_quantity += sum(item.quantity for item in order.items.all() if item.product.category == target_category)
-
-        total_quantity += sum(item.quantity for item in self.cart_items if item.product.category == target_category)
-
-        if total_quantity > rule.min_items_in_category:
-            total_discount = Decimal('0')
-
-            for item in self.cart_items:
-                if item.product.category == target_category:
-                    item_total = item.product.price * item.quantity
-                    item_discount = item_total * (rule.category_discount_percentage / Decimal('100'))
-                    total_discount += item_discount
-
-            if total_discount > 0:
-                self.discounted_cart_amount -= total_discount
-                self.applied_cart_discounts.append({
-                    "rule_id": rule.id,
-                    "discount_name": f"Category Discount on {target_category.name}",
-                    "description": f"{rule.category_discount_percentage}% off on {target_category.name} items",
-                    "amount": total_discount
-                })
-
-                logger.info(f"Applied category discount: ₹{total_discount}")
-
-    def calculate_order_discounts(self):
-        discount_rules = get_discount_rules_from_cache()
-
-        for rule in discount_rules:
-            if not rule.is_active:
-                continue
-
-            if rule.discount_type == 'percentage':
-                self._apply_order_percentage_discount(rule)
-            elif rule.discount_type == 'flat':
-                self._apply_order_flat_discount(rule)
-            elif rule.discount_type == 'category':
-                self._apply_order_category_discount(rule)
+    @staticmethod
+    def _cart_discount(discount):
+        # Category discounts have always been reported under "rule_id" in the cart API
+        rule_key = "rule_id" if discount.discount_type == 'category' else "discount_rule_id"
+        return {
+            rule_key: discount.rule_id,
+            "discount_name": discount.discount_name,
+            "description": discount.description,
+            "amount": discount.amount,
+        }
+
+    def calculate_order_discounts(self, commit=True):
+        """
+        Apply all eligible discounts to the order.
+
+        With ``commit=False`` the result is only computed in memory: no order, item
+        or ``AppliedDiscount`` rows are written, which is what simulations rely on.
+        """
+        self.order_items = list(self.order.items.all().select_related('product'))
+        lines = [
+            BasketLine(item.product_id, item.product.category_id, item.unit_price, item.quantity)
+            for item in self.order_items
+        ]
+        priced = price_basket(
+            lines, self._get_rules(),
+            lambda: load_customer_history(self.user, as_of=self.order.created_at),
+            time_budget=OPTIMIZER_TIME_BUDGET,
+        )
+
+        self.total_amount = priced.total_amount
+        self.discounted_amount = priced.discounted_amount
+        self.applied_discounts = [
+            AppliedDiscount(
+                order=self.order,
+                discount_rule_id=discount.rule_id,
+                discount_name=discount.discount_name,
+                description=discount.description,
+                amount=discount.amount,
+            )
+            for discount in priced.applied_discounts
+        ]
+
+        if not commit:
+            return self.order
+
+        changed_items = []
+        for item, discounted_price in zip(self.order_items, priced.discounted_prices):
+            if item.discounted_price != discounted_price:
+                item.discounted_price = discounted_price
+                changed_items.append(item)
 
         self.order.total_amount = self.total_amount
         self.order.discounted_amount = self.discounted_amount
-        self.order.save()
+        self.order.save(update_fields=['total_amount', 'discounted_amount', 'updated_at'])
 
+        if changed_items:
+            OrderItem.objects.bulk_update(changed_items, ['discounted_price'])
         AppliedDiscount.objects.bulk_create(self.applied_discounts)
         return self.order
-
-    def _apply_order_percentage_discount(self, rule):
-        if self.total_amount >= rule.min_order_value:
-            discount_amount = self.discounted_amount * (rule.percentage / Decimal('100'))
-            self.discounted_amount -= discount_amount
-
-            self.applied_discounts.append(AppliedDiscount(
-                order=self.order,
-                discount_rule=rule,
-                discount_name=f"{rule.percentage}% Discount",
-                description=f"Order value exceeds ₹{rule.min_order_value}",
-                amount=discount_amount
-            ))
-
-            logger.info(f"Applied {rule.percentage}% discount: ₹{discount_amount}")
-
-    def _apply_order_flat_discount(self, rule):
-        previous_orders_count = Order.objects.filter(user=self.user).count()
-
-        if previous_orders_count >= rule.min_previous_orders:
-            discount_amount = min(rule.flat_amount, self.discounted_amount)
-            self.discounted_amount -= discount_amount
-
-            self.applied_discounts.append(AppliedDiscount(
-                order=self.order,
-                discount_rule=rule,
-                discount_name="Loyal Customer Discount",
-                description=f"Flat discount for having {previous_orders_count} previous orders",
-                amount=discount_amount
-            ))
-
-            logger.info(f"Applied flat discount: ₹{discount_amount}")
-
-    def _apply_order_category_discount(self, rule):
-        target_category = rule.category
-        total_quantity = 0
-
-        previous_orders = Order.objects.filter(user=self.user).prefetch_related('items__product')
-        for order in previous_orders:
-            total_quantity += sum(item.quantity for item in order.items.all() if item.product.category == target_category)
-
-        total_quantity += sum(item.quantity for item in self.order_items if item.product.category == target_category)
-
-        if total_quantity > rule.min_items_in_category:
-            total_discount = Decimal('0')
-
-            for item in self.order_items:
-                if item.product.category == target_category:
-                    item_total = item.unit_price * item.quantity
-                    item_discount = item_total * (rule.category_discount_percentage / Decimal('100'))
-                    item.discounted_price = item.unit_price - (item.unit_price * rule.category_discount_percentage / Decimal('100'))
-                    item.save()
-                    total_discount += item_discount
-
-            if total_discount > 0:
-                self.discounted_amount -= total_discount
-                self.applied_discounts.append(AppliedDiscount(
-                    order=self.order,
-                    discount_rule=rule,
-                    discount_name=f"Category Discount on {target_category.name}",
-                    description=f"{rule.category_discount_percentage}% off on {target_category.name} items",
-                    amount=total_discount
-                ))
-
-                logger.info(f"Applied category discount: ₹{total_discount}")
@@ -0,0 +1,36 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from jobs.queue import job
+from orders.models import Order
+from .models import AppliedDiscount, DiscountUsage
+
+
+@job('discounts.rollup_usage')
+def rollup_usage(order_id):
+    """Refresh the daily usage rollup of the rules applied to an order; safe to retry."""
+    order = Order.objects.get(id=order_id)
+    day = timezone.localdate(order.created_at)
+    rule_ids = list(order.applied_discounts.exclude(discount_rule=None).values_list('discount_rule_id', flat=True))
+    if not rule_ids:
+        return
+
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    rows = (AppliedDiscount.objects
+            .filter(discount_rule_id__in=rule_ids, order__created_at__gte=start,
+                    order__created_at__lt=start + timedelta(days=1))
+            .values('discount_rule_id')
+            .annotate(times=Count('id'), total=Sum('amount')))
+
+    DiscountUsage.objects.bulk_create(
+        [
+            DiscountUsage(discount_rule_id=row['discount_rule_id'], date=day,
+                          times_applied=row['times'], total_amount=row['total'])
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['discount_rule', 'date'],
+        update_fields=['times_applied', 'total_amount'],
+    )
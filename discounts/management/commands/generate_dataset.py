@@ -0,0 +1,51 @@
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import dateparse, timezone
+
+from discounts.dataset import DEFAULT_BATCH_SIZE, DatasetGenerator, DatasetSize
+
+
+class Command(BaseCommand):
+    help = "Fill the database with a deterministic synthetic dataset for benchmarks (scale 1 is roughly 19k rows)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1, help='Size multiplier; 525 is roughly 10M rows.')
+        parser.add_argument('--seed', type=int, default=0, help='Same seed, scale and --now give the same dataset.')
+        parser.add_argument('--days', type=int, default=365, help='Spread orders over this many past days.')
+        parser.add_argument('--now', help='ISO date or datetime the dataset ends at (default: the current time); '
+                                           'fix it to reproduce a dataset across runs.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def _parse_now(self, value):
+        try:
+            now = dateparse.parse_datetime(value)
+            if now is None:
+                date = dateparse.parse_date(value)
+                now = date and datetime.combine(date, time.min)
+        except ValueError:
+            now = None
+        if now is None:
+            raise CommandError(f"--now must be an ISO date or datetime, not {value!r}.")
+        return now if now.tzinfo else now.replace(tzinfo=dt_timezone.utc)
+
+    def handle(self, *args, **options):
+        if options['scale'] <= 0:
+            raise CommandError("--scale must be positive.")
+
+        now = self._parse_now(options['now']) if options['now'] else timezone.now()
+
+        size = DatasetSize.for_scale(options['scale'])
+        self.stdout.write(f"Generating {size.users} users, {size.products} products, {size.rules} rules "
+                          f"and {size.orders} orders (seed {options['seed']}, now {now.isoformat()})")
+
+        generator = DatasetGenerator(scale=options['scale'], seed=options['seed'],
+                                     batch_size=options['batch_size'], days=options['days'], now=now)
+        try:
+            counts = generator.generate()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        for model, count in counts.items():
+            self.stdout.write(f"{model + ':':<17} {count}")
+        self.stdout.write(self.style.SUCCESS(f"Total rows:       {sum(counts.values())}"))
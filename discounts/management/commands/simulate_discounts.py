@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from discounts.models import DiscountRule
+from discounts.simulation import DEFAULT_CHUNK_SIZE, simulate_discounts
+
+
+class Command(BaseCommand):
+    help = "Replay historical orders through the discount engine with a candidate rule set (read-only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rule', type=int, action='append', default=[], dest='rule_ids',
+                            help='Id of a rule to include in the candidate set, active or not (repeatable).')
+        parser.add_argument('--with-active', action='store_true',
+                            help='Also include every currently active rule.')
+        parser.add_argument('--start', help='Replay orders created at or after this ISO datetime (default: 30 days ago).')
+        parser.add_argument('--end', help='Replay orders created before this ISO datetime (default: now).')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, default=0, help='Worker processes (0 runs in-process).')
+
+    def _parse_datetime(self, value, default):
+        if value is None:
+            return default
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f"Invalid datetime: {value}")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def handle(self, *args, **options):
+        rules = {rule.id: rule for rule in DiscountRule.objects.filter(id__in=options['rule_ids']).select_related('category')}
+        missing = set(options['rule_ids']) - set(rules)
+        if missing:
+            raise CommandError(f"Unknown discount rule ids: {sorted(missing)}")
+
+        if options['with_active']:
+            for rule in DiscountRule.objects.filter(is_active=True).select_related('category'):
+                rules.setdefault(rule.id, rule)
+
+        if not rules:
+            raise CommandError("The candidate rule set is empty; pass --rule and/or --with-active.")
+
+        now = timezone.now()
+        start = self._parse_datetime(options['start'], now - timedelta(days=30))
+        end = self._parse_datetime(options['end'], now)
+
+        report = simulate_discounts(
+            list(rules.values()), start=start, end=end,
+            chunk_size=options['chunk_size'], workers=options['workers'],
+        )
+
+        self.stdout.write(f"Orders replayed:    {report['orders_replayed']}")
+        self.stdout.write(f"Orders affected:    {report['orders_affected']}")
+        self.stdout.write(f"Actual discount:    ₹{report['actual_discount']}")
+        self.stdout.write(f"Simulated discount: ₹{report['simulated_discount']}")
+        self.stdout.write(self.style.SUCCESS(f"Discount delta:     ₹{report['discount_delta']}"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from discounts.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = "Run the worker warm-up steps (imports, connections, discount rules) and report their timings."
+
+    def handle(self, *args, **options):
+        try:
+            timings = warm_up(raise_errors=True)
+        except Exception as exc:
+            raise CommandError(f"Warm-up failed: {exc}")
+
+        for name, seconds in timings.items():
+            self.stdout.write(f"{name + ':':<13} {seconds * 1e3:8.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"{'Total:':<13} {sum(timings.values()) * 1e3:8.1f} ms"))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='discountrule',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['priority'], name='discountrule_active_prio_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discounts', '0002_discountrule_active_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscountUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('times_applied', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('discount_rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='discounts.discountrule')),
+            ],
+            options={
+                'unique_together': {('discount_rule', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:06
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discounts', '0003_discountusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discountrule',
+            name='is_exclusive',
+            field=models.BooleanField(default=False, help_text='Only applies if no other discount has been applied, and then stops evaluation'),
+        ),
+        migrations.AddField(
+            model_name='discountrule',
+            name='max_stack_depth',
+            field=models.PositiveIntegerField(blank=True, help_text='Only applies if fewer than this many discounts were applied before it', null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='discountrule',
+            name='stop_further_rules',
+            field=models.BooleanField(default=False, help_text='Skip all lower-priority rules once this one applies'),
+        ),
+    ]
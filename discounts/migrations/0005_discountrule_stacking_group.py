@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discounts', '0004_discountrule_stacking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discountrule',
+            name='stacking_group',
+            field=models.CharField(blank=True, default='', help_text='At most one rule of a group applies; the best one for the basket is chosen', max_length=50),
+        ),
+    ]
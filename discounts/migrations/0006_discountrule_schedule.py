@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discounts', '0005_discountrule_stacking_group'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discountrule',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='discountrule',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from orders.models import Order
 from products.models import Category
@@ -40,15 +41,45 @@ class DiscountRule(models.Model):
     
     # Priority for stackable discounts (lower number = higher priority)
     priority = models.PositiveIntegerField(default=1)
+
+    # Stacking behaviour
+    is_exclusive = models.BooleanField(default=False,
+                                       help_text="Only applies if no other discount has been applied, and then stops evaluation")
+    stop_further_rules = models.BooleanField(default=False,
+                                             help_text="Skip all lower-priority rules once this one applies")
+    max_stack_depth = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(1)],
+                                                  help_text="Only applies if fewer than this many discounts were applied before it")
+    stacking_group = models.CharField(max_length=50, blank=True, default='',
+                                      help_text="At most one rule of a group applies; the best one for the basket is chosen")
     
     # Is the discount active?
     is_active = models.BooleanField(default=True)
+
+    # Optional schedule; an active rule only applies within [starts_at, ends_at)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Only active rules are ever loaded by the engine, in priority order
+            models.Index(fields=['priority'], condition=models.Q(is_active=True), name='discountrule_active_prio_idx'),
+        ]
     
     def __str__(self):
         return self.name
+
+    def clean(self):
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': "The end of the schedule must be after its start."})
+
+    def is_active_at(self, when):
+        """Whether the rule applies at ``when``, taking its schedule into account"""
+        return (self.is_active
+                and (self.starts_at is None or self.starts_at <= when)
+                and (self.ends_at is None or when < self.ends_at))
     
 class AppliedDiscount(models.Model):
     """Record of discounts applied to orders"""
@@ -59,4 +90,18 @@ class AppliedDiscount(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     
     def __str__(self):
-        return f"{self.discount_name} (₹{self.amount}) on Order #{self.order.id}"
\ No newline at end of file
+        return f"{self.discount_name} (₹{self.amount}) on Order #{self.order.id}"
+
+
+class DiscountUsage(models.Model):
+    """Daily rollup of how often each rule was applied and what it cost"""
+    discount_rule = models.ForeignKey(DiscountRule, on_delete=models.CASCADE, related_name='usage')
+    date = models.DateField()
+    times_applied = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('discount_rule', 'date')
+
+    def __str__(self):
+        return f"{self.discount_rule.name} on {self.date}: {self.times_applied}x (₹{self.total_amount})"
@@ -0,0 +1,375 @@
+# ecommerce/pricing.py
+"""
+Side-effect-free discount pricing.
+
+Everything here works on plain value objects: no ORM access, no cache, no
+writes. ``DiscountEngine`` adapts models to these objects and persists the
+result; simulations, quotes and benchmarks call ``price_basket`` directly.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+import functools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+HUNDRED = Decimal('100')
+
+# Seconds the optimizer may spend on a basket before settling for the best combination found so far
+DEFAULT_TIME_BUDGET = 0.05
+
+
+@dataclass(frozen=True)
+class RuleSpec:
+    """Immutable snapshot of a ``DiscountRule``."""
+    id: int
+    discount_type: str
+    priority: int = 1
+    min_order_value: Decimal = None
+    percentage: Decimal = None
+    min_previous_orders: int = None
+    flat_amount: Decimal = None
+    category_id: int = None
+    category_name: str = None
+    min_items_in_category: int = None
+    category_discount_percentage: Decimal = None
+    is_exclusive: bool = False
+    stop_further_rules: bool = False
+    max_stack_depth: int = None
+    stacking_group: str = ''
+    starts_at: datetime = None
+    ends_at: datetime = None
+
+    @classmethod
+    def from_model(cls, rule):
+        category = rule.category if rule.category_id else None
+        return cls(
+            id=rule.id,
+            discount_type=rule.discount_type,
+            priority=rule.priority,
+            min_order_value=rule.min_order_value,
+            percentage=rule.percentage,
+            min_previous_orders=rule.min_previous_orders,
+            flat_amount=rule.flat_amount,
+            category_id=rule.category_id,
+            category_name=category.name if category else None,
+            min_items_in_category=rule.min_items_in_category,
+            category_discount_percentage=rule.category_discount_percentage,
+            is_exclusive=rule.is_exclusive,
+            stop_further_rules=rule.stop_further_rules,
+            max_stack_depth=rule.max_stack_depth,
+            stacking_group=rule.stacking_group,
+            starts_at=rule.starts_at,
+            ends_at=rule.ends_at,
+        )
+
+    def is_scheduled_at(self, when):
+        """Whether ``when`` falls within the rule's schedule, as in ``DiscountRule.is_active_at``"""
+        return (self.starts_at is None or self.starts_at <= when) and (self.ends_at is None or when < self.ends_at)
+
+    @property
+    def needs_history(self):
+        return self.discount_type in ('flat', 'category')
+
+    def can_stack_on(self, applied_count):
+        """Whether the rule may apply on top of ``applied_count`` discounts already applied."""
+        if self.is_exclusive and applied_count:
+            return False
+        return self.max_stack_depth is None or applied_count < self.max_stack_depth
+
+    @property
+    def ends_evaluation(self):
+        return self.is_exclusive or self.stop_further_rules
+
+
+@dataclass(frozen=True)
+class BasketLine:
+    product_id: int
+    category_id: int
+    unit_price: Decimal
+    quantity: int
+
+
+@dataclass(frozen=True)
+class CustomerHistory:
+    """What the rules need to know about a customer's past orders."""
+    order_count: int = 0
+    category_quantities: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class AppliedDiscountLine:
+    rule_id: int
+    discount_type: str
+    discount_name: str
+    description: str
+    amount: Decimal
+
+
+@dataclass
+class PricedBasket:
+    total_amount: Decimal
+    discounted_amount: Decimal
+    # Discounted unit price per basket line, in basket order
+    discounted_prices: list
+    applied_discounts: list
+
+    @property
+    def total_discount(self):
+        return self.total_amount - self.discounted_amount
+
+
+def price_basket(lines, rules, history, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Apply ``rules`` in priority order to a basket and return the priced result.
+
+    ``history`` is a ``CustomerHistory`` or a zero-argument callable returning one;
+    a callable is only invoked if a rule actually needs the customer's history.
+
+    Evaluation stops as soon as the basket is free, or once an exclusive or
+    ``stop_further_rules`` rule applies. Rules whose stacking limits are already
+    exceeded are skipped before their history is ever loaded.
+
+    At most one rule per ``stacking_group`` applies. When groups are present the
+    combination giving the customer the largest discount is searched for within
+    ``time_budget`` seconds, starting from the greedy priority-order result.
+    """
+    lines = list(lines)
+    rules = sorted(rules, key=lambda rule: rule.priority)
+    load_history = history if callable(history) else lambda: history
+    load_history = functools.cache(load_history)
+
+    priced = _price_greedy(lines, rules, load_history)
+    if any(rule.stacking_group for rule in rules):
+        priced = _BestCombination(lines, rules, load_history, time_budget).search(priced)
+
+    if logger.isEnabledFor(logging.INFO):
+        for discount in priced.applied_discounts:
+            logger.info("Applied %s: ₹%s", discount.discount_name, discount.amount)
+    return priced
+
+
+def _new_basket(lines):
+    total_amount = sum((line.unit_price * line.quantity for line in lines), Decimal('0'))
+    return PricedBasket(
+        total_amount=total_amount,
+        discounted_amount=total_amount,
+        discounted_prices=[line.unit_price for line in lines],
+        applied_discounts=[],
+    )
+
+
+def _copy_basket(priced):
+    return PricedBasket(
+        total_amount=priced.total_amount,
+        discounted_amount=priced.discounted_amount,
+        discounted_prices=list(priced.discounted_prices),
+        applied_discounts=list(priced.applied_discounts),
+    )
+
+
+def _apply_rule(priced, rule, lines, load_history):
+    """
+    Apply one rule to ``priced`` in place.
+
+    Returns ``(applied, stop)``: whether the rule produced a discount and whether
+    evaluation must end after it.
+    """
+    if priced.discounted_amount <= 0:
+        return False, True
+
+    applied_count = len(priced.applied_discounts)
+    if not rule.can_stack_on(applied_count):
+        return False, False
+
+    if rule.discount_type == 'percentage':
+        _apply_percentage_discount(priced, rule)
+    elif rule.discount_type == 'flat':
+        _apply_flat_discount(priced, rule, load_history())
+    elif rule.discount_type == 'category':
+        _apply_category_discount(priced, rule, lines, load_history())
+
+    applied = len(priced.applied_discounts) > applied_count
+    return applied, applied and rule.ends_evaluation
+
+
+def _price_greedy(lines, rules, load_history):
+    """Apply rules in priority order; the first rule of a group to apply claims it."""
+    priced = _new_basket(lines)
+    claimed_groups = set()
+    for rule in rules:
+        if rule.stacking_group in claimed_groups:
+            continue
+        applied, stop = _apply_rule(priced, rule, lines, load_history)
+        if applied and rule.stacking_group:
+            claimed_groups.add(rule.stacking_group)
+        if stop:
+            if applied and rule.ends_evaluation:
+                logger.info("Discount rule %s ends evaluation", rule.id)
+            break
+    return priced
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class _BestCombination:
+    """
+    Branch-and-bound over the rules in priority order, choosing for each grouped
+    rule whether it takes its group's slot. The partially priced basket is carried
+    down the search tree so every prefix is priced once, and states already
+    explored (same position, claimed groups and subtotals) are memoized.
+
+    A branch is pruned when even its optimistic bound cannot beat the best
+    discount found so far.
+    """
+
+    def __init__(self, lines, rules, load_history, time_budget):
+        self.lines = lines
+        self.rules = rules
+        self.load_history = load_history
+        self.deadline = time.monotonic() + time_budget if time_budget is not None else None
+        self.standalone = {}
+        self.explored = set()
+        self.best = None
+
+    def search(self, greedy):
+        self.best = greedy
+        try:
+            for rule in self.rules:
+                self._check_budget()
+                self.standalone[rule.id] = self._standalone_discount(rule)
+            self._visit(0, _new_basket(self.lines), frozenset())
+        except _BudgetExceeded:
+            logger.warning("Discount optimizer ran out of time; using the best combination found so far")
+        return self.best
+
+    def _check_budget(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise _BudgetExceeded
+
+    def _standalone_discount(self, rule):
+        """``(rate, amount)``: the share of the running total a rule can take, or the fixed amount it can take."""
+        priced = _new_basket(self.lines)
+        _apply_rule(priced, rule, self.lines, self.load_history)
+        if rule.discount_type == 'percentage':
+            return (rule.percentage / HUNDRED if priced.applied_discounts else Decimal('0')), Decimal('0')
+        return Decimal('0'), priced.total_discount
+
+    def _bound(self, index, priced, claimed_groups):
+        """
+        Optimistic total discount from this state: every remaining ungrouped rule plus,
+        per unclaimed group, its best rate and its best fixed amount. Taking all the
+        percentages before all the fixed amounts leaves the lowest possible total.
+        """
+        keep, subtract = Decimal('1'), Decimal('0')
+        group_rate, group_amount = {}, {}
+        for rule in self.rules[index:]:
+            rate, amount = self.standalone[rule.id]
+            group = rule.stacking_group
+            if not group:
+                keep *= 1 - rate
+                subtract += amount
+            elif group not in claimed_groups:
+                group_rate[group] = max(group_rate.get(group, rate), rate)
+                group_amount[group] = max(group_amount.get(group, amount), amount)
+
+        for rate in group_rate.values():
+            keep *= 1 - rate
+        subtract += sum(group_amount.values())
+        return priced.total_amount - max(priced.discounted_amount * keep - subtract, Decimal('0'))
+
+    def _visit(self, index, priced, claimed_groups):
+        self._check_budget()
+        if index == len(self.rules):
+            self._consider(priced)
+            return
+
+        state = (index, claimed_groups, priced.discounted_amount, tuple(priced.discounted_prices),
+                 len(priced.applied_discounts))
+        if state in self.explored:
+            return
+        self.explored.add(state)
+
+        if self._bound(index, priced, claimed_groups) <= self.best.total_discount:
+            return
+
+        rule = self.rules[index]
+        group = rule.stacking_group
+        if group in claimed_groups:
+            self._visit(index + 1, priced, claimed_groups)
+            return
+
+        branch = _copy_basket(priced)
+        applied, stop = _apply_rule(branch, rule, self.lines, self.load_history)
+        if stop:
+            self._consider(branch)
+        else:
+            self._visit(index + 1, branch, claimed_groups | {group} if applied and group else claimed_groups)
+
+        if group and applied:
+            # Leave the group's slot to a later rule
+            self._visit(index + 1, priced, claimed_groups)
+
+    def _consider(self, priced):
+        if priced.total_discount > self.best.total_discount:
+            self.best = priced
+
+
+def _apply_percentage_discount(priced, rule):
+    """Apply percentage discount if total order value exceeds threshold"""
+    if priced.total_amount >= rule.min_order_value:
+        discount_amount = priced.discounted_amount * (rule.percentage / HUNDRED)
+        priced.discounted_amount -= discount_amount
+        priced.applied_discounts.append(AppliedDiscountLine(
+            rule_id=rule.id,
+            discount_type=rule.discount_type,
+            discount_name=f"{rule.percentage}% Discount",
+            description=f"Order value exceeds ₹{rule.min_order_value}",
+            amount=discount_amount,
+        ))
+
+
+def _apply_flat_discount(priced, rule, history):
+    """Apply flat discount if user has placed enough previous orders"""
+    if history.order_count >= rule.min_previous_orders:
+        # Don't discount more than the order value
+        discount_amount = min(rule.flat_amount, priced.discounted_amount)
+        priced.discounted_amount -= discount_amount
+        priced.applied_discounts.append(AppliedDiscountLine(
+            rule_id=rule.id,
+            discount_type=rule.discount_type,
+            discount_name="Loyal Customer Discount",
+            description=f"Flat discount for having {history.order_count} previous orders",
+            amount=discount_amount,
+        ))
+
+
+def _apply_category_discount(priced, rule, lines, history):
+    """Apply discount for items in a category once the customer has bought more than the minimum from it."""
+    total_quantity = history.category_quantities.get(rule.category_id, 0)
+    total_quantity += sum(line.quantity for line in lines if line.category_id == rule.category_id)
+
+    if total_quantity <= rule.min_items_in_category:
+        return
+
+    rate = rule.category_discount_percentage / HUNDRED
+    total_discount = Decimal('0')
+    for index, line in enumerate(lines):
+        if line.category_id == rule.category_id:
+            total_discount += line.unit_price * line.quantity * rate
+            priced.discounted_prices[index] = line.unit_price - (line.unit_price * rate)
+
+    if total_discount > 0:
+        priced.discounted_amount -= total_discount
+        priced.applied_discounts.append(AppliedDiscountLine(
+            rule_id=rule.id,
+            discount_type=rule.discount_type,
+            discount_name=f"Category Discount on {rule.category_name}",
+            description=f"{rule.category_discount_percentage}% off on {rule.category_name} items",
+            amount=total_discount,
+        ))
@@ -4,4 +4,11 @@ from .models import DiscountRule
 class DiscountRuleSerializer(serializers.ModelSerializer):
     class Meta:
         model = DiscountRule
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def validate(self, data):
+        starts_at = data.get('starts_at', getattr(self.instance, 'starts_at', None))
+        ends_at = data.get('ends_at', getattr(self.instance, 'ends_at', None))
+        if starts_at and ends_at and ends_at <= starts_at:
+            raise serializers.ValidationError({'ends_at': "The end of the schedule must be after its start."})
+        return data
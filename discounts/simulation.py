@@ -0,0 +1,126 @@
+# ecommerce/simulation.py
+
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+import logging
+
+from orders.models import Order, OrderItem
+from .pricing import BasketLine, CustomerHistory, RuleSpec, price_basket
+from .workers import chunked, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _history_timelines(user_ids):
+    """
+    Build, per user, the cumulative order count and category quantities after each
+    distinct order timestamp, so the history "as of" any order is a bisect away.
+    Two queries for the whole chunk instead of two per order.
+    """
+    orders_by_user = defaultdict(list)
+    for order_id, user_id, created_at in (Order.objects.filter(user_id__in=user_ids)
+                                          .order_by('created_at')
+                                          .values_list('id', 'user_id', 'created_at')):
+        orders_by_user[user_id].append((created_at, order_id))
+
+    quantities_by_order = defaultdict(lambda: defaultdict(int))
+    for order_id, category_id, quantity in (OrderItem.objects.filter(order__user_id__in=user_ids)
+                                            .values_list('order_id', 'product__category_id', 'quantity')):
+        quantities_by_order[order_id][category_id] += quantity
+
+    timelines = {}
+    for user_id, orders in orders_by_user.items():
+        timestamps, histories = [], []
+        count, quantities = 0, defaultdict(int)
+        for created_at, order_id in orders:
+            count += 1
+            for category_id, quantity in quantities_by_order[order_id].items():
+                quantities[category_id] += quantity
+            history = CustomerHistory(order_count=count, category_quantities=dict(quantities))
+            if timestamps and timestamps[-1] == created_at:
+                histories[-1] = history
+            else:
+                timestamps.append(created_at)
+                histories.append(history)
+        timelines[user_id] = (timestamps, histories)
+    return timelines
+
+
+def _replay_orders(order_ids, rules):
+    """Price a chunk of historical orders with ``rules`` without writing anything back."""
+    result = {
+        "orders_replayed": 0,
+        "orders_affected": 0,
+        "actual_discount": Decimal('0'),
+        "simulated_discount": Decimal('0'),
+    }
+
+    orders = list(Order.objects.filter(id__in=order_ids)
+                  .only('id', 'user_id', 'total_amount', 'discounted_amount', 'created_at'))
+    lines_by_order = defaultdict(list)
+    for order_id, product_id, category_id, unit_price, quantity in (
+            OrderItem.objects.filter(order_id__in=order_ids).order_by('id')
+            .values_list('order_id', 'product_id', 'product__category_id', 'unit_price', 'quantity')):
+        lines_by_order[order_id].append(BasketLine(product_id, category_id, unit_price, quantity))
+
+    timelines = _history_timelines({order.user_id for order in orders}) if any(r.needs_history for r in rules) else {}
+
+    for order in orders:
+        def history(order=order):
+            timestamps, histories = timelines[order.user_id]
+            return histories[bisect_right(timestamps, order.created_at) - 1]
+
+        # A scheduled rule only prices the orders placed while it would have been running
+        scheduled = [rule for rule in rules if rule.is_scheduled_at(order.created_at)]
+        priced = price_basket(lines_by_order[order.id], scheduled, history)
+
+        actual_discount = order.total_amount - order.discounted_amount
+        result["orders_replayed"] += 1
+        result["actual_discount"] += actual_discount
+        result["simulated_discount"] += priced.total_discount
+        if priced.total_discount != actual_discount:
+            result["orders_affected"] += 1
+
+    return result
+
+
+def simulate_discounts(rules, start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=0):
+    """
+    Replay historical orders created in ``[start, end)`` through the pricing core
+    with a candidate rule set and report what it would have cost.
+
+    ``rules`` may contain unsaved or inactive ``DiscountRule`` instances; they are
+    priced as if activated, but only for orders placed within their schedule. Orders are streamed by id in chunks of ``chunk_size``
+    and fanned out to ``workers`` processes. The returned ``discount_delta`` is the
+    simulated discount minus what was actually granted, so a positive value is
+    extra cost to the store.
+    """
+    candidates = sorted((RuleSpec.from_model(rule) for rule in rules), key=lambda rule: rule.priority)
+
+    orders = Order.objects.all()
+    if start is not None:
+        orders = orders.filter(created_at__gte=start)
+    if end is not None:
+        orders = orders.filter(created_at__lt=end)
+    order_ids = orders.order_by('id').values_list('id', flat=True).iterator(chunk_size=chunk_size)
+
+    report = {
+        "orders_replayed": 0,
+        "orders_affected": 0,
+        "actual_discount": Decimal('0'),
+        "simulated_discount": Decimal('0'),
+    }
+    tasks = ((chunk, candidates) for chunk in chunked(order_ids, chunk_size))
+    for result in run_in_pool(_replay_orders, tasks, workers=workers):
+        for key in report:
+            report[key] += result[key]
+
+    report["discount_delta"] = report["simulated_discount"] - report["actual_discount"]
+    logger.info(
+        "Simulated %s orders: %s affected, discount delta ₹%s",
+        report["orders_replayed"], report["orders_affected"], report["discount_delta"],
+    )
+    return report
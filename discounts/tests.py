@@ -1,9 +1,30 @@
+from dataclasses import replace
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.management import CommandError, call_command
+from django.db.models import Count
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from products.models import Category
-from discounts.models import DiscountRule
+from products.models import Category, Product
+from orders.models import Order, OrderItem
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from carts.models import Cart
+from discounts.cache import DISCOUNT_RULES_CACHE_KEY, get_discount_rules_from_cache, get_discount_rules_version, seconds_until_next_rule_boundary
+from discounts.cache import get_rule_set_from_cache, invalidate_discount_rules_cache
+from discounts.dataset import DatasetGenerator, DatasetSize
+from discounts.engine import DiscountEngine
+from discounts.models import DiscountRule, AppliedDiscount
+from discounts.pricing import BasketLine, CustomerHistory, RuleSpec, price_basket
+from discounts.simulation import simulate_discounts
+from discounts.warmup import warm_up
 
 User = get_user_model()
 
@@ -104,3 +125,357 @@ class DiscountRuleAPITestCase(APITestCase):
         url = reverse("discount-rule-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DiscountSimulationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='buyer@example.com',
+            password='buyerpass123',
+            first_name='Buyer',
+            last_name='User',
+            phone='+917777777777'
+        )
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            name="Laptop", category=self.category, price=Decimal('6000.00'), stock_quantity=10
+        )
+
+        # Two historical orders placed without any discount
+        self.orders = []
+        for _ in range(2):
+            order = Order.objects.create(user=self.user, total_amount=Decimal('6000.00'), discounted_amount=Decimal('6000.00'))
+            OrderItem.objects.create(order=order, product=self.product, quantity=1,
+                                     unit_price=Decimal('6000.00'), discounted_price=Decimal('6000.00'))
+            self.orders.append(order)
+
+        self.candidate = DiscountRule.objects.create(
+            name="Draft 10% sale",
+            description="10% off orders above ₹5000",
+            discount_type='percentage',
+            min_order_value=5000,
+            percentage=10,
+            priority=1,
+            is_active=False
+        )
+
+    def test_simulation_reports_discount_delta(self):
+        report = simulate_discounts([self.candidate])
+
+        self.assertEqual(report['orders_replayed'], 2)
+        self.assertEqual(report['orders_affected'], 2)
+        self.assertEqual(report['actual_discount'], Decimal('0'))
+        self.assertEqual(report['discount_delta'], Decimal('1200.00'))
+
+    def test_scheduled_rule_only_prices_orders_in_its_window(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.candidate.starts_at = timezone.now() - timedelta(days=1)
+
+        report = simulate_discounts([self.candidate])
+
+        self.assertEqual(report['orders_replayed'], 2)
+        self.assertEqual(report['orders_affected'], 1)
+        self.assertEqual(report['discount_delta'], Decimal('600.00'))
+
+    def test_simulation_does_not_write(self):
+        simulate_discounts([self.candidate], chunk_size=1)
+
+        self.assertFalse(AppliedDiscount.objects.exists())
+        for order in self.orders:
+            order.refresh_from_db()
+            self.assertEqual(order.discounted_amount, Decimal('6000.00'))
+        self.assertFalse(OrderItem.objects.exclude(discounted_price=Decimal('6000.00')).exists())
+
+    def test_flat_rule_uses_history_as_of_each_order(self):
+        loyalty = DiscountRule(
+            name="Loyalty", description="₹100 off from the second order", discount_type='flat',
+            min_previous_orders=2, flat_amount=Decimal('100.00'), priority=1
+        )
+        report = simulate_discounts([loyalty])
+
+        # Only the second order had two orders on record when it was placed
+        self.assertEqual(report['orders_affected'], 1)
+        self.assertEqual(report['discount_delta'], Decimal('100.00'))
+
+
+class ScheduledRuleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.now = timezone.now()
+        self.always = DiscountRule.objects.create(
+            name="Always on", description="", discount_type='percentage',
+            min_order_value=0, percentage=5, priority=1
+        )
+        self.sale = DiscountRule.objects.create(
+            name="Weekend sale", description="", discount_type='percentage',
+            min_order_value=0, percentage=20, priority=2,
+            starts_at=self.now + timedelta(hours=1), ends_at=self.now + timedelta(hours=3)
+        )
+        DiscountRule.objects.create(
+            name="Expired", description="", discount_type='percentage',
+            min_order_value=0, percentage=50, priority=3, ends_at=self.now - timedelta(hours=1)
+        )
+
+    def test_active_subset_follows_schedule_without_queries(self):
+        self.assertEqual(get_discount_rules_from_cache(self.now), [self.always])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_discount_rules_from_cache(self.now + timedelta(hours=1)), [self.always, self.sale])
+            self.assertEqual(get_discount_rules_from_cache(self.now + timedelta(hours=2)), [self.always, self.sale])
+            self.assertEqual(get_discount_rules_from_cache(self.now + timedelta(hours=3)), [self.always])
+
+    def test_version_changes_at_schedule_boundaries(self):
+        before = get_discount_rules_version(self.now)
+        during = get_discount_rules_version(self.now + timedelta(hours=2))
+        after = get_discount_rules_version(self.now + timedelta(hours=4))
+
+        self.assertEqual(before, get_discount_rules_version(self.now + timedelta(minutes=59)))
+        self.assertEqual(len({before, during, after}), 3)
+
+    def test_seconds_until_next_boundary(self):
+        self.assertEqual(seconds_until_next_rule_boundary(self.now), 3600)
+        self.assertEqual(seconds_until_next_rule_boundary(self.now + timedelta(hours=1)), 7200)
+        self.assertIsNone(seconds_until_next_rule_boundary(self.now + timedelta(hours=3)))
+
+    def test_schedule_must_end_after_it_starts(self):
+        self.sale.ends_at = self.sale.starts_at
+        with self.assertRaises(ValidationError):
+            self.sale.full_clean()
+
+
+class CartDiscountEngineTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_cart_is_read_from_storage_when_not_given(self):
+        user = User.objects.create_user(email="engine@example.com", password="enginepass123")
+        category = Category.objects.create(name="Audio")
+        product = Product.objects.create(name="Speaker", price=Decimal('3000.00'), stock_quantity=5, category=category)
+        Cart.objects.create(user=user, product=product, quantity=2)
+        DiscountRule.objects.create(name="10% off", discount_type='percentage', min_order_value=5000,
+                                    percentage=Decimal('10'), priority=1)
+
+        engine = DiscountEngine(None, user.id)
+        result = engine.get_cart_discounts()
+
+        self.assertEqual([item.product_id for item in engine.cart_items], [product.id])
+        self.assertEqual([discount['amount'] for discount in result['applied_discounts']], [Decimal('600')])
+
+
+class PricingCoreTestCase(SimpleTestCase):
+    def setUp(self):
+        self.lines = [
+            BasketLine(product_id=1, category_id=10, unit_price=Decimal('1000.00'), quantity=3),
+            BasketLine(product_id=2, category_id=20, unit_price=Decimal('500.00'), quantity=2),
+        ]
+        self.percentage = RuleSpec(id=1, discount_type='percentage', priority=1,
+                                   min_order_value=Decimal('3000'), percentage=Decimal('10'))
+        self.flat = RuleSpec(id=2, discount_type='flat', priority=2,
+                             min_previous_orders=5, flat_amount=Decimal('500'))
+        self.category = RuleSpec(id=3, discount_type='category', priority=3, category_id=10,
+                                 category_name='Electronics', min_items_in_category=3,
+                                 category_discount_percentage=Decimal('5'))
+
+    def test_rules_stack_in_priority_order(self):
+        history = CustomerHistory(order_count=5, category_quantities={10: 1})
+        priced = price_basket(self.lines, [self.category, self.flat, self.percentage], history)
+
+        self.assertEqual(priced.total_amount, Decimal('4000.00'))
+        # 10% of 4000, then ₹500 flat, then 5% of the 3000 electronics subtotal
+        self.assertEqual(priced.discounted_amount, Decimal('2950.00'))
+        self.assertEqual([d.rule_id for d in priced.applied_discounts], [1, 2, 3])
+        self.assertEqual(priced.discounted_prices, [Decimal('950.00'), Decimal('500.00')])
+
+    def test_history_loader_only_called_when_needed(self):
+        def history():
+            raise AssertionError("history should not be loaded")
+
+        priced = price_basket(self.lines, [self.percentage], history)
+        self.assertEqual(priced.total_discount, Decimal('400.00'))
+
+    def test_category_threshold_counts_history(self):
+        priced = price_basket(self.lines, [self.category], CustomerHistory())
+        self.assertEqual(priced.applied_discounts, [])
+
+        priced = price_basket(self.lines, [self.category], CustomerHistory(category_quantities={10: 1}))
+        self.assertEqual(priced.total_discount, Decimal('150.00'))
+
+    def test_exclusive_rule_stops_evaluation_without_loading_history(self):
+        def history():
+            raise AssertionError("history should not be loaded")
+
+        exclusive = replace(self.percentage, is_exclusive=True)
+        priced = price_basket(self.lines, [self.category, self.flat, exclusive], history)
+        self.assertEqual([d.rule_id for d in priced.applied_discounts], [1])
+
+    def test_exclusive_rule_skipped_once_others_applied(self):
+        history = CustomerHistory(order_count=5, category_quantities={10: 1})
+        exclusive_flat = replace(self.flat, is_exclusive=True)
+        priced = price_basket(self.lines, [self.percentage, exclusive_flat, self.category], history)
+        self.assertEqual([d.rule_id for d in priced.applied_discounts], [1, 3])
+
+    def test_stop_further_rules_keeps_earlier_discounts(self):
+        history = CustomerHistory(order_count=5, category_quantities={10: 1})
+        stopping_flat = replace(self.flat, stop_further_rules=True)
+        priced = price_basket(self.lines, [self.percentage, stopping_flat, self.category], history)
+        self.assertEqual([d.rule_id for d in priced.applied_discounts], [1, 2])
+
+    def test_max_stack_depth(self):
+        history = CustomerHistory(order_count=5, category_quantities={10: 1})
+        shallow_category = replace(self.category, max_stack_depth=2)
+        priced = price_basket(self.lines, [self.percentage, self.flat, shallow_category], history)
+        self.assertEqual([d.rule_id for d in priced.applied_discounts], [1, 2])
+
+    def test_evaluation_stops_when_basket_is_free(self):
+        def history():
+            raise AssertionError("history should not be loaded")
+
+        full = replace(self.percentage, percentage=Decimal('100'))
+        priced = price_basket(self.lines, [full, self.flat, self.category], history)
+        self.assertEqual(priced.discounted_amount, Decimal('0'))
+        self.assertEqual(len(priced.applied_discounts), 1)
+
+    def test_stacking_group_picks_best_rule_for_customer(self):
+        history = CustomerHistory(order_count=5, category_quantities={10: 1})
+        seasonal = [replace(self.percentage, stacking_group='seasonal'), replace(self.flat, stacking_group='seasonal')]
+
+        # Greedy priority order would take the ₹400 percentage discount; the flat ₹500 is better
+        priced = price_basket(self.lines, seasonal + [self.category], history)
+        self.assertEqual([d.rule_id for d in priced.applied_discounts], [2, 3])
+        self.assertEqual(priced.total_discount, Decimal('650.00'))
+
+    def test_optimizer_falls_back_to_greedy_without_budget(self):
+        history = CustomerHistory(order_count=5)
+        seasonal = [replace(self.percentage, stacking_group='seasonal'), replace(self.flat, stacking_group='seasonal')]
+
+        priced = price_basket(self.lines, seasonal, history, time_budget=0)
+        self.assertEqual([d.rule_id for d in priced.applied_discounts], [1])
+
+    def test_optimizer_handles_many_groups(self):
+        history = CustomerHistory(order_count=5)
+        rules = [
+            RuleSpec(id=index, discount_type='percentage', priority=index, min_order_value=Decimal('0'),
+                     percentage=Decimal(index % 7 + 1), stacking_group=f'group-{index % 10}')
+            for index in range(1, 101)
+        ]
+
+        priced = price_basket(self.lines, rules, history, time_budget=1)
+        groups = [f'group-{d.rule_id % 10}' for d in priced.applied_discounts]
+        self.assertEqual(len(groups), 10)
+        self.assertEqual(len(set(groups)), 10)
+        # Each group offers a 7% rule, the best achievable
+        self.assertTrue(all(d.discount_name == "7% Discount" for d in priced.applied_discounts))
+
+
+class DatasetGeneratorTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.now = timezone.now()
+
+    def _generate(self, seed):
+        """Generate a dataset, capture its contents and roll it back."""
+        with transaction.atomic():
+            counts = DatasetGenerator(scale=0.05, seed=seed, batch_size=7, now=self.now).generate()
+            contents = (
+                list(Order.objects.order_by('id').values_list('total_amount', 'discounted_amount', 'created_at')),
+                list(OrderItem.objects.order_by('id').values_list('quantity', 'unit_price', 'discounted_price')),
+                list(DiscountRule.objects.order_by('id').values_list('discount_type', 'priority', 'is_active')),
+                Cart.objects.count(),
+            )
+            transaction.set_rollback(True)
+        return counts, contents
+
+    def test_same_seed_gives_same_dataset(self):
+        counts, contents = self._generate(seed=1)
+        self.assertEqual(self._generate(seed=1), (counts, contents))
+        self.assertNotEqual(self._generate(seed=2)[1], contents)
+
+        size = DatasetSize.for_scale(0.05)
+        self.assertEqual(counts['User'], size.users)
+        self.assertEqual(counts['Order'], size.orders)
+        self.assertEqual(counts['OrderItem'], len(contents[1]))
+
+    def test_orders_are_consistent_and_skewed(self):
+        DatasetGenerator(scale=0.05, seed=3, now=self.now).generate()
+
+        # Totals agree with the lines, and applied discounts with the totals
+        for order in Order.objects.prefetch_related('items', 'applied_discounts'):
+            self.assertEqual(order.total_amount, sum(item.subtotal for item in order.items.all()))
+            discount = sum((applied.amount for applied in order.applied_discounts.all()), Decimal('0'))
+            self.assertEqual(order.total_amount - order.discounted_amount, discount)
+
+        created = list(Order.objects.order_by('id').values_list('created_at', flat=True))
+        self.assertEqual(created, sorted(created))
+
+        orders_per_user = list(User.objects.annotate(order_count=Count('orders'))
+                               .order_by('-order_count').values_list('order_count', flat=True))
+        self.assertGreater(orders_per_user[0], 5 * orders_per_user[len(orders_per_user) // 2])
+
+    def test_command_refuses_existing_seed(self):
+        out = StringIO()
+        call_command('generate_dataset', scale=0.01, seed=4, stdout=out)
+        self.assertIn("Total rows:", out.getvalue())
+
+        with self.assertRaisesMessage(CommandError, "seed 4 already exists"):
+            call_command('generate_dataset', scale=0.01, seed=4, stdout=StringIO())
+
+
+    def test_command_dates_the_dataset_from_now(self):
+        out = StringIO()
+        call_command('generate_dataset', scale=0.01, seed=5, now='2024-03-01', days=30, stdout=out)
+
+        self.assertIn("now 2024-03-01T00:00:00+00:00", out.getvalue())
+        end = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        self.assertFalse(Order.objects.filter(created_at__gt=end).exists())
+        self.assertFalse(Order.objects.filter(created_at__lt=end - timedelta(days=30)).exists())
+
+        with self.assertRaisesMessage(CommandError, "--now must be an ISO date or datetime"):
+            call_command('generate_dataset', scale=0.01, seed=6, now='March', stdout=StringIO())
+
+
+class WarmUpTestCase(TestCase):
+    # Warm-up connects to every database, the test replica included
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        DiscountRule.objects.create(name="10% off", discount_type='percentage', percentage=Decimal('10'))
+
+    def test_warm_up_primes_the_rule_cache(self):
+        timings = warm_up()
+
+        self.assertEqual(list(timings), ['imports', 'connections', 'rules'])
+        self.assertIsNotNone(cache.get(DISCOUNT_RULES_CACHE_KEY))
+        with self.assertNumQueries(0):
+            get_discount_rules_from_cache()
+
+    def test_failing_step_is_skipped_unless_errors_are_raised(self):
+        with mock.patch('discounts.warmup.get_rule_set_from_cache', side_effect=ConnectionError("cache down")):
+            with self.assertLogs('discounts.warmup', 'ERROR'):
+                timings = warm_up()
+            self.assertNotIn('rules', timings)
+
+            with self.assertRaises(CommandError):
+                call_command('warm_up', stdout=StringIO())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class RuleReloadReplicaTestCase(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_reload_reads_a_replica_unless_rules_were_just_edited(self):
+        DiscountRule.objects.create(name="10% off", discount_type='percentage', percentage=Decimal('10'))
+        invalidate_discount_rules_cache()
+        self.assertEqual([rule.name for rule in get_rule_set_from_cache().rules], ["10% off"])
+
+        # With the pin and the cached rules gone, the reload reads the replica, which never got the rule
+        cache.clear()
+        self.assertEqual(get_rule_set_from_cache().rules, [])
@@ -23,7 +23,7 @@ class DiscountRuleListAPIView(APIView):
             serializer = DiscountRuleSerializer(discount_rules, many=True)
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error retrieving discount rules: {e}")
+            logger.error("Error retrieving discount rules: %s", e)
             return Response({"error": "An error occurred while fetching discount rules."}, status=500)
     
     def post(self, request):
@@ -33,11 +33,11 @@ class DiscountRuleListAPIView(APIView):
             if serializer.is_valid():
                 serializer.save()
                 invalidate_discount_rules_cache()
-                logger.info(f"Discount rule created successfully.")
+                logger.info("Discount rule created successfully.")
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error creating discount rule: {e}")
+            logger.error("Error creating discount rule: %s", e)
             return Response({"error": "An error occurred while creating the discount rule."}, status=500)
 
 
@@ -51,7 +51,7 @@ class DiscountRuleDetailAPIView(APIView):
             serializer = DiscountRuleSerializer(discount_rule)
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error retrieving discount rule {pk}: {e}")
+            logger.error("Error retrieving discount rule %s: %s", pk, e)
             return Response({"error": "An error occurred while fetching the discount rule."}, status=500)
     
     def put(self, request, pk):
@@ -62,11 +62,11 @@ class DiscountRuleDetailAPIView(APIView):
             if serializer.is_valid():
                 serializer.save()
                 invalidate_discount_rules_cache()
-                logger.info(f"Discount rule {pk} updated successfully.")
+                logger.info("Discount rule %s updated successfully.", pk)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error updating discount rule {pk}: {e}")
+            logger.error("Error updating discount rule %s: %s", pk, e)
             return Response({"error": "An error occurred while updating the discount rule."}, status=500)
     
     def delete(self, request, pk):
@@ -75,8 +75,8 @@ class DiscountRuleDetailAPIView(APIView):
             discount_rule = get_object_or_404(DiscountRule, pk=pk)
             discount_rule.delete()
             invalidate_discount_rules_cache()
-            logger.info(f"Discount rule {pk} deleted successfully.")
+            logger.info("Discount rule %s deleted successfully.", pk)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
-            logger.error(f"Error deleting discount rule {pk}: {e}")
+            logger.error("Error deleting discount rule %s: %s", pk, e)
             return Response({"error": "An error occurred while deleting the discount rule."}, status=500)
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Warm-up for a freshly started worker process.
+
+Without it a new worker pays, on its first requests, for importing the URLconf
+(every view and serializer, DRF, simplejwt), for optional modules third-party
+code imports on first use (Pillow, on the first image upload), for opening its
+database and cache connections and for loading the discount rule set.
+``warm_up`` does all of it before the worker takes traffic.
+
+It runs from the WSGI/ASGI module when ``WARMUP_ON_STARTUP`` is on, so once per
+worker unless the server preloads the application: connections opened before
+a fork would be shared by every child, so servers that preload should leave
+the setting off and call ``warm_up`` from their post-fork hook instead.
+``python manage.py warm_up`` runs the same steps and reports their timings.
+"""
+
+from importlib import import_module
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.urls import get_resolver
+
+from .cache import get_discount_rules_version, get_rule_set_from_cache
+
+logger = logging.getLogger(__name__)
+
+# Modules imported lazily by third-party code on first use
+DEFAULT_WARMUP_IMPORTS = ('PIL.Image',)
+
+
+def _import_modules():
+    import_module(settings.ROOT_URLCONF)
+    # Builds the reverse lookup tables the first reverse() would otherwise build
+    get_resolver().reverse_dict
+    for module in getattr(settings, 'WARMUP_IMPORTS', DEFAULT_WARMUP_IMPORTS):
+        import_module(module)
+
+
+def _open_connections():
+    for connection in connections.all():
+        connection.ensure_connection()
+    for alias in settings.CACHES:
+        caches[alias].get('warm-up')
+
+
+def _prime_rules():
+    get_rule_set_from_cache()
+    get_discount_rules_version()
+
+
+STEPS = (
+    ('imports', _import_modules),
+    ('connections', _open_connections),
+    ('rules', _prime_rules),
+)
+
+
+def warm_up(raise_errors=False):
+    """
+    Run every warm-up step and return ``{step: seconds}``.
+
+    A failing step is logged and skipped, so an unreachable database or cache
+    does not stop the worker from starting; ``raise_errors`` re-raises instead.
+    """
+    timings = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            if raise_errors:
+                raise
+            logger.exception("Warm-up step %s failed", name)
+            continue
+        timings[name] = time.perf_counter() - started
+
+    logger.info("Warmed up in %.0f ms (%s)", sum(timings.values()) * 1e3,
+                ", ".join(f"{name} {seconds * 1e3:.0f} ms" for name, seconds in timings.items()))
+    return timings
@@ -0,0 +1,59 @@
+# ecommerce/workers.py
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import logging
+import multiprocessing
+
+import django
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    """
+    Configure Django in a freshly spawned worker. Workers are spawned rather than
+    forked so they never inherit the parent's database sockets; each one lazily
+    opens exactly one connection of its own and keeps it for its lifetime.
+    """
+    django.setup()
+
+
+def run_in_pool(func, tasks, workers=0):
+    """
+    Run ``func(*args)`` for every ``args`` tuple yielded by ``tasks`` and yield the results.
+
+    With ``workers`` <= 1 everything runs in-process (used by tests, where the test
+    database is not visible to other processes). Otherwise tasks are fed to a
+    ``ProcessPoolExecutor`` with at most ``2 * workers`` in flight, so ``tasks`` can be
+    a lazy stream over a large table. Results are yielded in completion order.
+    """
+    if not workers or workers <= 1:
+        for args in tasks:
+            yield func(*args)
+        return
+
+    max_in_flight = workers * 2
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        pending = set()
+        for args in tasks:
+            pending.add(pool.submit(func, *args))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        for future in pending:
+            yield future.result()
+
+
+def chunked(iterable, size):
+    """Group an iterable into lists of at most ``size`` items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,50 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def work(batch_size, sleep, once):
+    """Worker loop; also the entry point of spawned worker processes."""
+    import django
+    django.setup()
+    # Spawned workers import this module before Django is set up, so the models are imported only now
+    from jobs.queue import requeue_stale_jobs, run_pending
+
+    while True:
+        requeue_stale_jobs()
+        processed = run_pending(batch_size=batch_size)
+        if once:
+            return processed
+        if not processed:
+            time.sleep(sleep)
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (order post-processing, rollups, cache warming)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to run.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit.')
+
+    def handle(self, *args, **options):
+        worker_args = (options['batch_size'], options['sleep'], options['once'])
+
+        if options['processes'] <= 1:
+            processed = work(*worker_args)
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f"Ran {processed} jobs"))
+            return
+
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=work, args=worker_args) for _ in range(options['processes'])]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} job workers")
+        for worker in workers:
+            worker.join()
+        failed = [worker.pid for worker in workers if worker.exitcode]
+        if failed:
+            raise CommandError(f"Job workers {failed} exited with an error")
@@ -0,0 +1,100 @@
+from datetime import timedelta
+import logging
+import traceback
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+# A job still 'running' after this long is assumed to belong to a dead worker
+STALE_AFTER = timedelta(minutes=10)
+
+
+def job(name):
+    """Register a function as the handler for jobs called ``name``."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    """Queue a single job. Inside a transaction it only becomes visible on commit."""
+    return enqueue_many([(name, payload)])[0]
+
+
+def enqueue_many(jobs):
+    """Queue several ``(name, payload)`` jobs with one insert."""
+    for name, _ in jobs:
+        if name not in _registry:
+            raise KeyError(f"No handler registered for job '{name}'")
+    return Job.objects.bulk_create([Job(name=name, payload=payload) for name, payload in jobs])
+
+
+def _claim(batch_size):
+    """Atomically move up to ``batch_size`` due jobs to 'running' and return them."""
+    now = timezone.now()
+    due = Job.objects.filter(status='pending', run_after__lte=now).order_by('id')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        candidates = list(due.values_list('id', flat=True)[:batch_size])
+
+    claimed = []
+    for job_id in candidates:
+        # The conditional update makes claiming safe where SKIP LOCKED is unavailable (SQLite)
+        if Job.objects.filter(id=job_id, status='pending').update(
+                status='running', locked_at=now, attempts=F('attempts') + 1):
+            claimed.append(job_id)
+    return list(Job.objects.filter(id__in=claimed).order_by('id'))
+
+
+def requeue_stale_jobs():
+    """Put jobs abandoned by a crashed worker back in the queue."""
+    return Job.objects.filter(status='running', locked_at__lt=timezone.now() - STALE_AFTER).update(
+        status='pending', locked_at=None
+    )
+
+
+def run_job(queued_job):
+    handler = _registry.get(queued_job.name)
+    try:
+        if handler is None:
+            raise KeyError(f"No handler registered for job '{queued_job.name}'")
+        with transaction.atomic():
+            handler(**queued_job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if queued_job.attempts >= queued_job.max_attempts:
+            status = 'failed'
+            run_after = queued_job.run_after
+            logger.error("Job %s #%s failed permanently: %s", queued_job.name, queued_job.id, error)
+        else:
+            status = 'pending'
+            run_after = timezone.now() + timedelta(seconds=2 ** queued_job.attempts)
+            logger.warning("Job %s #%s failed, retrying: %s", queued_job.name, queued_job.id, error)
+        Job.objects.filter(id=queued_job.id).update(
+            status=status, run_after=run_after, locked_at=None, last_error=error
+        )
+        return False
+
+    Job.objects.filter(id=queued_job.id).delete()
+    return True
+
+
+def run_pending(batch_size=100):
+    """Run due jobs until the queue is drained. Returns the number of jobs that succeeded."""
+    succeeded = 0
+    while True:
+        batch = _claim(batch_size)
+        if not batch:
+            return succeeded
+        for queued_job in batch:
+            succeeded += run_job(queued_job)
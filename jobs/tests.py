@@ -0,0 +1,80 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .models import Job
+from .queue import enqueue, job, run_pending
+
+calls = []
+
+
+@job('tests.flaky')
+def flaky(fail):
+    calls.append(fail)
+    if fail:
+        raise ValueError("boom")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_successful_job_is_removed(self):
+        enqueue('tests.flaky', fail=False)
+
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [False])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_is_retried_with_backoff(self):
+        queued = enqueue('tests.flaky', fail=True)
+
+        self.assertEqual(run_pending(), 0)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'pending')
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.run_after, timezone.now())
+        self.assertIn("boom", queued.last_error)
+
+        # Not due yet
+        self.assertEqual(run_pending(), 0)
+        self.assertEqual(len(calls), 1)
+
+    def test_job_fails_after_max_attempts(self):
+        queued = enqueue('tests.flaky', fail=True)
+        for _ in range(queued.max_attempts):
+            Job.objects.filter(id=queued.id).update(run_after=timezone.now())
+            run_pending()
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'failed')
+        self.assertEqual(len(calls), queued.max_attempts)
+
+    def test_unknown_job_name_is_rejected(self):
+        with self.assertRaises(KeyError):
+            enqueue('tests.missing')
+
+
+class RunJobsProcessesTests(SimpleTestCase):
+    def test_spawned_workers_start_and_drain_the_queue(self):
+        # Spawned workers cannot see the in-memory test database, so this runs against a throwaway file
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        env = {**os.environ, 'SQLITE_PATH': str(Path(directory.name) / 'jobs.sqlite3'),
+               'DJANGO_SETTINGS_MODULE': 'discount_engine.settings'}
+
+        def manage(*args):
+            return subprocess.run([sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env,
+                                  capture_output=True, text=True, timeout=120)
+
+        self.assertEqual(manage('migrate', '--verbosity', '0').returncode, 0)
+        result = manage('run_jobs', '--processes', '2', '--once')
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Started 2 job workers", result.stdout)
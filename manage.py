@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'discount_engine.settings')
+    # The test suite runs with its own settings; subprocesses it starts inherit them
+    default_settings = 'discount_engine.settings_test' if sys.argv[1:2] == ['test'] else 'discount_engine.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
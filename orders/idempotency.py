@@ -0,0 +1,150 @@
+import functools
+import hashlib
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_CACHE_KEY = 'idempotency:{user_id}:{key}'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+# Deletes the lock only while it still holds the caller's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _redis():
+    if settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    return None
+
+
+def acquire_lock(lock_key, token, ttl):
+    """Take the lock for ``token`` unless someone else holds it; returns whether it was taken."""
+    client = _redis()
+    if client is None:
+        return cache.add(lock_key, token, ttl)
+    return bool(client.set(cache.make_key(lock_key), token, nx=True, ex=ttl))
+
+
+def release_lock(lock_key, token):
+    """
+    Release the lock if ``token`` still holds it. A request that outlived the lock's
+    TTL must not release the lock a retry has taken since.
+    """
+    client = _redis()
+    if client is None:
+        # Check-then-delete is not atomic, but the local-memory cache is only used in one process
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+        return
+    client.register_script(RELEASE_LOCK_SCRIPT)(keys=[cache.make_key(lock_key)], args=[token])
+
+
+def _request_fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {"error": "This Idempotency-Key was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _wait_for_response(cache_key):
+    """Give a concurrent duplicate a short window to finish and store its response."""
+    deadline = time.monotonic() + _get_setting('IDEMPOTENCY_WAIT', 5)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return stored
+    return None
+
+
+def idempotent(view_method):
+    """
+    Deduplicate retries of a view method on the ``Idempotency-Key`` header.
+
+    The first successful (2xx) response for a user/key pair is stored in the cache
+    for ``IDEMPOTENCY_TTL`` seconds and returned verbatim to retries, which never
+    re-enter the view. A duplicate arriving while the first attempt is still running
+    waits up to ``IDEMPOTENCY_WAIT`` seconds on a short lock before giving up with 409.
+    Apply it outside ``transaction.atomic`` so the response is stored after commit.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": "Idempotency-Key is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = IDEMPOTENCY_CACHE_KEY.format(
+            user_id=request.user.id, key=hashlib.sha256(key.encode()).hexdigest()
+        )
+        lock_key = f"{cache_key}:lock"
+        fingerprint = _request_fingerprint(request)
+
+        stored = cache.get(cache_key)
+        if stored is not None:
+            logger.info("Replaying stored response for idempotency key of user %s", request.user.id)
+            return _replay(stored, fingerprint)
+
+        token = uuid.uuid4().hex
+        if not acquire_lock(lock_key, token, _get_setting('IDEMPOTENCY_LOCK_TTL', 30)):
+            stored = _wait_for_response(cache_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            logger.warning("Idempotency key of user %s is still in progress", request.user.id)
+            return Response(
+                {"error": "A request with this Idempotency-Key is already in progress."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        try:
+            # The first attempt may have finished between the lookup and taking the lock
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            response = view_method(self, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                cache.set(cache_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, _get_setting('IDEMPOTENCY_TTL', 60 * 60 * 24))
+            return response
+        finally:
+            release_lock(lock_key, token)
+
+    return wrapper
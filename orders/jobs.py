@@ -0,0 +1,37 @@
+from django.db.models import Count, Max, Sum
+
+from jobs.queue import enqueue_many, job
+from .models import OrderItem, PurchaseHistory
+
+
+def enqueue_order_post_processing(order):
+    """Queue the work that does not need to happen inside the checkout transaction."""
+    enqueue_many([
+        ('orders.update_purchase_history', {'user_id': order.user_id}),
+        ('discounts.rollup_usage', {'order_id': order.id}),
+        ('carts.warm_priced_cart', {'user_id': order.user_id}),
+    ])
+
+
+@job('orders.update_purchase_history')
+def update_purchase_history(user_id):
+    """Recompute the user's per-category counters from their orders; safe to retry."""
+    rows = (OrderItem.objects.filter(order__user_id=user_id)
+            .values('product__category_id')
+            .annotate(items=Sum('quantity'), orders=Count('order', distinct=True), last=Max('order__created_at')))
+
+    PurchaseHistory.objects.bulk_create(
+        [
+            PurchaseHistory(
+                user_id=user_id,
+                category_id=row['product__category_id'],
+                items_purchased=row['items'],
+                orders_count=row['orders'],
+                last_ordered_at=row['last'],
+            )
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'category'],
+        update_fields=['items_purchased', 'orders_count', 'last_ordered_at'],
+    )
@@ -2,7 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 
-from products.models import Product
+from products.models import Category, Product
 
 User = get_user_model()
 
@@ -23,6 +23,13 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Per-user history (flat/category discounts, order list) and the staff list ordered by date
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.email}"
 
@@ -33,6 +40,12 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     discounted_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+
+    class Meta:
+        indexes = [
+            # Covers the per-category quantity aggregation over a user's orders without touching the table
+            models.Index(fields=['order', 'product', 'quantity'], name='orderitem_order_product_idx'),
+        ]
     
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Order #{self.order.id}"
@@ -47,4 +60,20 @@ class OrderItem(models.Model):
     def discounted_subtotal(self):
         if self.discounted_price is not None and self.quantity is not None:
             return self.discounted_price * self.quantity
-        return 0
\ No newline at end of file
+        return 0
+
+
+class PurchaseHistory(models.Model):
+    """Per-customer, per-category purchase counters maintained by a background job."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='purchase_history')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='purchase_history')
+    items_purchased = models.PositiveIntegerField(default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+    last_ordered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'category')
+        verbose_name_plural = "Purchase histories"
+
+    def __str__(self):
+        return f"{self.user.email} - {self.category.name}: {self.items_purchased} items"
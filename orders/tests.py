@@ -1,5 +1,10 @@
+import hashlib
 from decimal import Decimal
-from django.test import TestCase
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -8,7 +13,12 @@ from django.contrib.auth import get_user_model
 from products.models import Product, Category
 from carts.models import Cart
 from discounts.models import DiscountRule, AppliedDiscount
-from orders.models import Order, OrderItem
+from orders.models import Order, OrderItem, PurchaseHistory
+from discounts.models import DiscountUsage
+from jobs.models import Job
+from jobs.queue import run_pending
+from orders.idempotency import IDEMPOTENCY_CACHE_KEY, acquire_lock
+from discount_engine.db_router import PINNED_KEY, user_scope
 
 User = get_user_model()
 
@@ -118,3 +128,229 @@ class OrderCreationTests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("Not enough stock", response.json()['error'])
+
+
+class OrderPostProcessingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='jobs@example.com', password='jobspass123')
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Books")
+        self.product = Product.objects.create(name="Novel", category=self.category, price=400, stock_quantity=10)
+        self.rule = DiscountRule.objects.create(
+            name="10% off orders over 500", discount_type='percentage',
+            min_order_value=500, percentage=10, priority=1, is_active=True
+        )
+        Cart.objects.create(user=self.user, product=self.product, quantity=2)
+
+    def test_checkout_queues_post_processing(self):
+        response = self.client.post(reverse('create-order'), {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(Job.objects.values_list('name', flat=True)),
+            ['carts.warm_priced_cart', 'discounts.rollup_usage', 'orders.update_purchase_history'],
+        )
+        self.assertFalse(PurchaseHistory.objects.exists())
+
+    def test_jobs_update_history_and_usage(self):
+        self.client.post(reverse('create-order'), {}, format='json')
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        self.client.post(reverse('create-order'), {}, format='json')
+
+        self.assertEqual(run_pending(), 6)
+        self.assertFalse(Job.objects.exists())
+
+        history = PurchaseHistory.objects.get(user=self.user, category=self.category)
+        self.assertEqual(history.items_purchased, 3)
+        self.assertEqual(history.orders_count, 2)
+
+        usage = DiscountUsage.objects.get(discount_rule=self.rule)
+        self.assertEqual(usage.times_applied, 1)
+        self.assertEqual(usage.total_amount, Decimal('80.00'))
+
+    def test_stock_taken_concurrently_rolls_back(self):
+        # Another checkout reserved the stock after this one read the cart
+        original_filter = Product.objects.filter
+
+        def filter_after_race(*args, **kwargs):
+            if 'stock_quantity__gte' in kwargs:
+                Product.objects.update(stock_quantity=1)
+            return original_filter(*args, **kwargs)
+
+        with mock.patch.object(Product.objects, 'filter', side_effect=filter_after_race):
+            response = self.client.post(reverse('create-order'), {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Job.objects.exists())
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+
+
+class IdempotentCheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='retry@example.com', password='retrypass123')
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Phone", category=self.category, price=500, stock_quantity=5)
+        Cart.objects.create(user=self.user, product=self.product, quantity=2)
+        self.url = reverse('create-order')
+
+    def test_retry_replays_first_response(self):
+        first = self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        retry = self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 3)
+
+    def test_failed_attempt_is_not_stored(self):
+        Cart.objects.all().delete()
+        response = self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='checkout-2')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        response = self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='checkout-2')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_key_reused_with_different_body_is_rejected(self):
+        self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='checkout-3')
+        response = self.client.post(self.url, {"note": "other"}, format='json', HTTP_IDEMPOTENCY_KEY='checkout-3')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_attempt_outliving_its_lock_leaves_the_retrys_lock(self):
+        cache_key = IDEMPOTENCY_CACHE_KEY.format(user_id=self.user.id, key=hashlib.sha256(b'checkout-5').hexdigest())
+        lock_key = f"{cache_key}:lock"
+
+        def retry_takes_lock(*args, **kwargs):
+            # The first attempt's lock expired while it ran, and a retry took it
+            cache.delete(lock_key)
+            self.assertTrue(acquire_lock(lock_key, 'retry', 30))
+            return mock.DEFAULT
+
+        with mock.patch('orders.views.enqueue_order_post_processing', side_effect=retry_takes_lock):
+            response = self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='checkout-5')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(cache.get(lock_key), 'retry')
+
+    @override_settings(IDEMPOTENCY_WAIT=0.1)
+    def test_concurrent_duplicate_gets_conflict(self):
+        # Another worker holds the lock for this key and has not finished yet
+        cache_key = IDEMPOTENCY_CACHE_KEY.format(user_id=self.user.id, key=hashlib.sha256(b'checkout-4').hexdigest())
+        cache.add(f"{cache_key}:lock", 'in-flight', 30)
+
+        response = self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='checkout-4')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+
+
+class QueryPlanTests(TestCase):
+    """The hot query patterns must be served by their dedicated indexes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='plan@example.com', password='planpass123')
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Laptop", category=self.category, price=1000, stock_quantity=5)
+
+    def assertUsesIndex(self, queryset, index_name):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Tiny test tables would otherwise always be sequentially scanned
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_user_order_history_uses_composite_index(self):
+        self.assertUsesIndex(Order.objects.filter(user=self.user).order_by('created_at'), 'order_user_created_idx')
+
+    def test_active_rules_use_partial_index(self):
+        self.assertUsesIndex(DiscountRule.objects.filter(is_active=True).order_by('priority'),
+                             'discountrule_active_prio_idx')
+
+    def test_product_slug_lookup_uses_unique_index(self):
+        # The unique constraint's index is named by Django, so match on the column instead
+        plan = Product.objects.filter(slug=self.product.slug).explain()
+        self.assertRegex(plan, r'(?i)index.*slug')
+
+
+class OrderListQueryBudgetTests(TestCase):
+    def test_order_list_queries_do_not_grow_with_orders(self):
+        user = User.objects.create_user(email='history@example.com', password='historypass123')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        for index in range(4):
+            category = Category.objects.create(name=f"Category {index}")
+            order = Order.objects.create(user=user, total_amount=Decimal('300.00'), discounted_amount=Decimal('300.00'))
+            for name in ("Pen", "Ink"):
+                product = Product.objects.create(name=f"{name} {index}", category=category, price=150, stock_quantity=5)
+                OrderItem.objects.create(order=order, product=product, quantity=1,
+                                         unit_price=Decimal('150.00'), discounted_price=Decimal('150.00'))
+
+        # OrderListAPIView.query_budget is enforced by the middleware in tests
+        response = client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(response.data[0]['items'][0]['product_details']['category'], "Category 3")
+
+        response = client.get(reverse('order-detail', args=[response.data[0]['id']]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    # The test "replica" is a second database nothing replicates to, so it shows where reads went
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(email='replica@example.com', password='replicapass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name="Stationery")
+        product = Product.objects.create(name="Notebook", category=category, price=100, stock_quantity=10)
+        Cart.objects.create(user=self.user, product=product, quantity=1)
+        Order.objects.create(user=self.user, total_amount=Decimal('100.00'), discounted_amount=Decimal('100.00'))
+
+    def test_order_history_reads_the_primary_right_after_checkout(self):
+        self.assertEqual(self.client.get(reverse('order-list')).data, [])
+
+        response = self.client.post(reverse('create-order'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(len(self.client.get(reverse('order-list')).data), 2)
+
+        # Once the stickiness window is over the replica is read again
+        cache.delete(PINNED_KEY.format(scope=user_scope(self.user.id)))
+        self.assertEqual(self.client.get(reverse('order-list')).data, [])
+
+    def test_views_that_do_not_opt_in_read_the_primary(self):
+        line = Cart.objects.get()
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse('cart-detail', args=[line.pk]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(replica), 0)
+        self.assertTrue(any('carts_cart' in query['sql'] for query in primary))
+
+    def test_opted_in_views_read_the_replica(self):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            self.client.get(reverse('order-list'))
+
+        self.assertEqual(len(primary), 0)
+        self.assertTrue(any('orders_order' in query['sql'] for query in replica))
@@ -1,16 +1,25 @@
 from django.db import transaction
+from django.db.models import F, Prefetch
 from django.shortcuts import get_object_or_404
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
+from discount_engine.throttling import TokenBucketThrottle
+
 from carts.models import Cart
+from carts.snapshots import invalidate_priced_cart
+from carts.storage import get_cart_storage
+from coupons.redemption import CouponError, get_valid_coupon, redeem_coupon, reservations_released_on_rollback
+from products.models import Product
+from .jobs import enqueue_order_post_processing
 from .models import Order, OrderItem
 from .serializers import (
     OrderSerializer
 )
 from discounts.engine import DiscountEngine
+from .idempotency import idempotent
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,19 +30,31 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     and admins to see all orders
     """
     def has_object_permission(self, request, view, obj):
-        return request.user.is_staff or obj.user == request.user
+        return request.user.is_staff or obj.user_id == request.user.id
+
+def orders_with_details():
+    """Orders with everything OrderSerializer reads, in four queries however many orders and items there are."""
+    return Order.objects.select_related('user').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product__category')),
+        'items__product__products_image',
+        'applied_discounts',
+    )
+
 
 class OrderListAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = {'GET': 4}
+    # Reads may come from a replica; the user's own orders stay on the primary for a while after checkout
+    replica_reads = ('GET',)
     
     def get_orders(self, user):
         """Helper to fetch orders based on user role."""
         if user.is_staff:
-            orders = Order.objects.all().prefetch_related('items', 'applied_discounts')
-            logger.info(f"Staff user {user.id} retrieved all orders.")
+            orders = orders_with_details().order_by('-created_at')
+            logger.info("Staff user %s retrieved all orders.", user.id)
         else:
-            orders = Order.objects.filter(user=user).prefetch_related('items', 'applied_discounts')
-            logger.info(f"Non-staff user {user.id} retrieved their orders.")
+            orders = orders_with_details().filter(user_id=user.id).order_by('-created_at')
+            logger.info("Non-staff user %s retrieved their orders.", user.id)
         
         return orders
 
@@ -44,21 +65,23 @@ class OrderListAPIView(APIView):
             serializer = OrderSerializer(orders, many=True)
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error retrieving orders for user {request.user.id}: {e}")
+            logger.error("Error retrieving orders for user %s: %s", request.user.id, e)
             return Response({"error": "An error occurred while fetching orders."}, status=500)
 
 
 class OrderDetailAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = {'GET': 4}
+    replica_reads = ('GET',)
     
     def get_order(self, pk, user):
         """Helper to get the order based on user role."""
         if user.is_staff:
-            order = get_object_or_404(Order.objects.prefetch_related('items', 'applied_discounts'), pk=pk)
-            logger.info(f"Staff user {user.id} retrieved order {pk}.")
+            order = get_object_or_404(orders_with_details(), pk=pk)
+            logger.info("Staff user %s retrieved order %s.", user.id, pk)
         else:
-            order = get_object_or_404(Order.objects.prefetch_related('items', 'applied_discounts'), pk=pk, user=user)
-            logger.info(f"Non-staff user {user.id} retrieved their order {pk}.")
+            order = get_object_or_404(orders_with_details(), pk=pk, user_id=user.id)
+            logger.info("Non-staff user %s retrieved their order %s.", user.id, pk)
         
         return order
 
@@ -69,19 +92,36 @@ class OrderDetailAPIView(APIView):
             serializer = OrderSerializer(order)
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error retrieving order {pk} for user {request.user.id}: {e}")
+            logger.error("Error retrieving order %s for user %s: %s", pk, request.user.id, e)
             return Response({"error": "An error occurred while fetching the order."}, status=500)
 
 class OrderCreateAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'checkout'
 
-    @transaction.atomic
+    @idempotent
     def post(self, request):
-        """Create a new order from cart items."""
+        """
+        Create a new order from cart items. Retries carrying the same Idempotency-Key replay the first result.
+
+        An optional ``coupon_code`` is applied on top of the discount rules.
+        Only what the response depends on happens here; purchase history, discount usage
+        rollups and cart re-pricing are queued as jobs that become visible on commit.
+        """
+        # Outside the transaction, so a coupon reservation is released even if the commit fails
+        with reservations_released_on_rollback() as reservations:
+            return self.place_order(request, reservations)
+
+    @transaction.atomic
+    def place_order(self, request, reservations):
         user = request.user
-        cart_items = Cart.objects.select_related('product').filter(user=user)
+        storage = get_cart_storage()
+        # Quantities changed since the last flush only reach the table here
+        storage.flush(user.id)
+        cart_items = list(Cart.objects.select_related('product').filter(user_id=user.id))
 
-        if not cart_items.exists():
+        if not cart_items:
             return Response({"error": "Your cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Validate product availability
@@ -93,43 +133,67 @@ class OrderCreateAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+        coupon = None
+        if request.data.get('coupon_code'):
+            try:
+                coupon = get_valid_coupon(str(request.data['coupon_code']))
+            except CouponError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Calculate total amount
         total_amount = sum(cart_item.product.price * cart_item.quantity for cart_item in cart_items)
 
         # Create Order
         try:
             order = Order.objects.create(
-                user=user,
+                user_id=user.id,
                 total_amount=total_amount,
                 discounted_amount=total_amount  # will be updated after discounts
             )
 
-            # Create OrderItems and update product stock
-            for cart_item in cart_items:
-                product = cart_item.product
-                quantity = cart_item.quantity
-
-                OrderItem.objects.create(
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
-                    product=product,
-                    quantity=quantity,
-                    unit_price=product.price,
-                    discounted_price=product.price  # will be updated by discount engine
+                    product=cart_item.product,
+                    quantity=cart_item.quantity,
+                    unit_price=cart_item.product.price,
+                    discounted_price=cart_item.product.price  # will be updated by discount engine
                 )
+                for cart_item in cart_items
+            ])
 
-                product.stock_quantity -= quantity
-                product.save()
-
-            # Apply discounts
-            discount_engine = DiscountEngine(order, user)
-            updated_order = discount_engine.calculate_order_discounts()
-
-            # Clear cart after placing order
-            cart_items.delete()
+            # Reserve stock; the conditional update fails if a concurrent checkout got there first
+            for cart_item in cart_items:
+                reserved = Product.objects.filter(
+                    id=cart_item.product_id, stock_quantity__gte=cart_item.quantity
+                ).update(stock_quantity=F('stock_quantity') - cart_item.quantity)
+                if not reserved:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {"error": f"Not enough stock for {cart_item.product.name}."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+            # Apply discounts, then the coupon on top of them
+            DiscountEngine(order, user.id).calculate_order_discounts()
+            if coupon is not None:
+                try:
+                    reservations.append(redeem_coupon(order, coupon))
+                except CouponError as e:
+                    transaction.set_rollback(True)
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Clear cart after placing order; the new order also changes the user's discount history
+            Cart.objects.filter(user_id=user.id).delete()
+            enqueue_order_post_processing(order)
+            transaction.on_commit(lambda: storage.invalidate(user.id))
+            transaction.on_commit(lambda: invalidate_priced_cart(user.id))
 
             # Return order details
-            serializer = OrderSerializer(updated_order)
+            order = orders_with_details().get(id=order.id)
+            serializer = OrderSerializer(order)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
-            logger.error(f"Error creating order for user {user.id}: {e}")
-            return Response({"error": "An error occurred while placing the order."}, status=500)
\ No newline at end of file
+            transaction.set_rollback(True)
+            logger.error("Error creating order for user %s: %s", user.id, e)
+            return Response({"error": "An error occurred while placing the order."}, status=500)
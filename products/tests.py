@@ -4,7 +4,10 @@ from PIL import Image
 from rest_framework.test import APITestCase, APIClient
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from .models import Category, Product
+from django.test import override_settings
+from discount_engine.querybudget import QueryBudgetExceeded, assert_query_budget, fingerprint
+from .models import Category, Product, ProductImage
+from .serializers import ProductSerializer
 
 User = get_user_model()
 
@@ -99,4 +102,56 @@ class ProductTests(APITestCase):
         )
         url = reverse('product-detail', args=[product.slug])
         response = self.client.delete(url)
-        self.assertEqual(response.status_code, 204)
\ No newline at end of file
+        self.assertEqual(response.status_code, 204)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ProductReplicaTests(APITestCase):
+    databases = {'default', 'replica'}
+
+    def test_product_list_and_detail_read_a_replica(self):
+        category = Category.objects.create(name="Primary only")
+        Product.objects.create(name="Primary product", price=100, category=category, stock_quantity=5)
+        category = Category.objects.using('replica').create(name="Replicated")
+        product = Product.objects.using('replica').create(name="Replica product", price=100, category=category,
+                                                          stock_quantity=5)
+
+        response = self.client.get(reverse('product-list-create'))
+        self.assertEqual([item['name'] for item in response.data], ["Replica product"])
+        response = self.client.get(reverse('product-detail', args=[product.slug]))
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductQueryBudgetTests(APITestCase):
+    def setUp(self):
+        for index in range(5):
+            category = Category.objects.create(name=f"Category {index}")
+            product = Product.objects.create(name=f"Product {index}", description="", price=100,
+                                             category=category, stock_quantity=5)
+            ProductImage.objects.create(product=product)
+
+    def test_product_list_stays_within_budget(self):
+        # The middleware raises in tests if the view goes over its declared budget
+        response = self.client.get(reverse('product-list-create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(len(response.data[0]['products_image']), 1)
+
+        response = self.client.get(reverse('product-detail', args=[response.data[0]['slug']]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_lazy_relations_are_reported_with_call_sites(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with assert_query_budget(2, label="Product list"):
+                ProductSerializer(Product.objects.all(), many=True).data
+
+        report = str(raised.exception)
+        self.assertIn("Product list ran 11 queries", report)
+        self.assertIn('5x SELECT "products_category"', report)
+        self.assertIn("products/tests.py", report)
+
+    def test_fingerprint_ignores_literals_and_list_lengths(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'a' LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND name = 'b' LIMIT 1"),
+        )
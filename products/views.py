@@ -14,13 +14,14 @@ logger = logging.getLogger(__name__)
 
 class CategoryListCreateAPIView(APIView):
     permission_classes = [IsAdminUser]
+    query_budget = {'GET': 1}
     def get(self, request):
         try:
             categories = Category.objects.all()
             serializer = CategorySerializer(categories, many=True)
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error fetching categories: {str(e)}")
+            logger.error("Error fetching categories: %s", e)
             return Response({'error': 'Failed to fetch categories.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def post(self, request):
@@ -28,12 +29,12 @@ class CategoryListCreateAPIView(APIView):
             serializer = CategorySerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save()
-                logger.info(f"Category created: {serializer.data}")
+                logger.info("Category created: %s", serializer.data)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
-            logger.warning(f"Invalid data: {serializer.errors}")
+            logger.warning("Invalid data: %s", serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error creating category: {str(e)}")
+            logger.error("Error creating category: %s", e)
             return Response({'error': 'Failed to create category.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class CategoryDetailAPIView(APIView):
@@ -42,7 +43,7 @@ class CategoryDetailAPIView(APIView):
         try:
             return get_object_or_404(Category, pk=pk)
         except ObjectDoesNotExist:
-            logger.warning(f"Category with ID {pk} not found.")
+            logger.warning("Category with ID %s not found.", pk)
             return None
 
     def get(self, request, pk):
@@ -61,12 +62,12 @@ class CategoryDetailAPIView(APIView):
             serializer = CategorySerializer(category, data=request.data)
             if serializer.is_valid():
                 serializer.save()
-                logger.info(f"Category updated (ID {pk}): {serializer.data}")
+                logger.info("Category updated (ID %s): %s", pk, serializer.data)
                 return Response(serializer.data)
-            logger.warning(f"Invalid update data for ID {pk}: {serializer.errors}")
+            logger.warning("Invalid update data for ID %s: %s", pk, serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error updating category ID {pk}: {str(e)}")
+            logger.error("Error updating category ID %s: %s", pk, e)
             return Response({'error': 'Failed to update category.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def delete(self, request, pk):
@@ -76,14 +77,23 @@ class CategoryDetailAPIView(APIView):
 
         try:
             category.delete()
-            logger.info(f"Category deleted (ID {pk})")
+            logger.info("Category deleted (ID %s)", pk)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
-            logger.error(f"Error deleting category ID {pk}: {str(e)}")
+            logger.error("Error deleting category ID %s: %s", pk, e)
             return Response({'error': 'Failed to delete category.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def products_with_details():
+    """Products with everything ProductSerializer reads, in two queries however many there are."""
+    return Product.objects.select_related('category').prefetch_related('products_image')
+
+
 class ProductListCreateAPIView(APIView):
+    query_budget = {'GET': 2}
+    # Reads may come from a replica, see discount_engine/db_router.py
+    replica_reads = ('GET',)
+
     def get_permissions(self):
         if self.request.method == 'POST':
             return [IsAdminUser()]
@@ -91,11 +101,11 @@ class ProductListCreateAPIView(APIView):
     
     def get(self, request):
         try:
-            products = Product.objects.all()
+            products = products_with_details()
             serializer = ProductSerializer(products, many=True)
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error fetching products: {str(e)}")
+            logger.error("Error fetching products: %s", e)
             return Response({'error': 'Failed to fetch products.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def post(self, request):
@@ -103,22 +113,25 @@ class ProductListCreateAPIView(APIView):
             serializer = ProductSerializer(data=request.data)
             if serializer.is_valid():
                 product = serializer.save()
-                logger.info(f"Product created: {product}")
+                logger.info("Product created: %s", product)
                 return Response(ProductSerializer(product).data, status=status.HTTP_201_CREATED)
-            logger.warning(f"Product creation failed: {serializer.errors}")
+            logger.warning("Product creation failed: %s", serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error creating product: {str(e)}")
+            logger.error("Error creating product: %s", e)
             return Response({'error': 'Failed to create product.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
 class ProductRetrieveUpdateDeleteAPIView(APIView):
+    query_budget = {'GET': 2}
+    replica_reads = ('GET',)
+
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
             return [IsAdminUser()]
         return [AllowAny()]
     
     def get_object(self, slug):
-        return get_object_or_404(Product, slug=slug)
+        return get_object_or_404(products_with_details(), slug=slug)
 
     def get(self, request, slug):
         try:
@@ -126,7 +139,7 @@ class ProductRetrieveUpdateDeleteAPIView(APIView):
             serializer = ProductSerializer(product)
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error retrieving product {slug}: {str(e)}")
+            logger.error("Error retrieving product %s: %s", slug, e)
             return Response({'error': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
 
     def put(self, request, slug):
@@ -135,12 +148,12 @@ class ProductRetrieveUpdateDeleteAPIView(APIView):
             serializer = ProductSerializer(product, data=request.data)
             if serializer.is_valid():
                 product = serializer.save()
-                logger.info(f"Product {slug} fully updated.")
+                logger.info("Product %s fully updated.", slug)
                 return Response(ProductSerializer(product).data)
-            logger.warning(f"Full update failed for product {slug}: {serializer.errors}")
+            logger.warning("Full update failed for product %s: %s", slug, serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error updating product {slug}: {str(e)}")
+            logger.error("Error updating product %s: %s", slug, e)
             return Response({'error': 'Failed to update product.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def patch(self, request, slug):
@@ -149,20 +162,20 @@ class ProductRetrieveUpdateDeleteAPIView(APIView):
             serializer = ProductSerializer(product, data=request.data, partial=True)
             if serializer.is_valid():
                 product = serializer.save()
-                logger.info(f"Product {slug} partially updated.")
+                logger.info("Product %s partially updated.", slug)
                 return Response(ProductSerializer(product).data)
-            logger.warning(f"Partial update failed for product {slug}: {serializer.errors}")
+            logger.warning("Partial update failed for product %s: %s", slug, serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error patching product {slug}: {str(e)}")
+            logger.error("Error patching product %s: %s", slug, e)
             return Response({'error': 'Failed to patch product.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def delete(self, request, slug):
         try:
             product = self.get_object(slug)
             product.delete()
-            logger.info(f"Product {slug} deleted.")
+            logger.info("Product %s deleted.", slug)
             return Response({'message': 'Product deleted successfully.'}, status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
-            logger.error(f"Error deleting product {slug}: {str(e)}")
+            logger.error("Error deleting product %s: %s", slug, e)
             return Response({'error': 'Failed to delete product.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file